@@ -1,10 +1,44 @@
 from uagents import Agent, Context, Model
+from uagents.context import DeliveryStatus
 from uagents.setup import fund_agent_if_low
 from datetime import datetime, timezone
-from typing import List, Dict
+from functools import lru_cache, partial
+from typing import Any, List, Dict, Optional, Tuple
 from web3 import Web3
+from eth_utils import keccak
+from storage import SnapshotStore
+from utils.balance_cache import BalanceCache
+from utils.block_watch import AddressIndex, BlockWatcher
+from utils.cache import AsyncTTLCache
+from utils.change_gate import SnapshotChangeGate, snapshot_fingerprint
+from utils.defi_positions import DefiPositionReader
+from utils.holdings_matrix import HoldingsMatrix
+from utils.kv_batch import write_many
+from utils.multicall import (
+    DECIMALS_SELECTOR,
+    SYMBOL_SELECTOR,
+    TokenMetadataCache,
+    aggregate3,
+    balance_of_call,
+    decode_symbol,
+    decode_uint,
+)
+from utils.onchain_prices import OnChainPricer, v2_pair_address
+from utils.price_table import SharedPriceTable
+from utils.rate_limit import RateLimiter, rate_limit_owner
+from utils.risk_engine import calculate_risk_score
+from utils.rpc import ProviderRegistry
+from utils.scan_pool import ChainWorkerPools
+from utils.scan_supervisor import ScanSupervisor
+from utils.scheduler import ScanScheduler
+from utils.sharding import ShardMembership
+from utils.token_discovery import TokenDiscovery
+from utils.wallet_registry import WalletRegistry
 import aiohttp
 import asyncio
+import itertools
+import json
+import math
 import re
 import os
 from dotenv import load_dotenv
@@ -31,11 +65,32 @@ class MessageResponse(Model):
     message: str
 
 
+class PortfolioBatch(Model):
+    portfolios: List[Portfolio]
+
+
+class BulkRegistrationResponse(Model):
+    registered: int
+    rejected: List[Dict]
+    message: str
+
+
+class PortfolioHandoff(Model):
+    portfolios: Dict[str, Dict]
+
+
+PORTFOLIO_AGENT_PORT = int(os.getenv("PORTFOLIO_AGENT_PORT", 8000))
+# Each shard worker must advertise its own submit URL, or handoffs to it resolve to another process
+PORTFOLIO_AGENT_ENDPOINT = os.getenv("PORTFOLIO_AGENT_ENDPOINT") or (
+    f"http://127.0.0.1:{PORTFOLIO_AGENT_PORT}/submit" if os.getenv("MONITOR_SHARD_DIR")
+    else "https://defiguard-production.up.railway.app/submit"
+)
+
 portfolio_agent = Agent(
     name="portfolio_monitor",
     seed=os.getenv("PORTFOLIO_AGENT_SEED", "portfolio_agent_seed"),
-    port=8000,
-    endpoint=["https://defiguard-production.up.railway.app/submit"],
+    port=PORTFOLIO_AGENT_PORT,
+    endpoint=[url.strip() for url in PORTFOLIO_AGENT_ENDPOINT.split(",") if url.strip()],
     mailbox=True
 )
 
@@ -47,316 +102,1465 @@ CHAIN_CONFIG = {
     "ethereum": {
         "name": "Ethereum",
         "rpc": "https://eth.llamarpc.com",
+        "rpcs": ["https://ethereum-rpc.publicnode.com", "https://rpc.ankr.com/eth"],
         "native_token": "ethereum",
         "native_symbol": "ETH",
-        "explorer": "https://etherscan.io"
+        "explorer": "https://etherscan.io",
+        "block_time": 12
     },
     "bsc": {
         "name": "BNB Smart Chain",
         "rpc": "https://bsc-dataseed.binance.org",
+        "rpcs": ["https://bsc-rpc.publicnode.com", "https://bsc-dataseed1.defibit.io"],
         "native_token": "binancecoin",
         "native_symbol": "BNB",
-        "explorer": "https://bscscan.com"
+        "explorer": "https://bscscan.com",
+        "block_time": 0.75,
+        "max_concurrency": 2
     },
     "polygon": {
         "name": "Polygon",
         "rpc": "https://polygon-rpc.com",
+        "rpcs": ["https://polygon-bor-rpc.publicnode.com", "https://polygon.llamarpc.com"],
         "native_token": "matic-network",
         "native_symbol": "MATIC",
-        "explorer": "https://polygonscan.com"
+        "explorer": "https://polygonscan.com",
+        "block_time": 2,
+        "max_concurrency": 2
     },
     "arbitrum": {
         "name": "Arbitrum",
         "rpc": "https://arb1.arbitrum.io/rpc",
+        "rpcs": ["https://arbitrum-one-rpc.publicnode.com"],
         "native_token": "ethereum",
         "native_symbol": "ETH",
-        "explorer": "https://arbiscan.io"
+        "explorer": "https://arbiscan.io",
+        "block_time": 0.25
     },
     "optimism": {
         "name": "Optimism",
         "rpc": "https://mainnet.optimism.io",
+        "rpcs": ["https://optimism-rpc.publicnode.com"],
         "native_token": "ethereum",
         "native_symbol": "ETH",
-        "explorer": "https://optimistic.etherscan.io"
+        "explorer": "https://optimistic.etherscan.io",
+        "block_time": 2
     },
     "avalanche": {
         "name": "Avalanche",
         "rpc": "https://api.avax.network/ext/bc/C/rpc",
+        "rpcs": ["https://avalanche-c-chain-rpc.publicnode.com"],
         "native_token": "avalanche-2",
         "native_symbol": "AVAX",
-        "explorer": "https://snowtrace.io"
+        "explorer": "https://snowtrace.io",
+        "block_time": 2
     },
     "base": {
         "name": "Base",
         "rpc": "https://mainnet.base.org",
+        "rpcs": ["https://base-rpc.publicnode.com"],
         "native_token": "ethereum",
         "native_symbol": "ETH",
-        "explorer": "https://basescan.org"
+        "explorer": "https://basescan.org",
+        "block_time": 2
     },
     "fantom": {
         "name": "Fantom",
         "rpc": "https://rpc.ftm.tools",
         "native_token": "fantom",
         "native_symbol": "FTM",
-        "explorer": "https://ftmscan.com"
+        "explorer": "https://ftmscan.com",
+        "block_time": 1
     },
     "gnosis": {
         "name": "Gnosis Chain",
         "rpc": "https://rpc.gnosischain.com",
+        "rpcs": ["https://gnosis-rpc.publicnode.com"],
         "native_token": "xdai",
         "native_symbol": "XDAI",
-        "explorer": "https://gnosisscan.io"
+        "explorer": "https://gnosisscan.io",
+        "block_time": 5
     },
     "moonbeam": {
         "name": "Moonbeam",
         "rpc": "https://rpc.api.moonbeam.network",
         "native_token": "moonbeam",
         "native_symbol": "GLMR",
-        "explorer": "https://moonscan.io"
+        "explorer": "https://moonscan.io",
+        "block_time": 6
     },
     "celo": {
         "name": "Celo",
         "rpc": "https://forno.celo.org",
         "native_token": "celo",
         "native_symbol": "CELO",
-        "explorer": "https://celoscan.io"
+        "explorer": "https://celoscan.io",
+        "block_time": 1
     },
     "cronos": {
         "name": "Cronos",
         "rpc": "https://evm.cronos.org",
         "native_token": "crypto-com-chain",
         "native_symbol": "CRO",
-        "explorer": "https://cronoscan.com"
+        "explorer": "https://cronoscan.com",
+        "block_time": 6
     }
 }
 
-price_cache = {}
-cache_timestamp = {}
+# ERC-20 tokens checked via Multicall3 on each chain; extend with TOKEN_LIST_FILE
+CHAIN_TOKENS = {
+    "ethereum": [
+        {"address": "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48", "coingecko_id": "usd-coin"},
+        {"address": "0xdAC17F958D2ee523a2206206994597C13D831ec7", "coingecko_id": "tether"},
+        {"address": "0x6B175474E89094C44Da98b954EedeAC495271d0F", "coingecko_id": "dai"},
+        {"address": "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2", "coingecko_id": "weth"},
+        {"address": "0x2260FAC5E5542a773Aa44fBCfeDf7C193bc2C599", "coingecko_id": "wrapped-bitcoin"}
+    ],
+    "bsc": [
+        {"address": "0x55d398326f99059fF775485246999027B3197955", "coingecko_id": "tether"},
+        {"address": "0x8AC76a51cc950d9822D68b83fE1Ad97B32Cd580d", "coingecko_id": "usd-coin"},
+        {"address": "0xe9e7CEA3DedcA5984780Bafc599bD69ADd087D56", "coingecko_id": "binance-usd"}
+    ],
+    "polygon": [
+        {"address": "0x3c499c542cEF5E3811e1192ce70d8cC03d5c3359", "coingecko_id": "usd-coin"},
+        {"address": "0xc2132D05D31c914a87C6611C10748AEb04B58e8F", "coingecko_id": "tether"},
+        {"address": "0x7ceB23fD6bC0adD59E62ac25578270cFf1b9f619", "coingecko_id": "weth"}
+    ],
+    "arbitrum": [
+        {"address": "0xaf88d065e77c8cC2239327C5EDb3A432268e5831", "coingecko_id": "usd-coin"},
+        {"address": "0xFd086bC7CD5C481DCC9C85ebE478A1C0b69FCbb9", "coingecko_id": "tether"},
+        {"address": "0x912CE59144191C1204E64559FE8253a0e49E6548", "coingecko_id": "arbitrum"}
+    ],
+    "optimism": [
+        {"address": "0x0b2C639c533813f4Aa9D7837CAf62653d097Ff85", "coingecko_id": "usd-coin"},
+        {"address": "0x4200000000000000000000000000000000000042", "coingecko_id": "optimism"}
+    ],
+    "base": [
+        {"address": "0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913", "coingecko_id": "usd-coin"}
+    ],
+    "avalanche": [
+        {"address": "0xB97EF9Ef8734C71904D8002F8b6Bc66Dd9c48a6E", "coingecko_id": "usd-coin"}
+    ]
+}
+
+
+def load_chain_tokens() -> Dict[str, List[Dict]]:
+    tokens = {chain: list(entries) for chain, entries in CHAIN_TOKENS.items()}
+
+    token_list_file = os.getenv("TOKEN_LIST_FILE")
+    if not token_list_file:
+        return tokens
+
+    try:
+        with open(token_list_file) as f:
+            extra = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not load token list {token_list_file}: {e}")
+        return tokens
+
+    for chain, entries in extra.items():
+        known = {t["address"].lower() for t in tokens.get(chain, [])}
+        tokens.setdefault(chain, []).extend(t for t in entries if t["address"].lower() not in known)
+
+    return tokens
+
+
+ERC20_SCAN = os.getenv("ERC20_SCAN", "true").lower() == "true"
+MULTICALL_MAX_CALLS = int(os.getenv("MULTICALL_MAX_CALLS", 500))
+
+chain_tokens = load_chain_tokens()
+token_metadata = TokenMetadataCache()
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "data/snapshots")
+SNAPSHOT_COMPACT_INTERVAL = 3600
+
+snapshot_store = SnapshotStore(
+    SNAPSHOT_DIR,
+    retention={
+        "raw": float(os.getenv("SNAPSHOT_RAW_RETENTION_DAYS", 7)) * 86400,
+        "hourly": float(os.getenv("SNAPSHOT_HOURLY_RETENTION_DAYS", 90)) * 86400,
+        "daily": float(os.getenv("SNAPSHOT_DAILY_RETENTION_DAYS", 1825)) * 86400
+    }
+)
+_last_compaction: Dict[str, float] = {}
+
+SCAN_TICK_SECONDS = float(os.getenv("SCAN_TICK_SECONDS", 60))
+SCAN_RPC_BUDGET = int(os.getenv("SCAN_RPC_BUDGET", 60))
+SCAN_PRICE_ID_BUDGET = int(os.getenv("SCAN_PRICE_ID_BUDGET", 250))
+
+scan_scheduler = ScanScheduler(
+    base_interval=float(os.getenv("SCAN_BASE_INTERVAL", 3600)),
+    min_interval=float(os.getenv("SCAN_MIN_INTERVAL", 300)),
+    max_interval=float(os.getenv("SCAN_MAX_INTERVAL", 86400))
+)
+
+# Scan cycles run as background jobs; the interval handler only queues them
+SCAN_CONCURRENT_CYCLES = int(os.getenv("SCAN_CONCURRENT_CYCLES", 2))
+SCAN_CYCLE_DEADLINE = float(os.getenv("SCAN_CYCLE_DEADLINE", 300))
+SCAN_QUEUE_LIMIT = int(os.getenv("SCAN_QUEUE_LIMIT", 4))
+
+scan_supervisor = ScanSupervisor(concurrency=SCAN_CONCURRENT_CYCLES, deadline=SCAN_CYCLE_DEADLINE)
+_cycle_ids = itertools.count(1)
+# Rate limit owner per scan cycle, so concurrent cycles and single-portfolio scans share RPC hosts fairly
+_cycle_owners = itertools.count(1)
+
+# Optional cold-start pass that rescans every registered portfolio right after startup
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "false").lower() == "true"
+WARMUP_WINDOW = float(os.getenv("WARMUP_WINDOW", 900))
+WARMUP_BATCH = int(os.getenv("WARMUP_BATCH", 100))
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", 4))
+
+warmup_status: Dict[str, Any] = {
+    "state": "pending" if STARTUP_WARMUP else "disabled",
+    "total": 0,
+    "scanned": 0,
+    "started_at": None,
+    "finished_at": None
+}
+
+# Sharding across monitor processes: each worker (its own agent seed) owns the portfolios the ring assigns it
+MONITOR_SHARD_DIR = os.getenv("MONITOR_SHARD_DIR")
+SHARD_HANDOFF_BATCH = int(os.getenv("SHARD_HANDOFF_BATCH", 500))
+
+shard_membership = ShardMembership(
+    MONITOR_SHARD_DIR,
+    worker_id=os.getenv("MONITOR_WORKER_ID", portfolio_agent.address),
+    address=portfolio_agent.address,
+    ttl=float(os.getenv("MONITOR_SHARD_TTL", 3 * SCAN_TICK_SECONDS)),
+    vnodes=int(os.getenv("MONITOR_SHARD_VNODES", 128))
+) if MONITOR_SHARD_DIR else None
+
+# Event-driven rescans: follow new blocks and mark portfolios due when a transaction touches their wallets
+BLOCK_WATCH = os.getenv("BLOCK_WATCH", "false").lower() == "true"
+BLOCK_WATCH_INTERVAL = float(os.getenv("BLOCK_WATCH_INTERVAL", 12))
+BLOCK_WATCH_MIN_INTERVAL = float(os.getenv("BLOCK_WATCH_MIN_INTERVAL", 2))
+BLOCK_WATCH_MAX_CATCHUP = int(os.getenv("BLOCK_WATCH_MAX_CATCHUP", 10))
+
+block_watchers: Dict[str, BlockWatcher] = {}
+watched_wallets: Dict[str, Dict[str, str]] = {}
+_block_watch_dirty = True
+
+wallet_registry = WalletRegistry()
+
+# Only forward snapshots that changed materially since the last one the risk agent saw
+FORWARD_GATE = os.getenv("FORWARD_GATE", "true").lower() == "true"
+
+change_gate = SnapshotChangeGate(
+    value_change=float(os.getenv("FORWARD_VALUE_CHANGE", 0.02)),
+    weight_drift=float(os.getenv("FORWARD_WEIGHT_DRIFT", 0.05)),
+    change_delta=float(os.getenv("FORWARD_CHANGE_DELTA", 5)),
+    max_staleness=float(os.getenv("FORWARD_MAX_STALENESS", 21600)),
+    health_factor_warning=float(os.getenv("DEFI_HEALTH_FACTOR_WARNING", 1.2))
+)
+
+# Reprice every scanned portfolio from its last balances whenever prices refresh, without RPC
+REVALUE = os.getenv("REVALUE", "true").lower() == "true"
+REVALUE_INTERVAL = float(os.getenv("REVALUE_INTERVAL", 60))
+REVALUE_RISK_THRESHOLD = float(os.getenv("REVALUE_RISK_THRESHOLD", 0.7))
+
+holdings_matrix = HoldingsMatrix()
+
+SCAN_WORKERS_PER_CHAIN = int(os.getenv("SCAN_WORKERS_PER_CHAIN", 4))
+RPC_POOL_SIZE = int(os.getenv("RPC_POOL_SIZE", 10))
+RPC_TIMEOUT = float(os.getenv("RPC_TIMEOUT", 5))
+RPC_WARMUP = os.getenv("RPC_WARMUP", "true").lower() == "true"
+RPC_MAX_BATCH_SIZE = int(os.getenv("RPC_MAX_BATCH_SIZE", 100))
+RPC_HEDGE = os.getenv("RPC_HEDGE", "true").lower() == "true"
+RPC_FAILURE_THRESHOLD = int(os.getenv("RPC_FAILURE_THRESHOLD", 3))
+RPC_CIRCUIT_COOLDOWN = float(os.getenv("RPC_CIRCUIT_COOLDOWN", 30))
+RPC_RATE_LIMIT = float(os.getenv("RPC_RATE_LIMIT", 25))
+RPC_RATE_BURST = float(os.getenv("RPC_RATE_BURST", 50))
+
+# Requests/second and burst for public hosts that throttle below RPC_RATE_LIMIT
+RPC_HOST_LIMITS = {
+    "bsc-dataseed.binance.org": (10, 20),
+    "bsc-dataseed1.defibit.io": (10, 20),
+    "polygon-rpc.com": (5, 10),
+    "polygon.llamarpc.com": (10, 20),
+    "eth.llamarpc.com": (10, 20),
+    "rpc.ankr.com": (10, 20)
+}
+
+# {CHAIN}_RPC_URL (comma-separated) puts private endpoints ahead of the public ones, which stay as failover
+for _chain, _config in CHAIN_CONFIG.items():
+    _urls = [u.strip() for u in os.getenv(f"{_chain.upper()}_RPC_URL", "").split(",") if u.strip()]
+    if _urls:
+        _config["rpcs"] = _urls[1:] + [_config["rpc"], *_config.get("rpcs", [])]
+        _config["rpc"] = _urls[0]
+
+BALANCE_CACHE = os.getenv("BALANCE_CACHE", "true").lower() == "true"
+
+balance_cache = BalanceCache(
+    max_block_age=int(os.getenv("BALANCE_MAX_BLOCK_AGE", 300)),
+    reorg_depth=int(os.getenv("BALANCE_REORG_DEPTH", 64))
+)
+
+rpc_registry = ProviderRegistry(
+    CHAIN_CONFIG,
+    pool_size=RPC_POOL_SIZE,
+    timeout=RPC_TIMEOUT,
+    max_batch_size=RPC_MAX_BATCH_SIZE,
+    hedge=RPC_HEDGE,
+    failure_threshold=RPC_FAILURE_THRESHOLD,
+    circuit_cooldown=RPC_CIRCUIT_COOLDOWN,
+    rate_limiter=RateLimiter(RPC_RATE_LIMIT, RPC_RATE_BURST, RPC_HOST_LIMITS)
+)
+
+# Find tokens outside the fixed list from each wallet's ERC-20 Transfer logs, incrementally per block checkpoint
+TOKEN_DISCOVERY = os.getenv("TOKEN_DISCOVERY", "false").lower() == "true"
+
+token_discovery = TokenDiscovery(
+    rpc_registry,
+    backfill_blocks=int(os.getenv("TOKEN_DISCOVERY_BACKFILL_BLOCKS", 100000)),
+    initial_range=int(os.getenv("TOKEN_DISCOVERY_RANGE", 2000)),
+    max_range=int(os.getenv("TOKEN_DISCOVERY_MAX_RANGE", 10000)),
+    max_requests=int(os.getenv("TOKEN_DISCOVERY_MAX_REQUESTS", 20))
+)
+
+# Prices read from chain state: the fallback when CoinGecko cannot answer, or the primary source with PRICE_SOURCE=onchain
+PRICE_SOURCE = os.getenv("PRICE_SOURCE", "coingecko").lower()
+ONCHAIN_PRICES = os.getenv("ONCHAIN_PRICES", "true").lower() == "true"
+
+# Chainlink USD aggregators (8 decimals) by CoinGecko id; L2 assets priced by their mainnet feed
+CHAINLINK_FEEDS = {
+    "ethereum": ("ethereum", "0x5f4eC3Df9cbd43714FE2740f5E3616155c5b8419"),
+    "weth": ("ethereum", "0x5f4eC3Df9cbd43714FE2740f5E3616155c5b8419"),
+    "wrapped-bitcoin": ("ethereum", "0xF4030086522a5bEEa4988F8cA5B36dbC97BeE88c"),
+    "usd-coin": ("ethereum", "0x8fFfFfd4AfB6115b954Bd326cbe7B4BA576818f6"),
+    "tether": ("ethereum", "0x3E7d1eAB13ad0104d2750B8863b489D65364e32D"),
+    "dai": ("ethereum", "0xAed0c38402a5d19df6E4c03F4E2DceD6e29c1ee9"),
+    "binancecoin": ("bsc", "0x0567F2323251f0Aab15c8dFb1967E4e8A7D42aeE"),
+    "matic-network": ("polygon", "0xAB594600376Ec9fD91F8e885dADF0CE036862dE0"),
+    "avalanche-2": ("avalanche", "0x0A77230d17318075983913bC2145DB16C7366156")
+}
+
+# Uniswap-V2-style DEX per chain for pricing other tokens against the wrapped native token
+V2_DEXES = {
+    "ethereum": {
+        "factory": "0x5C69bEe701ef814a2B6a3EDD4B1652CB9cc5aA6f",
+        "init_code_hash": "0x96e8ac4277198ff8b6f785478aa9a39f403cb768dd02cbee326c3e7da348845f",
+        "wrapped_native": "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2",
+        "native_feed": "0x5f4eC3Df9cbd43714FE2740f5E3616155c5b8419"
+    },
+    "bsc": {
+        "factory": "0xcA143Ce32Fe78f1f7019d7d551a6402fC5349c73",
+        "wrapped_native": "0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c",
+        "native_feed": "0x0567F2323251f0Aab15c8dFb1967E4e8A7D42aeE"
+    },
+    "polygon": {
+        "factory": "0x5757371414417b8C6CAad45bAeF941aBc7d3Ab32",
+        "wrapped_native": "0x0d500B1d8E8eF31E21C99d1Db9A6444d3ADf1270",
+        "native_feed": "0xAB594600376Ec9fD91F8e885dADF0CE036862dE0"
+    }
+}
+
+onchain_pricer = OnChainPricer(
+    rpc_registry,
+    CHAINLINK_FEEDS,
+    V2_DEXES,
+    max_feed_age=float(os.getenv("ONCHAIN_MAX_FEED_AGE", 90000)),
+    min_liquidity_usd=float(os.getenv("ONCHAIN_MIN_LIQUIDITY_USD", 50000)),
+    max_calls=MULTICALL_MAX_CALLS
+)
+
+# Lending and LP positions read next to token balances, one more Multicall3 eth_call per chain batch
+DEFI_POSITIONS = os.getenv("DEFI_POSITIONS", "false").lower() == "true"
+DEFI_HEALTH_FACTOR_WARNING = float(os.getenv("DEFI_HEALTH_FACTOR_WARNING", 1.2))
+
+# Aave V3 pools; getUserAccountData() reports in USD with 8 decimals
+AAVE_V3_POOL = "0x794a61358D6845594F94dc1DB02A252b5b4814aD"
+LENDING_MARKETS = {
+    "ethereum": [{"protocol": "aave-v3", "pool": "0x87870Bca3F3fD6335C3F4ce8392D69350B4fA4E2", "base_decimals": 8}],
+    "polygon": [{"protocol": "aave-v3", "pool": AAVE_V3_POOL, "base_decimals": 8}],
+    "arbitrum": [{"protocol": "aave-v3", "pool": AAVE_V3_POOL, "base_decimals": 8}],
+    "optimism": [{"protocol": "aave-v3", "pool": AAVE_V3_POOL, "base_decimals": 8}],
+    "avalanche": [{"protocol": "aave-v3", "pool": AAVE_V3_POOL, "base_decimals": 8}],
+    "base": [{"protocol": "aave-v3", "pool": "0xA238Dd80C259a72e81d7e4664a9801593F98d1c5", "base_decimals": 8}]
+}
+
+# Uniswap V2 pairs on the V2_DEXES factory whose LP tokens are split into their two underlying tokens
+LP_PAIRS = {
+    "ethereum": [
+        ("0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48", "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"),
+        ("0xdAC17F958D2ee523a2206206994597C13D831ec7", "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"),
+        ("0x6B175474E89094C44Da98b954EedeAC495271d0F", "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"),
+        ("0x2260FAC5E5542a773Aa44fBCfeDf7C193bc2C599", "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2")
+    ]
+}
+
+LP_POOLS = {
+    chain: [
+        {
+            "protocol": "uniswap-v2",
+            "pair": v2_pair_address(V2_DEXES[chain]["factory"], V2_DEXES[chain]["init_code_hash"], token_a, token_b),
+            "token0": min(token_a.lower(), token_b.lower()),
+            "token1": max(token_a.lower(), token_b.lower())
+        }
+        for token_a, token_b in pairs
+    ]
+    for chain, pairs in LP_PAIRS.items()
+}
+
+defi_position_reader = DefiPositionReader(
+    rpc_registry,
+    token_metadata,
+    LENDING_MARKETS,
+    LP_POOLS,
+    max_calls=MULTICALL_MAX_CALLS
+)
+
+chain_pools = ChainWorkerPools(
+    {chain: config.get("max_concurrency", SCAN_WORKERS_PER_CHAIN) for chain, config in CHAIN_CONFIG.items()},
+    default_size=SCAN_WORKERS_PER_CHAIN
+)
 
 
 def get_supported_chains() -> List[str]:
     return list(CHAIN_CONFIG.keys())
 
 
+WALLET_ADDRESS_PATTERN = re.compile(r'^0x[a-fA-F0-9]{40}$')
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+MAX_CHAINS_PER_PORTFOLIO = 5
+CHECKSUM_CACHE_SIZE = int(os.getenv("CHECKSUM_CACHE_SIZE", 200000))
+
+
+@lru_cache(maxsize=CHECKSUM_CACHE_SIZE)
+def checksum_address(address_lower: str) -> str:
+    # ERC-55 directly on an already-validated lower-case address; skips Web3's re-normalization
+    body = address_lower[2:]
+    digest = keccak(text=body).hex()
+    return "0x" + "".join(c.upper() if h in "89abcdef" else c for c, h in zip(body, digest))
+
+
 def validate_wallet_address(address: str) -> Dict:
     if not isinstance(address, str):
         return {"valid": False, "error": "Address must be a string"}
 
     address = address.strip()
 
-    if not re.match(r'^0x[a-fA-F0-9]{40}$', address):
+    if not WALLET_ADDRESS_PATTERN.match(address):
         return {"valid": False, "error": "Invalid EVM address format"}
 
     try:
-        checksum_address = Web3.to_checksum_address(address)
+        checksum = checksum_address(address.lower())
 
-        if checksum_address == "0x0000000000000000000000000000000000000000":
+        if checksum == ZERO_ADDRESS:
             return {"valid": False, "error": "Cannot use zero address"}
 
-        return {"valid": True, "checksum": checksum_address, "error": None}
+        return {"valid": True, "checksum": checksum, "error": None}
     except Exception as e:
         return {"valid": False, "error": f"Invalid address: {str(e)}"}
 
 
-async def fetch_token_price_cached(token_id: str) -> Dict:
-    current_time = datetime.now(timezone.utc).timestamp()
+def validate_wallet_addresses(addresses: List[str]) -> Tuple[List[str], List[str]]:
+    """Checksum a list of wallets in one pass; returns (unique valid checksums, error strings)."""
+    match = WALLET_ADDRESS_PATTERN.match
+    valid = {}
+    invalid = []
+
+    for address in addresses:
+        if not isinstance(address, str):
+            invalid.append(f"{address}: Address must be a string")
+            continue
+
+        address = address.strip()
+        if not match(address):
+            invalid.append(f"{address}: Invalid EVM address format")
+            continue
+
+        lower = address.lower()
+        if lower == ZERO_ADDRESS:
+            invalid.append(f"{address}: Cannot use zero address")
+            continue
+
+        valid[checksum_address(lower)] = None
+
+    return list(valid), invalid
+
+
+def check_portfolio(wallets: List[str], chains: List[str]) -> Dict:
+    """Validate a registration; returns checksummed wallets, lower-cased chains and the first error, if any."""
+    valid_wallets, invalid_wallets = validate_wallet_addresses(wallets)
+    if invalid_wallets:
+        return {"error": "Invalid wallet(s): " + "; ".join(invalid_wallets)}
+
+    invalid_chains = [c for c in chains if c.lower() not in CHAIN_CONFIG]
+    if invalid_chains:
+        supported = ", ".join(get_supported_chains())
+        return {"error": f"Unsupported chain(s): {', '.join(invalid_chains)}. Supported: {supported}"}
+
+    if len(chains) > MAX_CHAINS_PER_PORTFOLIO:
+        return {"error": "⚠️ Max 5 chains on Agentverse. Please select your top chains."}
+
+    return {"wallets": valid_wallets, "chains": [c.lower() for c in chains], "error": None}
+
+
+def commit_scan_results(storage, results: Dict[str, Dict]):
+    """
+    Merge scan results ({"last_scan", "last_risk_score", ...} per portfolio
+    key) into the records as they are now, not as they were when the scan
+    started, so a re-registration or a revalue forward made meanwhile is
+    kept. A scan's last_forwarded only replaces a newer one it raced with if
+    it is newer itself; portfolios handed off or removed meanwhile are skipped.
+    """
+    merged = {}
+    for key, fields in results.items():
+        current = storage.get(key)
+        if not current:
+            continue
+        fields = dict(fields)
+        forwarded = fields.pop("last_forwarded", None)
+        previous = current.get("last_forwarded")
+        if forwarded and (not previous or forwarded["timestamp"] >= previous["timestamp"]):
+            fields["last_forwarded"] = forwarded
+        merged[key] = {**current, **fields}
+
+    if merged:
+        write_many(storage, merged)
+
+
+COINGECKO_SIMPLE_PRICE_URL = "https://api.coingecko.com/api/v3/simple/price"
+COINGECKO_TOKEN_PRICE_URL = "https://api.coingecko.com/api/v3/simple/token_price/{platform}"
+COINGECKO_TOKEN_PRICE_BATCH = 30
+
+# CoinGecko asset platform per chain, for pricing discovered tokens by contract address
+COINGECKO_PLATFORMS = {
+    "ethereum": "ethereum",
+    "bsc": "binance-smart-chain",
+    "polygon": "polygon-pos",
+    "arbitrum": "arbitrum-one",
+    "optimism": "optimistic-ethereum",
+    "avalanche": "avalanche",
+    "base": "base",
+    "fantom": "fantom",
+    "gnosis": "xdai",
+    "moonbeam": "moonbeam",
+    "celo": "celo",
+    "cronos": "cronos"
+}
+PRICE_CACHE_TTL = float(os.getenv("PRICE_CACHE_TTL", 60))
+PRICE_STALE_TTL = float(os.getenv("PRICE_STALE_TTL", 300))
+PRICE_CACHE_SIZE = int(os.getenv("PRICE_CACHE_SIZE", 2048))
+
+price_cache = AsyncTTLCache(maxsize=PRICE_CACHE_SIZE, ttl=PRICE_CACHE_TTL, stale_ttl=PRICE_STALE_TTL)
+
+# Shared-memory price table for monitor processes on one box: one writer fetches and publishes, the rest read
+PRICE_TABLE = os.getenv("PRICE_TABLE")
+PRICE_TABLE_WRITER = os.getenv("PRICE_TABLE_WRITER", "false").lower() == "true"
+PRICE_TABLE_SIZE = int(os.getenv("PRICE_TABLE_SIZE", 8192))
+PRICE_TABLE_INTERVAL = float(os.getenv("PRICE_TABLE_INTERVAL", PRICE_CACHE_TTL))
+PRICE_TABLE_MAX_AGE = float(os.getenv("PRICE_TABLE_MAX_AGE", PRICE_CACHE_TTL + PRICE_STALE_TTL))
+
+price_table = SharedPriceTable(PRICE_TABLE, capacity=PRICE_TABLE_SIZE, writer=PRICE_TABLE_WRITER) if PRICE_TABLE else None
+_coingecko_session = None
 
-    if token_id in price_cache:
-        cached_time = cache_timestamp.get(token_id, 0)
-        if current_time - cached_time < 60:
-            return price_cache[token_id]
 
-    url = "https://api.coingecko.com/api/v3/simple/price"
+def get_coingecko_session() -> aiohttp.ClientSession:
+    global _coingecko_session
+    if _coingecko_session is None or _coingecko_session.closed:
+        _coingecko_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5))
+    return _coingecko_session
+
+
+async def fetch_coingecko_prices(token_ids: List[str]) -> Dict[str, Dict]:
     params = {
-        "ids": token_id.lower(),
+        "ids": ",".join(token_ids),
         "vs_currencies": "usd",
         "include_24hr_change": "true"
     }
 
+    prices = {}
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params, timeout=5) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    token_data = data.get(token_id.lower(), {})
-                    result = {
+        async with get_coingecko_session().get(COINGECKO_SIMPLE_PRICE_URL, params=params) as response:
+            if response.status != 200:
+                print(f"⚠️ Price fetch returned {response.status} for {len(token_ids)} id(s)")
+                return prices
+
+            data = await response.json()
+            for token_id in token_ids:
+                token_data = data.get(token_id)
+                if token_data is None:
+                    continue
+
+                prices[token_id] = {
+                    "price": token_data.get("usd", 0),
+                    "change_24h": token_data.get("usd_24h_change", 0),
+                    "success": True
+                }
+    except Exception as e:
+        print(f"⚠️ Price fetch error: {e}")
+
+    return prices
+
+
+async def fetch_coingecko_token_prices(chain: str, addresses: List[str]) -> Dict[str, Dict]:
+    platform = COINGECKO_PLATFORMS.get(chain)
+    prices = {}
+    if not platform:
+        return prices
+
+    url = COINGECKO_TOKEN_PRICE_URL.format(platform=platform)
+    for start in range(0, len(addresses), COINGECKO_TOKEN_PRICE_BATCH):
+        batch = addresses[start:start + COINGECKO_TOKEN_PRICE_BATCH]
+        params = {
+            "contract_addresses": ",".join(batch),
+            "vs_currencies": "usd",
+            "include_24hr_change": "true"
+        }
+
+        try:
+            async with get_coingecko_session().get(url, params=params) as response:
+                if response.status != 200:
+                    print(f"⚠️ Token price fetch returned {response.status} for {len(batch)} {chain} contract(s)")
+                    continue
+
+                data = await response.json()
+                for address in batch:
+                    token_data = data.get(address)
+                    if token_data is None:
+                        continue
+
+                    prices[f"{chain}:{address}"] = {
                         "price": token_data.get("usd", 0),
                         "change_24h": token_data.get("usd_24h_change", 0),
                         "success": True
                     }
+        except Exception as e:
+            print(f"⚠️ Token price fetch error: {e}")
 
-                    price_cache[token_id] = result
-                    cache_timestamp[token_id] = current_time
+    return prices
 
-                    return result
-    except Exception as e:
-        print(f"⚠️ Price fetch error: {e}")
 
-    return {"price": 0, "change_24h": 0, "success": False}
+async def fetch_api_prices(price_ids: List[str]) -> Dict[str, Dict]:
+    """CoinGecko ids go to /simple/price, "{chain}:{address}" ids to that chain's /simple/token_price."""
+    coin_ids = []
+    contracts: Dict[str, List[str]] = {}
+    for price_id in price_ids:
+        if ":" in price_id:
+            chain, address = price_id.split(":", 1)
+            contracts.setdefault(chain, []).append(address)
+        else:
+            coin_ids.append(price_id)
+
+    fetches = [fetch_coingecko_token_prices(chain, addresses) for chain, addresses in contracts.items()]
+    if coin_ids:
+        fetches.append(fetch_coingecko_prices(coin_ids))
+
+    prices = {}
+    for result in await asyncio.gather(*fetches):
+        prices.update(result)
+    return prices
+
+
+def onchain_price_targets(price_ids: List[str]) -> Dict[str, Tuple[str, str, Optional[int]]]:
+    """(chain, address, decimals) to price each id from a DEX pair, preferring chains with a configured DEX."""
+    targets = {}
+    for price_id in price_ids:
+        if ":" in price_id:
+            chain, address = price_id.split(":", 1)
+        elif price_id in listed_token_locations:
+            chain, address = listed_token_locations[price_id]
+        else:
+            continue
+        metadata = token_metadata.get(chain, address)
+        targets[price_id] = (chain, address, metadata["decimals"] if metadata else None)
+    return targets
 
 
-async def get_wallet_balance_lightweight(ctx: Context, wallet: str, chain: str) -> List[Dict]:
+async def fetch_onchain_prices(price_ids: List[str]) -> Dict[str, Dict]:
+    return await onchain_pricer.fetch(price_ids, onchain_price_targets(price_ids))
 
-    validation = validate_wallet_address(wallet)
-    if not validation["valid"]:
-        raise ValueError(f"Invalid wallet: {validation['error']}")
 
-    wallet_checksum = validation["checksum"]
+async def fetch_prices(price_ids: List[str]) -> Dict[str, Dict]:
+    """Price from the configured source first, then fill whatever it missed from the other."""
+    sources = [fetch_api_prices]
+    if ONCHAIN_PRICES:
+        sources.insert(0 if PRICE_SOURCE == "onchain" else 1, fetch_onchain_prices)
+
+    prices = {}
+    for source in sources:
+        missing = [price_id for price_id in price_ids if not prices.get(price_id, {}).get("price")]
+        if not missing:
+            break
+        prices.update(await source(missing))
+
+    return prices
+
+
+async def fetch_and_publish_prices(price_ids: List[str]) -> Dict[str, Dict]:
+    prices = await fetch_prices(price_ids)
+    if price_table is not None and PRICE_TABLE_WRITER:
+        price_table.publish(prices)
+    return prices
+
+
+async def fetch_token_prices_batch(token_ids: List[str]) -> Dict[str, Dict]:
+    ids = list(dict.fromkeys(t.lower() for t in token_ids))
+
+    # Readers take what the writer has published and only fetch ids it does not cover
+    prices = {}
+    if price_table is not None and not PRICE_TABLE_WRITER:
+        prices = price_table.read(ids, PRICE_TABLE_MAX_AGE)
+    missing = [token_id for token_id in ids if token_id not in prices]
+    if missing:
+        prices.update(await price_cache.get_many(missing, fetch_and_publish_prices))
+
+    return {
+        token_id: prices.get(token_id) or {"price": 0, "change_24h": 0, "success": False}
+        for token_id in ids
+    }
+
+
+async def fetch_token_price_cached(token_id: str) -> Dict:
+    prices = await fetch_token_prices_batch([token_id])
+    return prices[token_id.lower()]
+
+
+# Lending positions are held as a net USD amount at a fixed price of 1
+LENDING_PRICE_ID = "usd"
+
+token_price_ids = {
+    (chain, token["address"].lower()): token["coingecko_id"].lower()
+    for chain, tokens in chain_tokens.items() for token in tokens
+}
+
+
+# CoinGecko id -> (chain, address) of a listed token, for pricing it on chain; DEX chains first
+listed_token_locations: Dict[str, Tuple[str, str]] = {}
+for _chain in sorted(chain_tokens, key=lambda c: c not in V2_DEXES):
+    for _token in chain_tokens[_chain]:
+        listed_token_locations.setdefault(_token["coingecko_id"].lower(), (_chain, _token["address"].lower()))
+
+
+def asset_price_id(asset: Dict) -> str:
+    if asset.get("position") == "lending":
+        return LENDING_PRICE_ID
+    address = asset.get("address")
+    if not address:
+        return CHAIN_CONFIG[asset["chain"]]["native_token"]
+    return token_price_ids.get((asset["chain"], address.lower()), f"{asset['chain']}:{address.lower()}")
+
+
+def scan_price_ids(chains: List[str]) -> set:
+    # Arbitrum, Optimism and Base all resolve to "ethereum", so the set dedups across chains
+    price_ids = set()
+
+    for chain in chains:
+        price_ids.add(CHAIN_CONFIG[chain]["native_token"])
+        if ERC20_SCAN:
+            price_ids.update(t["coingecko_id"] for t in chain_tokens.get(chain, []))
+
+    return price_ids
+
+
+def parse_quantity(response: Dict) -> Optional[int]:
+    try:
+        return int(response["result"], 16)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+async def read_native_balances(chain: str, wallets: List[str], block_tag: str = "latest") -> Dict[str, Dict]:
+    calls = [("eth_getBalance", [wallet, block_tag]) for wallet in wallets]
+    responses = await rpc_registry.batch_request(chain, calls) if calls else []
+
+    balances = {}
+    for wallet, response in zip(wallets, responses):
+        if "error" in response:
+            balances[wallet] = {"error": response["error"]}
+            continue
+
+        balance_wei = parse_quantity(response)
+        if balance_wei is None:
+            balances[wallet] = {"error": f"Malformed balance: {str(response.get('result'))[:50]}"}
+        else:
+            balances[wallet] = {"balance_wei": balance_wei}
+
+    return balances
+
+
+async def read_native_balances_cached(chain: str, wallets: List[str]) -> Dict[str, Dict]:
+    head = (await rpc_registry.batch_request(chain, [("eth_getBlockByNumber", ["latest", False])]))[0]
+    head_block = head.get("result") or {}
+    if "error" in head or "number" not in head_block:
+        return await read_native_balances(chain, wallets)
+
+    head_number = int(head_block["number"], 16)
+    block_tag = hex(head_number)
+
+    # Nonces for every wallet plus hash checks for recent blocks we cached balances at
+    verify = balance_cache.blocks_to_verify(chain, wallets, head_number)
+    calls = [("eth_getTransactionCount", [wallet, block_tag]) for wallet in wallets]
+    calls += [("eth_getBlockByNumber", [hex(block), False]) for block in verify]
+    responses = await rpc_registry.batch_request(chain, calls)
+
+    for (block, cached_hash), response in zip(verify.items(), responses[len(wallets):]):
+        canonical = response.get("result") or {}
+        if canonical.get("hash") and canonical["hash"] != cached_hash:
+            balance_cache.invalidate_from(chain, block)
+
+    nonces = {wallet: parse_quantity(response) for wallet, response in zip(wallets, responses)}
+    to_read = [
+        wallet for wallet in wallets
+        if balance_cache.is_stale(balance_cache.get(chain, wallet), nonces[wallet], head_number)
+    ]
+    # Copy reused balances before awaiting: a reorg, a block watcher hit or eviction may drop the entries meanwhile
+    reading = set(to_read)
+    reused = {
+        wallet: {"balance_wei": balance_cache.get(chain, wallet)["balance_wei"]}
+        for wallet in wallets if wallet not in reading
+    }
+    fresh = await read_native_balances(chain, to_read, block_tag)
+
+    balances = {}
+    for wallet in wallets:
+        if wallet in reused:
+            balance_cache.reused += 1
+            balances[wallet] = reused[wallet]
+            continue
+
+        balances[wallet] = fresh[wallet]
+        if "balance_wei" in fresh[wallet] and nonces[wallet] is not None:
+            balance_cache.refreshed += 1
+            balance_cache.update(
+                chain, wallet, fresh[wallet]["balance_wei"], nonces[wallet], head_number, head_block["hash"]
+            )
+
+    return balances
+
+
+async def fetch_native_balances_batch(chain: str, wallets: List[str]) -> Dict[str, Dict]:
+    wallets = list(dict.fromkeys(wallets))
+
+    if BALANCE_CACHE:
+        raw = await read_native_balances_cached(chain, wallets)
+    else:
+        raw = await read_native_balances(chain, wallets)
+
+    return {
+        wallet: result if "error" in result else {"balance": float(Web3.from_wei(result["balance_wei"], "ether"))}
+        for wallet, result in raw.items()
+    }
+
+
+def build_native_asset(chain: str, native_balance: float, price_data: Dict) -> Dict:
+    config = CHAIN_CONFIG[chain]
+    return {
+        "token": config["native_symbol"],
+        "balance": native_balance,
+        "price": price_data["price"],
+        "value_usd": native_balance * price_data["price"],
+        "change_24h": price_data["change_24h"],
+        "chain": chain
+    }
+
+
+async def get_wallet_balances_batch(ctx: Context, wallets: List[str], chain: str) -> Dict[str, List[Dict]]:
     chain_lower = chain.lower()
 
     if chain_lower not in CHAIN_CONFIG:
         raise ValueError(f"Unsupported chain: {chain}")
 
     config = CHAIN_CONFIG[chain_lower]
+    balances = await fetch_native_balances_batch(chain_lower, wallets)
 
-    try:
-        web3 = Web3(Web3.HTTPProvider(
-            config["rpc"],
-            request_kwargs={'timeout': 5}
-        ))
-
-        native_balance_wei = web3.eth.get_balance(wallet_checksum)
-        native_balance = float(web3.from_wei(native_balance_wei, "ether"))
+    funded = {w: b["balance"] for w, b in balances.items() if b.get("balance", 0) >= 0.0001}
+    price_data = await fetch_token_price_cached(config["native_token"]) if funded else None
 
-        if native_balance < 0.0001:
-            return []
+    wallet_assets = {}
+    for wallet, result in balances.items():
+        if "error" in result:
+            ctx.logger.error(f"Error on {config['name']} for {wallet[:10]}...: {result['error'][:100]}")
+            wallet_assets[wallet] = []
+            continue
 
-        price_data = await fetch_token_price_cached(config["native_token"])
+        if wallet not in funded:
+            wallet_assets[wallet] = []
+            continue
 
-        enriched_balances = [{
-            "token": config["native_symbol"],
-            "balance": native_balance,
-            "price": price_data["price"],
-            "value_usd": native_balance * price_data["price"],
-            "change_24h": price_data["change_24h"],
-            "chain": chain_lower
-        }]
+        asset = build_native_asset(chain_lower, funded[wallet], price_data)
+        wallet_assets[wallet] = [asset]
 
-        if enriched_balances[0]["value_usd"] > 0.01:
+        if asset["value_usd"] > 0.01:
             ctx.logger.info(
                 f"[{config['name']}] {config['native_symbol']}: "
-                f"{native_balance:.4f} = ${enriched_balances[0]['value_usd']:.2f}"
+                f"{asset['balance']:.4f} = ${asset['value_usd']:.2f}"
             )
 
-        return enriched_balances
+    return wallet_assets
 
-    except Exception as e:
-        ctx.logger.error(f"Error on {config['name']}: {str(e)[:100]}")
-        return []
 
+def wallet_token_lists(chain: str, wallets: List[str]) -> Dict[str, List[Dict]]:
+    """The fixed token list for every wallet plus, with discovery on, the tokens found in its Transfer logs."""
+    listed = chain_tokens.get(chain, [])
+    if not TOKEN_DISCOVERY:
+        return {wallet: listed for wallet in wallets}
 
-def calculate_risk_score(assets: List[Dict]) -> float:
-    if not assets:
-        return 0.0
+    known = {t["address"].lower() for t in listed}
+    return {
+        wallet: listed + [
+            {"address": address, "coingecko_id": f"{chain}:{address}", "discovered": True}
+            for address in token_discovery.tokens(chain, wallet) if address not in known
+        ]
+        for wallet in wallets
+    }
 
-    total_value = sum(a["value_usd"] for a in assets)
-    if total_value == 0:
-        return 0.0
 
-    concentration = sum((a["value_usd"] / total_value) ** 2 for a in assets)
+async def get_token_balances_multicall(ctx: Context, wallets: List[str], chain: str) -> Dict[str, List[Dict]]:
+    wallet_tokens = wallet_token_lists(chain, wallets)
+    wallet_assets = {wallet: [] for wallet in wallets}
 
-    # Volatility risk
-    avg_volatility = sum(abs(a.get("change_24h", 0)) for a in assets) / len(assets)
-    volatility_score = min(avg_volatility / 20, 1)
+    pairs = [(wallet, token) for wallet, tokens in wallet_tokens.items() for token in tokens]
+    if not pairs:
+        return wallet_assets
 
-    unique_chains = len(set(a["chain"] for a in assets))
-    chain_diversity_score = 1.0 if unique_chains == 1 else max(0.0, 1.0 - (unique_chains / 5.0))
+    token_metadata.load(ctx.storage)
+    addresses = list(dict.fromkeys(token["address"] for _, token in pairs))
+    unknown = token_metadata.missing(chain, addresses)
 
-    risk_score = (
-            concentration * 0.35 +
-            volatility_score * 0.45 +
-            chain_diversity_score * 0.20
-    )
+    # decimals()/symbol() only for tokens never seen before, then balanceOf for every pair
+    calls = []
+    for address in unknown:
+        calls.append((address, DECIMALS_SELECTOR))
+        calls.append((address, SYMBOL_SELECTOR))
+    for wallet, token in pairs:
+        calls.append((token["address"], balance_of_call(wallet)))
 
-    return min(risk_score, 1.0)
+    web3 = await rpc_registry.get(chain)
+    results = await aggregate3(web3, calls, max_calls=MULTICALL_MAX_CALLS)
 
+    for i, address in enumerate(unknown):
+        (decimals_ok, decimals_data), (symbol_ok, symbol_data) = results[2 * i], results[2 * i + 1]
+        decimals = decode_uint(decimals_data) if decimals_ok else None
+        if decimals is None:
+            continue
+        symbol = decode_symbol(symbol_data) if symbol_ok else None
+        token_metadata.set(chain, address, symbol or address[:10], decimals)
 
-@portfolio_agent.on_message(model=Portfolio)
-async def register_portfolio(ctx: Context, sender: str, msg: Portfolio):
-    ctx.logger.info(f"📝 Registering portfolio for: {msg.user_id}")
+    token_metadata.save(ctx.storage)
 
-    invalid_wallets = []
-    valid_wallets = []
+    holdings = []
+    for (wallet, token), (success, data) in zip(pairs, results[2 * len(unknown):]):
+        metadata = token_metadata.get(chain, token["address"])
+        raw_amount = decode_uint(data) if success else None
+        if not metadata or not raw_amount:
+            continue
 
-    for wallet in msg.wallets:
-        validation = validate_wallet_address(wallet)
-        if validation["valid"]:
-            valid_wallets.append(validation["checksum"])
-        else:
-            invalid_wallets.append(f"{wallet}: {validation['error']}")
+        balance = raw_amount / 10 ** metadata["decimals"]
+        if balance >= 0.0001:
+            holdings.append((wallet, token, metadata, balance))
 
-    if invalid_wallets:
-        error_msg = "Invalid wallet(s): " + "; ".join(invalid_wallets)
-        await ctx.send(sender, MessageResponse(message=error_msg))
-        return
+    prices = await fetch_token_prices_batch([token["coingecko_id"] for _, token, _, _ in holdings])
 
-    invalid_chains = [c for c in msg.chains if c.lower() not in CHAIN_CONFIG]
-    if invalid_chains:
-        supported = ", ".join(get_supported_chains())
-        error_msg = f"Unsupported chain(s): {', '.join(invalid_chains)}. Supported: {supported}"
-        await ctx.send(sender, MessageResponse(message=error_msg))
-        return
+    for wallet, token, metadata, balance in holdings:
+        price_data = prices[token["coingecko_id"].lower()]
+        # Discovered tokens CoinGecko cannot price are mostly airdropped spam; leave them out
+        if token.get("discovered") and not price_data["price"]:
+            continue
+
+        wallet_assets[wallet].append({
+            "token": metadata["symbol"],
+            "balance": balance,
+            "price": price_data["price"],
+            "value_usd": balance * price_data["price"],
+            "change_24h": price_data["change_24h"],
+            "chain": chain,
+            "address": token["address"]
+        })
+
+    return wallet_assets
+
+
+async def discover_wallet_tokens(ctx: Context, wallets: List[str], chain: str):
+    token_discovery.load(ctx.storage)
+    found = await token_discovery.discover(chain, wallets)
+    token_discovery.save(ctx.storage)
 
-    if len(msg.chains) > 5:
-        await ctx.send(
-            sender,
-            MessageResponse(message="⚠️ Max 5 chains on Agentverse. Please select your top chains.")
+    if found:
+        ctx.logger.info(
+            f"🔎 [{CHAIN_CONFIG[chain]['name']}] Discovered {sum(len(t) for t in found.values())} "
+            f"new token(s) across {len(found)} wallet(s)"
         )
+
+
+async def get_defi_positions(ctx: Context, wallets: List[str], chain: str) -> Dict[str, List[Dict]]:
+    """
+    Lending positions as one net-USD asset per wallet and market; LP holdings
+    as their share of each underlying token, priced like any other token.
+    """
+    token_metadata.load(ctx.storage)
+    positions = await defi_position_reader.read(chain, wallets)
+    token_metadata.save(ctx.storage)
+
+    price_ids = {
+        token["address"]: token_price_ids.get((chain, token["address"]), f"{chain}:{token['address']}")
+        for wallet_positions in positions.values() for position in wallet_positions
+        if position["kind"] == "lp" for token in position["underlying"]
+    }
+    prices = await fetch_token_prices_batch(list(price_ids.values())) if price_ids else {}
+
+    wallet_assets = {wallet: [] for wallet in wallets}
+    for wallet, wallet_positions in positions.items():
+        for position in wallet_positions:
+            if position["kind"] == "lending":
+                net_value = max(position["collateral_usd"] - position["debt_usd"], 0.0)
+                wallet_assets[wallet].append({
+                    "token": position["protocol"],
+                    "balance": net_value,
+                    "price": 1.0,
+                    "value_usd": net_value,
+                    "change_24h": 0.0,
+                    "chain": chain,
+                    "protocol": position["protocol"],
+                    "position": "lending",
+                    "pool": position["pool"],
+                    "wallet": wallet,
+                    "collateral_usd": position["collateral_usd"],
+                    "debt_usd": position["debt_usd"],
+                    "health_factor": position["health_factor"],
+                    "liquidation_threshold": position["liquidation_threshold"],
+                    "ltv": position["ltv"]
+                })
+
+                health_factor = position["health_factor"]
+                if health_factor is not None and health_factor < DEFI_HEALTH_FACTOR_WARNING:
+                    ctx.logger.warning(
+                        f"⚠️ [{CHAIN_CONFIG[chain]['name']}] {position['protocol']} health factor {health_factor:.2f} "
+                        f"for {wallet[:10]}... (${position['debt_usd']:.2f} debt)"
+                    )
+                continue
+
+            for token in position["underlying"]:
+                price_data = prices[price_ids[token["address"]].lower()]
+                if not price_data["price"]:
+                    continue
+                wallet_assets[wallet].append({
+                    "token": token["symbol"],
+                    "balance": token["amount"],
+                    "price": price_data["price"],
+                    "value_usd": token["amount"] * price_data["price"],
+                    "change_24h": price_data["change_24h"],
+                    "chain": chain,
+                    "address": token["address"],
+                    "protocol": position["protocol"],
+                    "position": "lp",
+                    "pool": position["pool"]
+                })
+
+    found = sum(len(p) for p in positions.values())
+    if found:
+        ctx.logger.info(
+            f"🏦 [{CHAIN_CONFIG[chain]['name']}] {found} DeFi position(s) across "
+            f"{sum(1 for p in positions.values() if p)} wallet(s)"
+        )
+
+    return wallet_assets
+
+
+async def scan_token_holdings(ctx: Context, wallets: List[str], chain: str) -> Dict[str, List[Dict]]:
+    if TOKEN_DISCOVERY:
+        try:
+            await discover_wallet_tokens(ctx, wallets, chain)
+        except Exception as e:
+            ctx.logger.error(f"Token discovery error on {chain}: {str(e)[:100]}")
+
+    return await get_token_balances_multicall(ctx, wallets, chain)
+
+
+async def scan_chain_holdings(ctx: Context, wallets: List[str], chain: str) -> Dict[str, List[Dict]]:
+    wallet_assets = await get_wallet_balances_batch(ctx, wallets, chain)
+
+    # Token balances and DeFi positions are independent eth_calls, so they run side by side
+    stages = {}
+    if ERC20_SCAN:
+        stages["ERC-20 scan"] = scan_token_holdings(ctx, wallets, chain.lower())
+    if DEFI_POSITIONS and chain.lower() in defi_position_reader.chains:
+        stages["DeFi position read"] = get_defi_positions(ctx, wallets, chain.lower())
+
+    results = await asyncio.gather(*stages.values(), return_exceptions=True)
+    for stage, result in zip(stages, results):
+        if isinstance(result, Exception):
+            ctx.logger.error(f"{stage} error on {chain}: {str(result)[:100]}")
+            continue
+        for wallet, assets in result.items():
+            wallet_assets.setdefault(wallet, []).extend(assets)
+
+    return wallet_assets
+
+
+async def get_wallet_balance_lightweight(ctx: Context, wallet: str, chain: str) -> List[Dict]:
+
+    validation = validate_wallet_address(wallet)
+    if not validation["valid"]:
+        raise ValueError(f"Invalid wallet: {validation['error']}")
+
+    wallet_checksum = validation["checksum"]
+    wallet_assets = await get_wallet_balances_batch(ctx, [wallet_checksum], chain)
+    return wallet_assets.get(wallet_checksum, [])
+
+
+def merge_wallet_assets(assets: List[Dict]) -> List[Dict]:
+    merged = {}
+
+    for asset in assets:
+        # LP and lending entries stay apart from plain holdings; lending ones also per wallet
+        key = (asset["chain"], asset.get("address") or asset["token"], asset.get("pool"), asset.get("wallet"))
+        if key not in merged:
+            merged[key] = dict(asset)
+            continue
+
+        merged[key]["balance"] += asset["balance"]
+        merged[key]["value_usd"] += asset["value_usd"]
+
+    return list(merged.values())
+
+
+def scan_job_calls(chain: str) -> int:
+    """RPC requests one scan_chain_holdings job makes for a batch of wallets on chain."""
+    # Balance cache adds a head-block call and a nonce batch ahead of the balance batch
+    calls = 3 if BALANCE_CACHE else 1
+
+    if ERC20_SCAN and (chain_tokens.get(chain) or TOKEN_DISCOVERY):
+        calls += 1
+    if ERC20_SCAN and TOKEN_DISCOVERY:
+        # Head block plus one sent/received eth_getLogs pair once backfilled
+        calls += 3
+    if DEFI_POSITIONS and chain in defi_position_reader.chains:
+        calls += 1
+
+    return calls
+
+
+def estimate_scan_cost(portfolio: Dict) -> Dict:
+    """
+    A portfolio's share of a scan cycle's RPC requests and price ids.
+
+    A cycle reads each chain's unique wallets in batch-sized jobs, so a
+    chain's first job is charged once per tick (keyed by chain) and each
+    wallet adds its fraction of a job (keyed by chain and wallet). Price ids
+    are a set. The scheduler only charges keys not already charged this
+    tick, so portfolios sharing chains, wallets or tokens pay for them once.
+    """
+    rpc_calls = {}
+
+    for chain in portfolio["chains"]:
+        job_calls = scan_job_calls(chain)
+        per_wallet = job_calls / rpc_registry.batch_limit(chain)
+        rpc_calls[chain] = job_calls
+        for wallet in portfolio["wallets"]:
+            rpc_calls[f"{chain}:{wallet}"] = per_wallet
+
+    return {"rpc": rpc_calls, "price_ids": scan_price_ids(portfolio["chains"])}
+
+
+def schedule_portfolio(user_id: str, portfolio: Dict):
+    global _block_watch_dirty
+    _block_watch_dirty = True
+    wallet_registry.subscribe(user_id, portfolio["wallets"], portfolio["chains"])
+    last_scan = portfolio.get("last_scan")
+    scan_scheduler.upsert(
+        user_id,
+        cost=estimate_scan_cost(portfolio),
+        last_scan=datetime.fromisoformat(last_scan).timestamp() if last_scan else None,
+        risk_score=portfolio.get("last_risk_score", 0.0),
+        value_usd=portfolio.get("last_value_usd", 0.0),
+        volatility=portfolio.get("last_volatility", 0.0)
+    )
+
+
+def sync_scheduler(ctx: Context, keys: List[str]):
+    for portfolio_key in keys:
+        user_id = portfolio_key.replace("portfolio_", "")
+        if user_id in scan_scheduler:
+            continue
+
+        portfolio = ctx.storage.get(portfolio_key)
+        if portfolio:
+            schedule_portfolio(user_id, portfolio)
+
+
+@portfolio_agent.on_message(model=Portfolio)
+async def register_portfolio(ctx: Context, sender: str, msg: Portfolio):
+    ctx.logger.info(f"📝 Registering portfolio for: {msg.user_id}")
+
+    checked = check_portfolio(msg.wallets, msg.chains)
+    if checked["error"]:
+        await ctx.send(sender, MessageResponse(message=checked["error"]))
         return
 
     portfolio_key = f"portfolio_{msg.user_id}"
-    ctx.storage.set(portfolio_key, {
-        "wallets": valid_wallets,
-        "chains": [c.lower() for c in msg.chains],
+    portfolio = {
+        "wallets": checked["wallets"],
+        "chains": checked["chains"],
         "registered_at": msg.timestamp,
         "owner": sender,
         "last_scan": None
-    })
+    }
+    updates = {portfolio_key: portfolio}
 
     keys = ctx.storage.get("portfolio_keys") or []
     if portfolio_key not in keys:
-        keys.append(portfolio_key)
-        ctx.storage.set("portfolio_keys", keys)
+        updates["portfolio_keys"] = keys + [portfolio_key]
+
+    write_many(ctx.storage, updates)
+    schedule_portfolio(msg.user_id, portfolio)
 
     await ctx.send(
         sender,
         MessageResponse(
-            message=f"✅ Portfolio registered: {len(valid_wallets)} wallet(s), {len(msg.chains)} chain(s). Scanning starts next cycle."
+            message=f"✅ Portfolio registered: {len(checked['wallets'])} wallet(s), {len(msg.chains)} chain(s). Scanning starts next cycle."
         )
     )
 
 
-async def scan_single_portfolio(ctx: Context, user_id: str):
-    portfolio = ctx.storage.get(f"portfolio_{user_id}")
-    if not portfolio:
-        return None
+def bulk_item_error(item: Any) -> Optional[str]:
+    """Why one bulk registration entry is malformed (types only; check_portfolio validates the values)."""
+    if not isinstance(item, dict):
+        return "Portfolio must be an object"
+    if not isinstance(item.get("user_id"), str) or not item["user_id"]:
+        return "Missing user_id"
+    for field in ("wallets", "chains"):
+        values = item.get(field)
+        if values is not None and (not isinstance(values, list) or not all(isinstance(v, str) for v in values)):
+            return f"{field} must be a list of strings"
+    if item.get("timestamp") is not None and not isinstance(item["timestamp"], str):
+        return "timestamp must be a string"
+    return None
+
+
+def check_portfolios_bulk(portfolios: List[Any]) -> List[Dict]:
+    """
+    bulk_item_error, then check_portfolio, for every entry in order. Touches
+    neither storage nor the scheduler, so callers run it in a worker thread
+    and keep the event loop free while tens of thousands of wallets are
+    checksummed.
+    """
+    checks = []
+    for item in portfolios:
+        error = bulk_item_error(item)
+        if error:
+            checks.append({"malformed": error})
+        else:
+            checks.append(check_portfolio(item.get("wallets") or [], item.get("chains") or []))
+    return checks
+
+
+def register_portfolios_bulk(storage, portfolios: List[Dict], owner: str, checks: Optional[List[Dict]] = None) -> Dict:
+    """
+    Validate and store many portfolios with a single storage commit.
+
+    Invalid portfolios are rejected individually (same rules as a single
+    registration), as are user_ids already registered by another owner; the
+    rest are written together with the updated portfolio_keys index and
+    scheduled for their first scan. Pass checks from check_portfolios_bulk
+    when the validation has already been done off the event loop.
+    """
+    if checks is None:
+        checks = check_portfolios_bulk(portfolios)
+
+    keys = storage.get("portfolio_keys") or []
+    known = set(keys)
+    now = datetime.now(timezone.utc).isoformat()
+    updates = {}
+    rejected = []
+
+    for item, checked in zip(portfolios, checks):
+        error = checked.get("malformed")
+        if error:
+            user_id = item.get("user_id") if isinstance(item, dict) and isinstance(item.get("user_id"), str) else None
+            rejected.append({"user_id": user_id, "error": error})
+            continue
 
-    all_assets = []
-    total_value = 0
+        user_id = item["user_id"]
+        existing = storage.get(f"portfolio_{user_id}")
+        if existing and existing.get("owner") not in (None, owner):
+            rejected.append({"user_id": user_id, "error": "Registered by another owner"})
+            continue
 
-    wallet = portfolio["wallets"][0]
+        if checked["error"]:
+            rejected.append({"user_id": user_id, "error": checked["error"]})
+            continue
 
-    chains_to_scan = portfolio["chains"][:3]
+        portfolio_key = f"portfolio_{user_id}"
+        updates[portfolio_key] = {
+            "wallets": checked["wallets"],
+            "chains": checked["chains"],
+            "registered_at": item.get("timestamp") or now,
+            "owner": owner,
+            "last_scan": None
+        }
+        if portfolio_key not in known:
+            known.add(portfolio_key)
+            keys.append(portfolio_key)
 
-    ctx.logger.info(f"🔍 Scanning {wallet[:10]}... on {len(chains_to_scan)} chain(s)")
+    registered = len(updates)
+    if updates:
+        write_many(storage, {**updates, "portfolio_keys": keys})
+        for portfolio_key, portfolio in updates.items():
+            schedule_portfolio(portfolio_key[len("portfolio_"):], portfolio)
 
-    for chain in chains_to_scan:
-        try:
-            balances = await get_wallet_balance_lightweight(ctx, wallet, chain)
-            all_assets.extend(balances)
-            total_value += sum(b["value_usd"] for b in balances)
+    return {"registered": registered, "rejected": rejected}
 
-            await asyncio.sleep(0.5)
 
-        except Exception as e:
-            ctx.logger.error(f"Error on {chain}: {str(e)[:50]}")
+@portfolio_agent.on_message(model=PortfolioBatch)
+async def register_portfolio_batch(ctx: Context, sender: str, msg: PortfolioBatch):
+    ctx.logger.info(f"📝 Bulk registering {len(msg.portfolios)} portfolio(s) from {sender[:16]}...")
+
+    portfolios = [p.dict() for p in msg.portfolios]
+    checks = await asyncio.to_thread(check_portfolios_bulk, portfolios)
+    result = register_portfolios_bulk(ctx.storage, portfolios, owner=sender, checks=checks)
+
+    ctx.logger.info(f"✅ Bulk registration: {result['registered']} registered, {len(result['rejected'])} rejected")
+    await ctx.send(
+        sender,
+        BulkRegistrationResponse(
+            registered=result["registered"],
+            rejected=result["rejected"],
+            message=f"✅ {result['registered']} portfolio(s) registered, {len(result['rejected'])} rejected. Scanning starts next cycle."
+        )
+    )
+
+
+async def record_snapshot(
+        ctx: Context,
+        user_id: str,
+        total_value: float,
+        risk_score: float,
+        volatility: float,
+        asset_count: int
+):
+    now = datetime.now(timezone.utc).timestamp()
+    # Claimed before the await so concurrent scans of one user do not both compact
+    compact = now - _last_compaction.get(user_id, 0) >= SNAPSHOT_COMPACT_INTERVAL
+    if compact:
+        _last_compaction[user_id] = now
+
+    def write():
+        snapshot_store.append(user_id, total_value, risk_score, volatility, asset_count, timestamp=now)
+        if compact:
+            snapshot_store.compact(user_id, now)
+
+    try:
+        # Segment writes and compaction are file I/O; keep them off the event loop
+        await asyncio.to_thread(write)
+    except OSError as e:
+        ctx.logger.error(f"Snapshot store error for {user_id}: {e}")
+
+
+def legacy_snapshot_records(snapshots: List[Dict]) -> List[Tuple[float, float, float, float, int]]:
+    """(timestamp, value, risk, volatility, asset count) of old PortfolioSnapshot dicts, oldest first."""
+    records = []
+    for snapshot in snapshots:
+        try:
+            timestamp = datetime.fromisoformat(snapshot["timestamp"]).timestamp()
+            assets = snapshot.get("assets") or []
+            volatility = sum(abs(a.get("change_24h", 0)) for a in assets) / len(assets) if assets else 0.0
+            records.append((timestamp, float(snapshot["total_value_usd"]), float(snapshot["risk_score"]), volatility, len(assets)))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
+    return sorted(records)
+
+
+async def import_legacy_snapshots(ctx: Context, keys: List[str]) -> int:
+    """
+    One-off import of the snapshots_{user_id} lists older versions kept in
+    agent storage (each portfolio's last five snapshots) into the snapshot
+    store. Records not newer than the store's latest for that user are
+    skipped, and imported keys are removed, so later startups do nothing.
+    """
+    legacy = {}
+    for portfolio_key in keys:
+        user_id = portfolio_key.replace("portfolio_", "")
+        snapshots = ctx.storage.get(f"snapshots_{user_id}")
+        if snapshots:
+            legacy[user_id] = snapshots
+    if not legacy:
+        return 0
+
+    def write() -> int:
+        imported = 0
+        for user_id, snapshots in legacy.items():
+            latest = snapshot_store.latest(user_id)
+            after = latest["timestamp"] if latest else 0.0
+            for timestamp, value, risk, volatility, asset_count in legacy_snapshot_records(snapshots):
+                if timestamp > after:
+                    snapshot_store.append(user_id, value, risk, volatility, asset_count, timestamp=timestamp)
+                    imported += 1
+        return imported
+
+    try:
+        imported = await asyncio.to_thread(write)
+    except OSError as e:
+        ctx.logger.error(f"Legacy snapshot import failed, keeping snapshots_* keys: {e}")
+        return 0
+
+    write_many(ctx.storage, {}, removals=[f"snapshots_{user_id}" for user_id in legacy])
+    ctx.logger.info(f"🗂️ Imported {imported} legacy snapshot(s) of {len(legacy)} portfolio(s) into {SNAPSHOT_DIR}")
+    return imported
+
+
+async def scan_wallet_holdings(ctx: Context, chain_wallets: Dict[str, List[str]]) -> Dict[tuple, List[Dict]]:
+    """
+    Read each (chain, wallet) once: wallets are split into batch-sized jobs per
+    chain (batched eth_getBalance plus one Multicall3 eth_call each) and run
+    on the chain pools. Wallets on a failed job are missing from the result.
+    """
+    await fetch_token_prices_batch(list(scan_price_ids(list(chain_wallets))))
+
+    jobs = []
+    for chain, wallets in chain_wallets.items():
+        size = rpc_registry.batch_limit(chain)
+        for start in range(0, len(wallets), size):
+            jobs.append((chain, (ctx, wallets[start:start + size], chain)))
+
+    results = await chain_pools.map(jobs, scan_chain_holdings)
+
+    holdings = {}
+    for (chain, (_, wallets, _)), result in zip(jobs, results):
+        if isinstance(result, Exception):
+            ctx.logger.error(f"Error on {chain} for {len(wallets)} wallet(s): {str(result)[:50]}")
             continue
+        for wallet, assets in result.items():
+            holdings[(chain, wallet)] = assets
+
+    return holdings
+
+
+async def scan_single_portfolio(
+        ctx: Context,
+        user_id: str,
+        holdings: Optional[Dict[tuple, List[Dict]]] = None,
+        updates: Optional[Dict[str, Dict]] = None
+):
+    # With updates, the portfolio record is collected there for one commit per cycle instead of written here
+    portfolio = ctx.storage.get(f"portfolio_{user_id}")
+    if not portfolio:
+        return None
+
+    wallets = portfolio["wallets"]
+    chains = portfolio["chains"]
+
+    if holdings is None:
+        ctx.logger.info(f"🔍 Scanning {len(wallets)} wallet(s) on {len(chains)} chain(s)")
+        rate_limit_owner.set(user_id)
+        holdings = await scan_wallet_holdings(ctx, {chain: wallets for chain in chains})
+
+    all_assets = []
+    for chain in chains:
+        for wallet in wallets:
+            all_assets.extend(holdings.get((chain, wallet), []))
+
+    all_assets = merge_wallet_assets(all_assets)
+    total_value = sum(a["value_usd"] for a in all_assets)
 
     if not all_assets:
         ctx.logger.info(f"No assets found for {user_id}")
         return None
 
     risk_score = calculate_risk_score(all_assets)
+    if REVALUE:
+        holdings_matrix.upsert(user_id, all_assets, [asset_price_id(a) for a in all_assets], risk_score)
 
     snapshot = PortfolioSnapshot(
         user_id=user_id,
@@ -366,49 +1570,438 @@ async def scan_single_portfolio(ctx: Context, user_id: str):
         risk_score=risk_score
     )
 
-    snapshots = ctx.storage.get(f"snapshots_{user_id}") or []
-    snapshots.append(snapshot.dict())
-    ctx.storage.set(f"snapshots_{user_id}", snapshots[-5:])
+    volatility = sum(abs(a.get("change_24h", 0)) for a in all_assets) / len(all_assets)
+    await record_snapshot(ctx, user_id, total_value, risk_score, volatility, len(all_assets))
 
-    portfolio["last_scan"] = datetime.now(timezone.utc).isoformat()
-    ctx.storage.set(f"portfolio_{user_id}", portfolio)
+    # Only the scan's own fields are written back, merged into the record as it is at commit time
+    result = {
+        "last_scan": datetime.now(timezone.utc).isoformat(),
+        "last_risk_score": risk_score,
+        "last_value_usd": total_value,
+        "last_volatility": volatility
+    }
 
     ctx.logger.info(f"📊 ${total_value:.2f}, Risk: {risk_score:.2%}")
 
-    if total_value > 1.0:
+    # Borrowers are forwarded even when their net value is ~0: that is when liquidation risk matters most
+    has_debt = any(a.get("debt_usd") for a in all_assets)
+    forward_reason = None
+    if total_value > 1.0 or has_debt:
+        fingerprint = snapshot_fingerprint(all_assets, total_value)
+        previous = (ctx.storage.get(f"portfolio_{user_id}") or portfolio).get("last_forwarded")
+        forward_reason = change_gate.check(previous, fingerprint) if FORWARD_GATE else "gate off"
+        if forward_reason:
+            result["last_forwarded"] = fingerprint
+
+    if updates is None:
+        commit_scan_results(ctx.storage, {f"portfolio_{user_id}": result})
+    else:
+        updates[f"portfolio_{user_id}"] = result
+
+    if forward_reason:
         RISK_AGENT_ADDRESS = os.getenv("RISK_AGENT_ADDRESS")
         await ctx.send(RISK_AGENT_ADDRESS, snapshot)
+        ctx.logger.info(f"📤 Forwarded to Risk Agent ({forward_reason})")
+    elif total_value > 1.0 or has_debt:
+        ctx.logger.info("⏸️ No material change since last forward, not sent to Risk Agent")
 
     return snapshot
 
 
-@portfolio_agent.on_interval(period=600.0)
-async def monitor_portfolios(ctx: Context):
-    keys = ctx.storage.get("portfolio_keys") or []
+async def run_scheduled_scan(
+        ctx: Context,
+        user_id: str,
+        holdings: Optional[Dict[tuple, List[Dict]]] = None,
+        updates: Optional[Dict[str, Dict]] = None
+):
+    try:
+        snapshot = await scan_single_portfolio(ctx, user_id, holdings, updates)
+    except Exception as e:
+        ctx.logger.error(f"Scan error for {user_id}: {str(e)[:100]}")
+        scan_scheduler.mark_due(user_id, datetime.now(timezone.utc).timestamp() + scan_scheduler.min_interval)
+        return
 
-    if not keys:
+    if snapshot is None:
+        scan_scheduler.record_scan(user_id, risk_score=0.0, value_usd=0.0, volatility=0.0)
         return
 
-    scan_index = ctx.storage.get("scan_index") or 0
+    portfolio = (updates or {}).get(f"portfolio_{user_id}") or ctx.storage.get(f"portfolio_{user_id}") or {}
+    due_at = scan_scheduler.record_scan(
+        user_id,
+        risk_score=snapshot.risk_score,
+        value_usd=snapshot.total_value_usd,
+        volatility=portfolio.get("last_volatility", 0.0)
+    )
+    ctx.logger.info(f"⏱️ Next scan for {user_id} in {(due_at - datetime.now(timezone.utc).timestamp()) / 60:.0f} min")
 
-    if scan_index >= len(keys):
-        scan_index = 0
 
-    if scan_index < len(keys):
-        portfolio_key = keys[scan_index]
+def store_portfolios(ctx: Context, portfolios: Dict[str, Dict]):
+    keys = ctx.storage.get("portfolio_keys") or []
+    known = set(keys)
+    updates = {}
+
+    for user_id, portfolio in portfolios.items():
+        portfolio_key = f"portfolio_{user_id}"
+        updates[portfolio_key] = portfolio
+        if portfolio_key not in known:
+            known.add(portfolio_key)
+            keys.append(portfolio_key)
+
+    write_many(ctx.storage, {**updates, "portfolio_keys": keys})
+    for user_id, portfolio in portfolios.items():
+        schedule_portfolio(user_id, portfolio)
+
+
+def drop_portfolios(ctx: Context, user_ids: List[str]):
+    global _block_watch_dirty
+    _block_watch_dirty = True
+    removed = {f"portfolio_{user_id}" for user_id in user_ids}
+    keys = [k for k in ctx.storage.get("portfolio_keys") or [] if k not in removed]
+    write_many(ctx.storage, {"portfolio_keys": keys}, removals=list(removed))
+    for user_id in user_ids:
+        scan_scheduler.remove(user_id)
+        wallet_registry.unsubscribe(user_id)
+        holdings_matrix.remove(user_id)
+
+
+async def rebalance_shards(ctx: Context):
+    """
+    Heartbeat, refresh ring membership, and hand every portfolio this worker
+    no longer owns to its owner. Registrations that land on any worker reach
+    their owner the same way.
+    """
+    shard_membership.heartbeat()
+    if shard_membership.refresh():
+        ctx.logger.info(f"🧩 Shard ring changed: {len(shard_membership.members)} worker(s)")
+
+    outgoing: Dict[str, Dict[str, Dict]] = {}
+    for portfolio_key in ctx.storage.get("portfolio_keys") or []:
         user_id = portfolio_key.replace("portfolio_", "")
+        owner = shard_membership.owner(user_id)
+        if owner is None or owner == shard_membership.worker_id:
+            continue
+        portfolio = ctx.storage.get(portfolio_key)
+        if portfolio:
+            outgoing.setdefault(owner, {})[user_id] = portfolio
+
+    for owner, portfolios in outgoing.items():
+        user_ids = list(portfolios)
+        for start in range(0, len(user_ids), SHARD_HANDOFF_BATCH):
+            batch = {user_id: portfolios[user_id] for user_id in user_ids[start:start + SHARD_HANDOFF_BATCH]}
+            status = await ctx.send(shard_membership.address_of(owner), PortfolioHandoff(portfolios=batch))
+            # Only a confirmed delivery lets go of the portfolios; "sent" may still be sitting in a mailbox
+            if getattr(status, "status", None) != DeliveryStatus.DELIVERED:
+                ctx.logger.warning(
+                    f"⚠️ Handoff to {owner[:16]}... not confirmed ({getattr(status, 'status', 'no status')}), "
+                    f"keeping {len(batch)} portfolio(s)"
+                )
+                continue
+            drop_portfolios(ctx, list(batch))
+            ctx.logger.info(f"🧩 Handed {len(batch)} portfolio(s) to {owner[:16]}...")
+
+
+@portfolio_agent.on_message(model=PortfolioHandoff)
+async def receive_portfolio_handoff(ctx: Context, sender: str, msg: PortfolioHandoff):
+    if shard_membership is None:
+        return
+
+    shard_membership.refresh()
+    if not shard_membership.is_member_address(sender):
+        ctx.logger.warning(f"⚠️ Ignoring portfolio handoff from non-member {sender[:16]}...")
+        return
+
+    store_portfolios(ctx, msg.portfolios)
+    ctx.logger.info(f"🧩 Received {len(msg.portfolios)} portfolio(s) from {sender[:16]}...")
+
+
+async def on_block_touched(ctx: Context, chain: str, wallets: set, block: int):
+    watched = watched_wallets.get(chain, {})
+    due = set()
+    for address in wallets:
+        wallet = watched.get(address)
+        if not wallet:
+            continue
+        # Incoming transfers leave the nonce unchanged, so the cached balance must go
+        balance_cache.invalidate(chain, wallet)
+        due.update(wallet_registry.subscribers(chain, wallet))
+
+    for user_id in due:
+        scan_scheduler.mark_due(user_id)
+
+    if due:
+        ctx.logger.info(
+            f"⛓️ Block {block} on {CHAIN_CONFIG[chain]['name']} touched {len(wallets)} wallet(s): "
+            f"{len(due)} portfolio(s) due for rescan"
+        )
+
+
+def block_watch_pacing(chain: str) -> Tuple[float, int]:
+    """
+    (poll interval, max catch-up) for a chain's watcher. Fast chains poll as
+    often as BLOCK_WATCH_MIN_INTERVAL allows, and the catch-up leaves room for
+    two polls' worth of blocks, so only a stalled watcher skips any.
+    """
+    config = CHAIN_CONFIG[chain]
+    block_time = config.get("block_time", BLOCK_WATCH_INTERVAL)
+    interval = config.get("block_watch_interval", min(BLOCK_WATCH_INTERVAL, max(block_time, BLOCK_WATCH_MIN_INTERVAL)))
+    return interval, max(BLOCK_WATCH_MAX_CATCHUP, 2 * math.ceil(interval / block_time))
+
+
+def refresh_block_watch(ctx: Context):
+    """Rebuild each chain's address index from the wallet registry and start or stop its watcher."""
+    global _block_watch_dirty
+    _block_watch_dirty = False
+
+    watched_wallets.clear()
+    for chain in wallet_registry.chains():
+        watched_wallets[chain] = {wallet.lower(): wallet for wallet in wallet_registry.wallets(chain)}
+
+    for chain, chain_wallets in watched_wallets.items():
+        if chain not in block_watchers:
+            interval, max_catchup = block_watch_pacing(chain)
+            block_watchers[chain] = BlockWatcher(
+                rpc_registry,
+                chain,
+                AddressIndex(),
+                partial(on_block_touched, ctx),
+                poll_interval=interval,
+                max_catchup=max_catchup
+            )
+        block_watchers[chain].index.rebuild(chain_wallets.keys())
+        block_watchers[chain].start()
+
+    for chain, watcher in block_watchers.items():
+        if chain not in watched_wallets:
+            watcher.index.rebuild([])
+
+    ctx.logger.info(
+        f"⛓️ Block watch: {sum(len(w) for w in watched_wallets.values())} wallet(s) on {len(watched_wallets)} chain(s)"
+    )
+
 
-        ctx.logger.info(f"🔄 Scanning portfolio {scan_index + 1}/{len(keys)}: {user_id}")
+async def run_scan_cycle(ctx: Context, due: List[str]) -> int:
+    """
+    One scheduler tick's scans, run by the scan supervisor; returns how many
+    portfolios finished. Portfolios whose scan did not finish (cycle error,
+    deadline, shutdown) are put back on the schedule after the minimum
+    interval.
+    """
+    pending = set(due)
+    updates: Dict[str, Dict] = {}
+    # Set in this cycle's own task, so the chain pool jobs it submits queue under it
+    rate_limit_owner.set(f"cycle-{next(_cycle_owners)}")
 
+    async def scan(user_id: str, holdings: Dict[tuple, List[Dict]]):
+        await run_scheduled_scan(ctx, user_id, holdings, updates)
+        pending.discard(user_id)
+
+    try:
+        # Every wallet shared by the due portfolios is read once and fanned out to each of them
+        chain_wallets = wallet_registry.group(due)
+        due_set = set(due)
+        unique = sum(len(wallets) for wallets in chain_wallets.values())
+        subscriptions = sum(
+            len(wallet_registry.subscribers(chain, wallet) & due_set)
+            for chain, wallets in chain_wallets.items() for wallet in wallets
+        )
+        ctx.logger.info(
+            f"🔄 Scanning {len(due)} due portfolio(s) of {len(scan_scheduler)}: "
+            f"{unique} unique wallet/chain pair(s) for {subscriptions} subscription(s)"
+        )
+
+        # One CoinGecko call prices every chain and token the whole tick needs
         try:
-            await scan_single_portfolio(ctx, user_id)
+            holdings = await scan_wallet_holdings(ctx, chain_wallets)
         except Exception as e:
-            ctx.logger.error(f"Scan error for {user_id}: {str(e)[:100]}")
+            ctx.logger.error(f"Cycle scan error: {str(e)[:100]}")
+            return 0
+
+        await asyncio.gather(*(scan(user_id, holdings) for user_id in due))
+    finally:
+        # One storage write for the whole cycle, merged into the records as they are now
+        if updates:
+            commit_scan_results(ctx.storage, updates)
+        if pending:
+            retry_at = datetime.now(timezone.utc).timestamp() + scan_scheduler.min_interval
+            for user_id in pending:
+                scan_scheduler.mark_due(user_id, retry_at)
+
+    for host, stats in rpc_registry.rate_limiter.stats().items():
+        if stats["waited"] or stats["throttled"]:
+            ctx.logger.info(
+                f"🚦 {host}: {stats['waited']}/{stats['acquired']} requests queued, "
+                f"avg wait {stats['avg_wait'] * 1000:.0f} ms (max {stats['max_wait'] * 1000:.0f} ms), "
+                f"{stats['throttled']} throttled"
+            )
+
+    return len(due) - len(pending)
+
+
+async def run_warmup(ctx: Context, user_ids: List[str]):
+    """
+    Rescan every given portfolio in WARMUP_BATCH-sized cycles, WARMUP_CONCURRENCY
+    at a time. Each cycle shares wallet reads and price calls like a regular
+    tick; progress is kept in warmup_status.
+    """
+    started = datetime.now(timezone.utc)
+    warmup_status.update(state="running", total=len(user_ids), scanned=0, started_at=started.isoformat(), finished_at=None)
+    semaphore = asyncio.Semaphore(WARMUP_CONCURRENCY)
+
+    async def run_batch(batch: List[str]):
+        async with semaphore:
+            finished = await run_scan_cycle(ctx, batch)
+        warmup_status["scanned"] += finished
 
-        scan_index += 1
-        ctx.storage.set("scan_index", scan_index)
+    try:
+        await asyncio.gather(*(
+            run_batch(user_ids[start:start + WARMUP_BATCH]) for start in range(0, len(user_ids), WARMUP_BATCH)
+        ))
+        warmup_status["state"] = "done"
+    except asyncio.CancelledError:
+        warmup_status["state"] = "incomplete"
+        raise
+    finally:
+        finished = datetime.now(timezone.utc)
+        warmup_status["finished_at"] = finished.isoformat()
+        ctx.logger.info(
+            f"🔥 Warm-up {warmup_status['state']}: {warmup_status['scanned']}/{len(user_ids)} portfolio(s) "
+            f"in {(finished - started).total_seconds():.0f}s"
+        )
+
+
+def start_warmup(ctx: Context, keys: List[str]):
+    """
+    Queue the warm-up on the scan supervisor. Its portfolios are parked on
+    the schedule until the window ends, so regular ticks do not scan them
+    twice; any the warm-up does not reach are due again when it closes.
+    """
+    sync_scheduler(ctx, keys)
+    user_ids = [key.replace("portfolio_", "") for key in keys]
+    if shard_membership is not None:
+        user_ids = [user_id for user_id in user_ids if shard_membership.owns(user_id)]
+
+    park_until = datetime.now(timezone.utc).timestamp() + WARMUP_WINDOW
+    for user_id in user_ids:
+        scan_scheduler.mark_due(user_id, park_until)
+
+    scan_supervisor.submit("warmup", partial(run_warmup, ctx, user_ids), deadline=WARMUP_WINDOW, size=len(user_ids))
+    warmup_status.update(state="queued", total=len(user_ids))
+    ctx.logger.info(f"🔥 Warm-up queued: {len(user_ids)} portfolio(s), target {WARMUP_WINDOW / 60:.0f} min")
+
+
+def scan_status() -> Dict:
+    return {
+        "warmup": dict(warmup_status),
+        "supervisor": scan_supervisor.stats(),
+        "scheduler": scan_scheduler.stats(),
+        "forwarding": change_gate.stats(),
+        "price_table": price_table.stats() if price_table is not None else None,
+        "block_watch": {chain: watcher.stats() for chain, watcher in block_watchers.items()},
+        "rate_limits": rpc_registry.rate_limiter.stats() if rpc_registry.rate_limiter is not None else {}
+    }
+
+
+@portfolio_agent.on_interval(period=SCAN_TICK_SECONDS)
+async def monitor_portfolios(ctx: Context):
+    if shard_membership is not None:
+        await rebalance_shards(ctx)
+
+    keys = ctx.storage.get("portfolio_keys") or []
+
+    if not keys:
+        return
+
+    sync_scheduler(ctx, keys)
+
+    if BLOCK_WATCH and _block_watch_dirty:
+        refresh_block_watch(ctx)
+
+    # Leave due portfolios on the schedule while earlier cycles are still waiting to run
+    if scan_supervisor.queued >= SCAN_QUEUE_LIMIT:
+        ctx.logger.warning(f"⚠️ {scan_supervisor.queued} scan cycle(s) still queued, not queuing more this tick")
+        return
+
+    due = scan_scheduler.pop_due({"rpc": SCAN_RPC_BUDGET, "price_ids": SCAN_PRICE_ID_BUDGET})
+    if not due:
+        return
+
+    job_id = f"cycle-{next(_cycle_ids)}"
+    scan_supervisor.submit(job_id, partial(run_scan_cycle, ctx, due), size=len(due))
+    ctx.logger.info(
+        f"📥 Queued {job_id}: {len(due)} portfolio(s) "
+        f"({scan_supervisor.queued} queued, {scan_supervisor.running} running)"
+    )
 
-    ctx.logger.info(f"Next scan in 10 minutes (portfolio {scan_index % len(keys) + 1}/{len(keys)})")
+
+@portfolio_agent.on_interval(period=REVALUE_INTERVAL)
+async def revalue_portfolios(ctx: Context):
+    """
+    Refresh prices for every token held by a scanned portfolio and reprice
+    them all from the holdings matrix. Portfolios whose risk rises past
+    REVALUE_RISK_THRESHOLD go to the risk agent right away and are marked
+    due so their balances are confirmed on the next tick.
+    """
+    if not REVALUE or not len(holdings_matrix):
+        return
+
+    prices = await fetch_token_prices_batch([t for t in holdings_matrix.tokens if t != LENDING_PRICE_ID])
+    if not holdings_matrix.update_prices({t: p for t, p in prices.items() if p["success"]}):
+        return
+
+    crossed = holdings_matrix.revalue(REVALUE_RISK_THRESHOLD)
+    ctx.logger.info(
+        f"💹 Revalued {len(holdings_matrix)} portfolio(s) in {holdings_matrix.last_duration * 1000:.1f} ms: "
+        f"{len(crossed)} crossed risk {REVALUE_RISK_THRESHOLD:.0%}"
+    )
+    if not crossed:
+        return
+
+    RISK_AGENT_ADDRESS = os.getenv("RISK_AGENT_ADDRESS")
+    now = datetime.now(timezone.utc)
+    updates = {}
+
+    for user_id in crossed:
+        if not ctx.storage.has(f"portfolio_{user_id}"):
+            continue
+
+        assets, total_value, risk_score = holdings_matrix.snapshot(user_id)
+        await ctx.send(RISK_AGENT_ADDRESS, PortfolioSnapshot(
+            user_id=user_id,
+            total_value_usd=total_value,
+            assets=assets,
+            timestamp=now.isoformat(),
+            risk_score=risk_score
+        ))
+
+        updates[f"portfolio_{user_id}"] = {
+            "last_risk_score": risk_score,
+            "last_value_usd": total_value,
+            "last_forwarded": snapshot_fingerprint(assets, total_value, now.timestamp())
+        }
+        scan_scheduler.mark_due(user_id)
+
+        ctx.logger.info(f"📤 Forwarded {user_id} to Risk Agent (revalued risk {risk_score:.2%}, ${total_value:.2f})")
+
+    if updates:
+        commit_scan_results(ctx.storage, updates)
+
+
+@portfolio_agent.on_interval(period=PRICE_TABLE_INTERVAL)
+async def refresh_price_table(ctx: Context):
+    """
+    On the price table writer, refetch every published price plus the native
+    and listed tokens of all supported chains in one batch, so readers find
+    the common token set fresh without fetching it themselves.
+    """
+    if price_table is None or not PRICE_TABLE_WRITER:
+        return
+
+    price_ids = sorted(set(price_table.ids()) | {p.lower() for p in scan_price_ids(get_supported_chains())})
+    prices = await fetch_prices(price_ids)
+    for price_id, data in prices.items():
+        price_cache.set(price_id, data)
+    written = price_table.publish(prices)
+    ctx.logger.info(f"💱 Published {written}/{len(price_ids)} price(s) to shared table {PRICE_TABLE}")
 
 
 @portfolio_agent.on_event("startup")
@@ -422,9 +2015,56 @@ async def startup(ctx: Context):
     ctx.logger.info(f"📊 Portfolios: {len(keys)}")
     ctx.logger.info(f"🔗 Chains: {len(supported_chains)}")
     ctx.logger.info("⚡ Optimized for Agentverse limits")
-    ctx.logger.info("🔄 Scans 1 portfolio per 10-min cycle")
+    ctx.logger.info(
+        f"🔄 Priority scheduler: {SCAN_TICK_SECONDS:.0f}s ticks, "
+        f"budget {SCAN_RPC_BUDGET} RPC requests / {SCAN_PRICE_ID_BUDGET} price ids per tick"
+    )
+    ctx.logger.info(f"⚙️  Workers per chain: {SCAN_WORKERS_PER_CHAIN} (default)")
+    scan_supervisor.start()
+    ctx.logger.info(f"🧵 Scan supervisor: {SCAN_CONCURRENT_CYCLES} concurrent cycle(s), {SCAN_CYCLE_DEADLINE:.0f}s deadline")
+    if shard_membership is not None:
+        shard_membership.heartbeat()
+        shard_membership.refresh()
+        ctx.logger.info(f"🧩 Shard worker {shard_membership.worker_id[:16]}... ({len(shard_membership.members)} worker(s) live)")
+    if price_table is not None:
+        if price_table.open():
+            ctx.logger.info(f"💱 Price table {PRICE_TABLE}: {'writer' if PRICE_TABLE_WRITER else 'reader'}, {len(price_table)} price(s)")
+        else:
+            ctx.logger.info(f"💱 Price table {PRICE_TABLE} not created yet, fetching prices locally until it is")
     ctx.logger.info("=" * 60)
 
+    await import_legacy_snapshots(ctx, keys)
+
+    if RPC_WARMUP:
+        warm = await rpc_registry.warm_up()
+        ready = [chain for chain, ok in warm.items() if ok]
+        ctx.logger.info(f"🔌 RPC pool warmed: {len(ready)}/{len(warm)} chain(s) ready")
+
+        for chain, ok in warm.items():
+            if not ok:
+                ctx.logger.warning(f"⚠️ RPC warm-up failed for {CHAIN_CONFIG[chain]['name']}")
+
+    if STARTUP_WARMUP and keys:
+        start_warmup(ctx, keys)
+
+
+@portfolio_agent.on_event("shutdown")
+async def shutdown(ctx: Context):
+    if shard_membership is not None:
+        # Leave the ring first so the remaining workers take over this shard
+        shard_membership.leave()
+        await rebalance_shards(ctx)
+
+    await scan_supervisor.stop()
+    if price_table is not None:
+        price_table.close()
+    await asyncio.gather(*(watcher.stop() for watcher in block_watchers.values()))
+    await chain_pools.close()
+    await rpc_registry.close()
+    if _coingecko_session is not None:
+        await _coingecko_session.close()
+    ctx.logger.info("🔌 RPC connections closed")
+
 
 if __name__ == "__main__":
     portfolio_agent.run()
@@ -2,6 +2,9 @@ from uagents import Agent, Context, Model
 from uagents.setup import fund_agent_if_low
 from datetime import datetime, timezone
 from typing import List, Dict
+from utils.micro_batch import MicroBatcher
+from utils.risk_engine import RiskEngine
+import asyncio
 import os
 from dotenv import load_dotenv
 
@@ -50,6 +53,14 @@ class ErrorResponse(Model):
     message: str
 
 
+class RiskAnalysisBatch(Model):
+    requests: List[RiskAnalysisRequest]
+
+
+class RiskReportBatch(Model):
+    reports: List[RiskReport]
+
+
 risk_agent = Agent(
     name="risk_analysis",
     seed=os.getenv("RISK_AGENT_SEED", "risk_agent_seed"),
@@ -239,110 +250,30 @@ def get_risk_level(score: float) -> str:
         return "low"
 
 
-def analyze_concentration(assets: List[Dict], total_value: float) -> Dict:
-    concerns = []
-
-    if not assets or total_value == 0:
-        return {"concerns": [], "score": 0}
-
-    # Calculate Herfindahl index
-    hhi = sum((asset["value_usd"] / total_value) ** 2 for asset in assets)
-
-    # Check individual asset concentration using MeTTa
-    for asset in assets:
-        percentage = (asset["value_usd"] / total_value)
-
-        # Query MeTTa for risk level
-        concentration_risk = query_concentration_threshold_metta(percentage)
-
-        if concentration_risk == "critical":
-            concerns.append(
-                f"{asset['token']} represents {percentage * 100:.1f}% - CRITICAL concentration (MeTTa)"
-            )
-        elif concentration_risk == "high":
-            concerns.append(
-                f"{asset['token']} represents {percentage * 100:.1f}% - high concentration (MeTTa)"
-            )
-        elif concentration_risk == "medium" and percentage > 0.30:
-            concerns.append(
-                f"{asset['token']} represents {percentage * 100:.1f}% - moderate concentration (MeTTa)"
-            )
-
-    concentration_score = min(hhi * 2.0, 1.0)
-
-    return {
-        "concerns": concerns,
-        "score": concentration_score,
-        "hhi": hhi
-    }
-
-
-def analyze_volatility(assets: List[Dict]) -> Dict:
-    concerns = []
-
-    if not assets:
-        return {"concerns": [], "score": 0}
-
-    for asset in assets:
-        change = abs(asset.get("change_24h", 0))
-
-        # Query MeTTa for volatility risk
-        volatility_risk = query_volatility_threshold_metta(change)
-
-        if volatility_risk == "extreme":
-            concerns.append(
-                f"{asset['token']} EXTREME volatility: {change:.1f}% in 24h (MeTTa)"
-            )
-        elif volatility_risk == "high":
-            concerns.append(
-                f"{asset['token']} high volatility: {change:.1f}% in 24h (MeTTa)"
-            )
-
-    # Calculate average volatility
-    avg_volatility = sum(abs(a.get("change_24h", 0)) for a in assets) / len(assets) if assets else 0
-    volatility_score = min(avg_volatility / 30, 1.0)
-
-    return {
-        "concerns": concerns,
-        "score": volatility_score,
-        "avg_volatility": avg_volatility
-    }
-
-
-def analyze_asset_risk(assets: List[Dict]) -> Dict:
-    concerns = []
-    total_risk_score = 0
-
-    for asset in assets:
-        token = asset["token"].lower()
-
-        asset_risk = query_asset_risk_metta(token)
-
-        if asset_risk == "critical":
-            concerns.append(
-                f"{asset['token']} classified as CRITICAL risk by MeTTa knowledge graph"
-            )
-            total_risk_score += 1.0
-        elif asset_risk == "high":
-            concerns.append(
-                f"{asset['token']} classified as HIGH risk by MeTTa knowledge graph"
-            )
-            total_risk_score += 0.7
-        elif asset_risk == "medium":
-            total_asset_value = sum(a.get("value_usd", 0) for a in assets)
-            if total_asset_value > 0:
-                if asset.get("value_usd", 0) / total_asset_value > 0.1:
-                    concerns.append(
-                        f"{asset['token']} has medium risk classification (MeTTa)"
-                    )
-                    total_risk_score += 0.3
-
-    risk_score = min(total_risk_score / max(len(assets), 1), 1.0)
-
-    return {
-        "concerns": concerns,
-        "score": risk_score
-    }
+def load_thresholds_metta(relation: str, defaults: Dict[str, float]) -> Dict[str, float]:
+    """Thresholds of a `(relation level threshold)` rule family, read once instead of per asset."""
+    if not METTA_AVAILABLE or not metta:
+        return dict(defaults)
+
+    thresholds = dict(defaults)
+    try:
+        result = metta.run(f"!(match &self ({relation} $level $threshold) ($level $threshold))")
+        for item in result or []:
+            level = str(item[0]).strip()
+            if level in thresholds:
+                thresholds[level] = float(str(item[1]).strip())
+    except Exception as err:
+        print(f"⚠️  MeTTa {relation} query error: {err}")
+
+    return thresholds
+
+
+risk_engine = RiskEngine(
+    query_asset_risk_metta,
+    load_thresholds_metta("concentration-threshold", {"medium": 0.30, "high": 0.50, "critical": 0.70}),
+    load_thresholds_metta("volatility-threshold", {"medium": 10, "high": 20, "extreme": 50}),
+    health_factor_warning=float(os.getenv("DEFI_HEALTH_FACTOR_WARNING", 1.2))
+)
 
 
 def generate_recommendations(
@@ -388,25 +319,35 @@ def generate_recommendations(
             "🧠 MeTTa Knowledge Graph: Review flagged high-risk assets"
         )
 
+    health_factor = asset_analysis.get("min_health_factor")
+    if health_factor is not None and health_factor < risk_engine.health_factor_warning:
+        recommendations.append(
+            f"⚠️ URGENT: Repay debt or add collateral - health factor {health_factor:.2f} is close to liquidation"
+        )
+
     return recommendations
 
 
-@risk_agent.on_message(model=RiskAnalysisRequest)
-async def analyze_risk(ctx: Context, sender: str, msg: RiskAnalysisRequest):
-    ctx.logger.info(f"🧠 Analyzing risk with MeTTa for user: {msg.user_id}")
+RISK_WEIGHTS = {"concentration": 0.3, "volatility": 0.4, "asset": 0.3}
+
+# Single requests arriving within RISK_BATCH_WINDOW_MS of each other (up to RISK_BATCH_MAX) are scored together
+RISK_BATCH_WINDOW_MS = float(os.getenv("RISK_BATCH_WINDOW_MS", 5))
+RISK_BATCH_MAX = int(os.getenv("RISK_BATCH_MAX", 256))
 
-    try:
-        concentration = analyze_concentration(msg.assets, msg.total_value_usd)
-        volatility = analyze_volatility(msg.assets)
-        asset_risk = analyze_asset_risk(msg.assets)
 
-        weights = {"concentration": 0.3, "volatility": 0.4, "asset": 0.3}
+def build_risk_reports(requests: List[RiskAnalysisRequest]) -> List[RiskReport]:
+    analyses = risk_engine.analyze_batch([(request.assets, request.total_value_usd) for request in requests])
+    timestamp = datetime.now(timezone.utc).isoformat()
 
+    reports = []
+    for request, (concentration, volatility, asset_risk) in zip(requests, analyses):
         weighted_score = (
-                concentration["score"] * weights["concentration"] +
-                volatility["score"] * weights["volatility"] +
-                asset_risk["score"] * weights["asset"]
+                concentration["score"] * RISK_WEIGHTS["concentration"] +
+                volatility["score"] * RISK_WEIGHTS["volatility"] +
+                asset_risk["score"] * RISK_WEIGHTS["asset"]
         )
+        # Liquidation risk is not averaged away by an otherwise healthy portfolio
+        weighted_score = max(weighted_score, asset_risk.get("liquidation", 0.0))
 
         risk_level = get_risk_level(weighted_score)
 
@@ -423,33 +364,84 @@ async def analyze_risk(ctx: Context, sender: str, msg: RiskAnalysisRequest):
             asset_risk
         )
 
-        should_alert = risk_level in ["high", "critical"] or weighted_score > 0.7
-
-        report = RiskReport(
-            user_id=msg.user_id,
+        reports.append(RiskReport(
+            user_id=request.user_id,
             overall_risk=risk_level,
             risk_score=weighted_score,
             concerns=all_concerns,
             recommendations=recommendations,
-            timestamp=datetime.now(timezone.utc).isoformat(),
-            should_alert=should_alert
-        )
+            timestamp=timestamp,
+            should_alert=risk_level in ["high", "critical"] or weighted_score > 0.7
+        ))
 
+    return reports
+
+
+def log_reports(ctx: Context, reports: List[RiskReport]):
+    if len(reports) == 1:
         ctx.logger.info(
-            f"✅ MeTTa risk analysis complete: {risk_level} "
-            f"(score: {weighted_score:.2f})"
+            f"✅ MeTTa risk analysis complete for {reports[0].user_id}: {reports[0].overall_risk} "
+            f"(score: {reports[0].risk_score:.2f})"
         )
+        return
+
+    levels: Dict[str, int] = {}
+    for report in reports:
+        levels[report.overall_risk] = levels.get(report.overall_risk, 0) + 1
+    summary = ", ".join(f"{count} {level}" for level, count in sorted(levels.items()))
+    ctx.logger.info(f"✅ MeTTa risk analysis complete for {len(reports)} portfolio(s): {summary}")
 
-        await ctx.send(sender, report)
 
-        ALERT_AGENT_ADDRESS = os.getenv("ALERT_AGENT_ADDRESS")
-        if should_alert and ALERT_AGENT_ADDRESS:
-            await ctx.send(ALERT_AGENT_ADDRESS, report)
+async def send_alerts(ctx: Context, reports: List[RiskReport]):
+    ALERT_AGENT_ADDRESS = os.getenv("ALERT_AGENT_ADDRESS")
+    if not ALERT_AGENT_ADDRESS:
+        return
+    await asyncio.gather(*(ctx.send(ALERT_AGENT_ADDRESS, report) for report in reports if report.should_alert))
 
 
+async def analyze_risk_requests(items: List[tuple]):
+    """Score a window's worth of single requests together and reply to each sender on its own context."""
+    ctx = items[0][0]
+    ctx.logger.info(f"🧠 Analyzing risk with MeTTa for {len(items)} portfolio(s)")
+
+    try:
+        reports = build_risk_reports([msg for _, _, msg in items])
     except Exception as err:
         ctx.logger.error(f"❌ Error in MeTTa risk analysis: {err}")
-        await ctx.send(sender, ErrorResponse(message=f"Risk analysis failed: {str(e)}"))
+        await asyncio.gather(*(
+            request_ctx.send(sender, ErrorResponse(message=f"Risk analysis failed: {str(err)}"))
+            for request_ctx, sender, _ in items
+        ))
+        return
+
+    log_reports(ctx, reports)
+    await asyncio.gather(*(request_ctx.send(sender, report) for (request_ctx, sender, _), report in zip(items, reports)))
+    await send_alerts(ctx, reports)
+
+
+risk_batcher = MicroBatcher(analyze_risk_requests, window=RISK_BATCH_WINDOW_MS / 1000, max_items=RISK_BATCH_MAX)
+
+
+@risk_agent.on_message(model=RiskAnalysisRequest)
+async def analyze_risk(ctx: Context, sender: str, msg: RiskAnalysisRequest):
+    # Returns right away so the next queued request can join the same batch
+    risk_batcher.add((ctx, sender, msg))
+
+
+@risk_agent.on_message(model=RiskAnalysisBatch)
+async def analyze_risk_batch(ctx: Context, sender: str, msg: RiskAnalysisBatch):
+    ctx.logger.info(f"🧠 Analyzing risk with MeTTa for a batch of {len(msg.requests)} portfolio(s) from {sender[:16]}...")
+
+    try:
+        reports = build_risk_reports(msg.requests)
+    except Exception as err:
+        ctx.logger.error(f"❌ Error in MeTTa risk analysis: {err}")
+        await ctx.send(sender, ErrorResponse(message=f"Risk analysis failed: {str(err)}"))
+        return
+
+    log_reports(ctx, reports)
+    await ctx.send(sender, RiskReportBatch(reports=reports))
+    await send_alerts(ctx, reports)
 
 
 @risk_agent.on_event("startup")
@@ -463,8 +455,14 @@ async def startup(ctx: Context):
         ctx.logger.info("📚 Knowledge base: 50+ assets, 25+ rules loaded")
     else:
         ctx.logger.info("⚠️  SingularityNET MeTTa: Using fallback (install hyperon)")
+    ctx.logger.info(f"📦 Micro-batching: {RISK_BATCH_WINDOW_MS:g} ms window, up to {RISK_BATCH_MAX} request(s)")
     ctx.logger.info("=" * 60)
 
 
+@risk_agent.on_event("shutdown")
+async def shutdown(ctx: Context):
+    await risk_batcher.drain()
+
+
 if __name__ == "__main__":
     risk_agent.run()
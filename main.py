@@ -1,10 +1,11 @@
 from uagents import Bureau
-from agents.portfolio_monitor import portfolio_agent
+from agents.portfolio_monitor import check_portfolios_bulk, portfolio_agent, register_portfolios_bulk, scan_status
 from agents.risk_analysis import risk_agent
 from agents.alert_agent import alert_agent
 from agents.market_data import market_agent
 from agents.fraud_detection import fraud_agent
 import os
+import hmac
 import logging
 from dotenv import load_dotenv
 from aiohttp import web
@@ -19,6 +20,14 @@ load_dotenv()
 
 HTTP_PORT = int(os.getenv("PORT", 8000))
 BUREAU_PORT = int(os.getenv("BUREAU_PORT", 8888))
+HTTP_MAX_BODY_MB = int(os.getenv("HTTP_MAX_BODY_MB", 32))
+
+# "name:key,name:key" - each partner's API key for /portfolios/bulk; the endpoint is off without any
+BULK_API_KEYS = {
+    key.strip(): name.strip()
+    for name, _, key in (entry.partition(":") for entry in os.getenv("BULK_API_KEYS", "").split(","))
+    if name.strip() and key.strip()
+}
 
 logging.basicConfig(
     level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')),
@@ -210,7 +219,9 @@ async def root_handler(request):
         "endpoints": {
             "health": "/health",
             "status": "/status",
-            "reregister": "/reregister"
+            "reregister": "/reregister",
+            "bulk_register": "/portfolios/bulk",
+            "scan_status": "/portfolios/scan-status"
         }
     })
 
@@ -301,6 +312,61 @@ async def reregister_handler(request):
         }, status=500)
 
 
+def bulk_api_owner(request):
+    """The partner name for the request's bearer key, or None; compared in constant time."""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    owner = None
+    for key, name in BULK_API_KEYS.items():
+        if hmac.compare_digest(token.encode(), key.encode()):
+            owner = name
+    return owner
+
+
+async def bulk_register_handler(request):
+    logger.info(f"Bulk portfolio registration from {request.remote}")
+
+    if not BULK_API_KEYS:
+        return web.json_response({"success": False, "message": "Bulk registration over HTTP is disabled"}, status=503)
+
+    # Checked before the body is read, so unauthenticated callers cannot make us parse a large upload
+    owner = bulk_api_owner(request)
+    if owner is None:
+        return web.json_response(
+            {"success": False, "message": "Missing or invalid API key"},
+            status=401,
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+    try:
+        body = await request.json()
+    except ValueError:
+        return web.json_response({"success": False, "message": "Body must be JSON"}, status=400)
+
+    portfolios = body.get("portfolios") if isinstance(body, dict) else body
+    if not isinstance(portfolios, list):
+        return web.json_response({
+            "success": False,
+            "message": "Expected {\"portfolios\": [{\"user_id\", \"wallets\", \"chains\"}, ...]}"
+        }, status=400)
+
+    try:
+        # Checksumming is the slow part; only the storage commit and scheduling stay on the loop
+        checks = await asyncio.to_thread(check_portfolios_bulk, portfolios)
+        result = register_portfolios_bulk(portfolio_agent.storage, portfolios, owner=f"http:{owner}", checks=checks)
+    except Exception as e:
+        logger.error(f"Error in bulk registration: {e}", exc_info=True)
+        return web.json_response({"success": False, "message": f"Bulk registration error: {str(e)}"}, status=500)
+
+    logger.info(f"✅ Bulk registration for {owner}: {result['registered']} registered, {len(result['rejected'])} rejected")
+    return web.json_response({"success": True, **result})
+
+
+async def scan_status_handler(request):
+    return web.json_response(scan_status())
+
+
 async def submit_handler(request):
     logger.info(f"Submit endpoint hit from {request.remote}")
     try:
@@ -323,12 +389,14 @@ async def submit_handler(request):
 
 
 async def start_http_server():
-    app = web.Application()
+    app = web.Application(client_max_size=HTTP_MAX_BODY_MB * 1024 ** 2)
     app.router.add_get('/', root_handler)
     app.router.add_get('/health', health_check)
     app.router.add_get('/status', agent_status)
     app.router.add_post('/submit', submit_handler)
     app.router.add_post('/reregister', reregister_handler)
+    app.router.add_post('/portfolios/bulk', bulk_register_handler)
+    app.router.add_get('/portfolios/scan-status', scan_status_handler)
 
     logger.info(f"🌐 Configuring HTTP server on 0.0.0.0:{HTTP_PORT}")
 
@@ -338,7 +406,7 @@ async def start_http_server():
     await site.start()
 
     logger.info(f"✅ HTTP server started on port {HTTP_PORT}")
-    logger.info("📍 Available routes: /, /health, /status, /submit, /reregister")
+    logger.info("📍 Available routes: /, /health, /status, /submit, /reregister, /portfolios/bulk, /portfolios/scan-status")
 
     try:
         while True:
@@ -0,0 +1,229 @@
+"""
+DeFiGuard Snapshot Store
+Append-only, segmented binary time series of portfolio snapshots per user
+"""
+
+import hashlib
+import mmap
+import os
+import re
+import struct
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# timestamp, value, min value, max value, risk, max risk, volatility, samples, asset count
+RECORD = struct.Struct("<ddddfffHH")
+
+HOUR = 3600
+DAY = 86400
+
+# Segment span per resolution: raw files hold a day, hourly a month, daily a year
+RESOLUTIONS = {
+    "raw": {"bucket": None, "segment": DAY},
+    "hourly": {"bucket": HOUR, "segment": 30 * DAY},
+    "daily": {"bucket": DAY, "segment": 365 * DAY},
+}
+
+DEFAULT_RETENTION = {
+    "raw": 7 * DAY,
+    "hourly": 90 * DAY,
+    "daily": 5 * 365 * DAY,
+}
+
+SEGMENT_PATTERN = re.compile(r"^(raw|hourly|daily)-(\d+)\.seg$")
+
+
+def _record_to_dict(values: Tuple, resolution: str) -> Dict:
+    ts, value, min_value, max_value, risk, max_risk, volatility, samples, asset_count = values
+    return {
+        "timestamp": ts,
+        "total_value_usd": value,
+        "min_value_usd": min_value,
+        "max_value_usd": max_value,
+        "risk_score": risk,
+        "max_risk_score": max_risk,
+        "volatility": volatility,
+        "samples": samples,
+        "asset_count": asset_count,
+        "resolution": resolution
+    }
+
+
+class SnapshotStore:
+    """
+    One directory per user holding fixed-width RECORD segments.
+
+    Appends are O(1) writes to the current raw segment. Range queries mmap
+    only the segments overlapping the range and binary-search the first
+    record, so history is streamed rather than loaded. compact() folds raw
+    segments older than their retention into hourly buckets, hourly into
+    daily, and deletes daily segments past retention.
+    """
+
+    def __init__(self, base_dir: str, retention: Optional[Dict[str, float]] = None):
+        self.base_dir = base_dir
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+        os.makedirs(base_dir, exist_ok=True)
+
+    def _user_dir(self, user_id: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_-]", "_", user_id)[:48]
+        digest = hashlib.sha1(user_id.encode()).hexdigest()[:8]
+        return os.path.join(self.base_dir, f"{safe}-{digest}")
+
+    def _segment_path(self, user_id: str, resolution: str, ts: float) -> str:
+        span = RESOLUTIONS[resolution]["segment"]
+        start = int(ts // span * span)
+        return os.path.join(self._user_dir(user_id), f"{resolution}-{start}.seg")
+
+    def _segments(self, user_id: str, resolution: str) -> List[Tuple[int, str]]:
+        user_dir = self._user_dir(user_id)
+        if not os.path.isdir(user_dir):
+            return []
+
+        segments = []
+        for name in os.listdir(user_dir):
+            match = SEGMENT_PATTERN.match(name)
+            if match and match.group(1) == resolution:
+                segments.append((int(match.group(2)), os.path.join(user_dir, name)))
+        return sorted(segments)
+
+    def _write(self, path: str, values: Tuple):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as f:
+            f.write(RECORD.pack(*values))
+
+    def append(
+            self,
+            user_id: str,
+            total_value_usd: float,
+            risk_score: float,
+            volatility: float = 0.0,
+            asset_count: int = 0,
+            timestamp: Optional[float] = None
+    ):
+        ts = timestamp or time.time()
+        self._write(
+            self._segment_path(user_id, "raw", ts),
+            (ts, total_value_usd, total_value_usd, total_value_usd,
+             risk_score, risk_score, volatility, 1, min(asset_count, 0xFFFF))
+        )
+
+    @staticmethod
+    def _scan_segment(path: str, start: float, end: float) -> Iterator[Tuple]:
+        size = os.path.getsize(path)
+        count = size // RECORD.size
+        if count == 0:
+            return
+
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lo, hi = 0, count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                (ts,) = struct.unpack_from("<d", mm, mid * RECORD.size)
+                if ts < start:
+                    lo = mid + 1
+                else:
+                    hi = mid
+
+            for i in range(lo, count):
+                values = RECORD.unpack_from(mm, i * RECORD.size)
+                if values[0] > end:
+                    break
+                yield values
+
+    def _scan(self, user_id: str, resolution: str, start: float, end: float) -> Iterator[Tuple]:
+        span = RESOLUTIONS[resolution]["segment"]
+        for seg_start, path in self._segments(user_id, resolution):
+            if seg_start + span <= start or seg_start > end:
+                continue
+            yield from self._scan_segment(path, start, end)
+
+    def query(
+            self,
+            user_id: str,
+            start: float = 0.0,
+            end: Optional[float] = None,
+            resolution: Optional[str] = None
+    ) -> Iterator[Dict]:
+        """
+        Stream records in [start, end] in time order.
+
+        With no resolution, the oldest data comes from daily rollups, then
+        hourly, then raw; compaction keeps those periods disjoint.
+        """
+        end = end if end is not None else time.time()
+        resolutions = [resolution] if resolution else ["daily", "hourly", "raw"]
+
+        for res in resolutions:
+            for values in self._scan(user_id, res, start, end):
+                yield _record_to_dict(values, res)
+
+    def latest(self, user_id: str) -> Optional[Dict]:
+        for resolution in ("raw", "hourly", "daily"):
+            segments = self._segments(user_id, resolution)
+            for _, path in reversed(segments):
+                size = os.path.getsize(path)
+                if size >= RECORD.size:
+                    with open(path, "rb") as f:
+                        f.seek((size // RECORD.size - 1) * RECORD.size)
+                        return _record_to_dict(RECORD.unpack(f.read(RECORD.size)), resolution)
+        return None
+
+    def _rollup(self, user_id: str, source: str, target: str, cutoff: float) -> int:
+        """Fold every source segment ending before cutoff into target buckets, then delete it."""
+        span = RESOLUTIONS[source]["segment"]
+        bucket = RESOLUTIONS[target]["bucket"]
+        folded = 0
+
+        for seg_start, path in self._segments(user_id, source):
+            if seg_start + span > cutoff:
+                continue
+
+            buckets: Dict[int, List] = {}
+            for values in self._scan_segment(path, 0.0, float("inf")):
+                key = int(values[0] // bucket * bucket)
+                agg = buckets.get(key)
+                ts, value, min_value, max_value, risk, max_risk, volatility, samples, assets = values
+                if agg is None:
+                    buckets[key] = [key, value, min_value, max_value, risk * samples, max_risk,
+                                    volatility * samples, samples, assets]
+                    continue
+
+                agg[1] = value
+                agg[2] = min(agg[2], min_value)
+                agg[3] = max(agg[3], max_value)
+                agg[4] += risk * samples
+                agg[5] = max(agg[5], max_risk)
+                agg[6] += volatility * samples
+                agg[7] += samples
+                agg[8] = assets
+
+            for key in sorted(buckets):
+                agg = buckets[key]
+                samples = agg[7]
+                self._write(
+                    self._segment_path(user_id, target, key),
+                    (agg[0], agg[1], agg[2], agg[3], agg[4] / samples, agg[5],
+                     agg[6] / samples, min(samples, 0xFFFF), agg[8])
+                )
+
+            os.remove(path)
+            folded += 1
+
+        return folded
+
+    def compact(self, user_id: str, now: Optional[float] = None) -> Dict[str, int]:
+        now = now or time.time()
+        result = {
+            "raw_to_hourly": self._rollup(user_id, "raw", "hourly", now - self.retention["raw"]),
+            "hourly_to_daily": self._rollup(user_id, "hourly", "daily", now - self.retention["hourly"]),
+            "daily_expired": 0
+        }
+
+        span = RESOLUTIONS["daily"]["segment"]
+        for seg_start, path in self._segments(user_id, "daily"):
+            if seg_start + span <= now - self.retention["daily"]:
+                os.remove(path)
+                result["daily_expired"] += 1
+
+        return result
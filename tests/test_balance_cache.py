@@ -0,0 +1,45 @@
+"""
+Native balance cache tests
+Run with: pytest tests/test_balance_cache.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.balance_cache import BalanceCache
+
+
+def test_reused_while_nonce_and_age_hold():
+    cache = BalanceCache(max_block_age=10)
+    cache.update("ethereum", "0xa", 5, nonce=3, block=100, block_hash="0x1")
+    entry = cache.get("ethereum", "0xa")
+
+    assert not cache.is_stale(entry, 3, 105)
+    assert cache.is_stale(entry, 4, 105)
+    assert cache.is_stale(entry, 3, 110)
+
+
+def test_evicts_least_recently_refreshed():
+    cache = BalanceCache(maxsize=3)
+    for i, wallet in enumerate(["0xa", "0xb", "0xc"]):
+        cache.update("ethereum", wallet, i, nonce=0, block=100 + i, block_hash="0x1")
+    cache.update("ethereum", "0xa", 9, nonce=1, block=200, block_hash="0x2")
+    cache.update("polygon", "0xd", 1, nonce=0, block=50, block_hash="0x3")
+
+    assert len(cache) == 3
+    assert cache.get("ethereum", "0xb") is None
+    assert cache.get("ethereum", "0xa")["balance_wei"] == 9
+    assert cache.get("polygon", "0xd") is not None
+
+
+def test_reorg_drops_entries_from_block():
+    cache = BalanceCache()
+    cache.update("ethereum", "0xa", 1, nonce=0, block=100, block_hash="0x1")
+    cache.update("ethereum", "0xb", 2, nonce=0, block=102, block_hash="0x2")
+    cache.update("polygon", "0xc", 3, nonce=0, block=105, block_hash="0x3")
+
+    assert cache.blocks_to_verify("ethereum", ["0xa", "0xb"], 110) == {100: "0x1", 102: "0x2"}
+    assert cache.invalidate_from("ethereum", 101) == 1
+    assert cache.get("ethereum", "0xb") is None and cache.get("polygon", "0xc") is not None
@@ -0,0 +1,131 @@
+"""
+Block watcher tests against a local JSON-RPC stand-in
+Run with: pytest tests/test_block_watcher.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from aiohttp import web
+from utils.block_watch import AddressIndex, BlockWatcher, BloomFilter, transaction_addresses
+from utils.rpc import ProviderRegistry
+import pytest
+import pytest_asyncio
+
+WATCHED = "0x" + "11" * 20
+OTHER = "0x" + "22" * 20
+TOKEN = "0x" + "33" * 20
+
+
+class LocalChain:
+    """Minimal JSON-RPC node: eth_blockNumber and eth_getBlockByNumber (single or batch)."""
+
+    def __init__(self):
+        self.head = 100
+        self.blocks = {}
+        self.calls = []
+
+    def add_block(self, number, transactions):
+        self.blocks[number] = {"number": hex(number), "transactions": transactions}
+        self.head = max(self.head, number)
+
+    def handle(self, call):
+        self.calls.append(call["method"])
+        if call["method"] == "eth_blockNumber":
+            result = hex(self.head)
+        elif call["method"] == "eth_getBlockByNumber":
+            number = int(call["params"][0], 16)
+            result = self.blocks.get(number, {"number": hex(number), "transactions": []})
+        else:
+            return {"jsonrpc": "2.0", "id": call["id"], "error": {"code": -32601, "message": "not found"}}
+        return {"jsonrpc": "2.0", "id": call["id"], "result": result}
+
+    async def endpoint(self, request):
+        body = await request.json()
+        if isinstance(body, list):
+            return web.json_response([self.handle(call) for call in body])
+        return web.json_response(self.handle(body))
+
+
+@pytest_asyncio.fixture
+async def local_chain():
+    chain = LocalChain()
+    app = web.Application()
+    app.router.add_post("/", chain.endpoint)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    registry = ProviderRegistry({"local": {"rpc": f"http://127.0.0.1:{port}/"}}, hedge=False)
+    yield chain, registry
+
+    await registry.close()
+    await runner.cleanup()
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, error_rate=0.01)
+    addresses = [f"0x{i:040x}" for i in range(1000)]
+    for address in addresses:
+        bloom.add(address)
+
+    assert all(address in bloom for address in addresses)
+    false_positives = sum(f"0x{i:040x}" in bloom for i in range(1000, 11000))
+    assert false_positives < 300
+
+
+def test_index_confirms_bloom_candidates():
+    index = AddressIndex([WATCHED.upper().replace("0X", "0x")])
+    assert WATCHED in index
+    assert OTHER not in index
+
+
+def test_transaction_addresses_include_erc20_recipient():
+    data = "0xa9059cbb" + "0" * 24 + WATCHED[2:] + "0" * 64
+    assert WATCHED in transaction_addresses({"from": OTHER, "to": TOKEN, "input": data})
+
+
+@pytest.mark.asyncio
+async def test_watcher_reports_only_touched_wallets(local_chain):
+    chain, registry = local_chain
+    touched = []
+
+    async def on_touched(chain_name, wallets, block):
+        touched.append((chain_name, wallets, block))
+
+    watcher = BlockWatcher(registry, "local", AddressIndex([WATCHED]), on_touched, max_catchup=10)
+
+    assert await watcher.poll() == 0
+    assert watcher.last_block == 100
+
+    chain.add_block(101, [{"from": OTHER, "to": TOKEN, "input": "0x"}])
+    chain.add_block(102, [{"from": OTHER, "to": WATCHED, "input": "0x"}])
+    assert await watcher.poll() == 2
+
+    assert touched == [("local", {WATCHED}, 102)]
+    assert chain.calls.count("eth_getBlockByNumber") == 2
+
+    # No new head: one eth_blockNumber and nothing else
+    calls = len(chain.calls)
+    assert await watcher.poll() == 0
+    assert chain.calls[calls:] == ["eth_blockNumber"]
+
+
+@pytest.mark.asyncio
+async def test_watcher_skips_ahead_when_far_behind(local_chain):
+    chain, registry = local_chain
+
+    async def on_touched(chain_name, wallets, block):
+        pass
+
+    watcher = BlockWatcher(registry, "local", AddressIndex([WATCHED]), on_touched, max_catchup=5)
+    await watcher.poll()
+
+    chain.head = 150
+    assert await watcher.poll() == 5
+    assert watcher.last_block == 150
+    assert watcher.skipped == 45
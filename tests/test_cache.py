@@ -0,0 +1,108 @@
+"""
+Async TTL cache tests
+Run with: pytest tests/test_cache.py
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.cache import AsyncTTLCache
+
+
+class Upstream:
+    """Counts fetches and returns a new version of every key on each call."""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+
+    async def fetch(self, keys):
+        self.calls.append(list(keys))
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return {key: f"{key}-v{len(self.calls)}" for key in keys}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_fetch():
+    cache = AsyncTTLCache()
+    upstream = Upstream(delay=0.05)
+
+    results = await asyncio.gather(*(cache.get_many(["a", "b"], upstream.fetch) for _ in range(5)))
+
+    assert upstream.calls == [["a", "b"]]
+    assert all(r == {"a": "a-v1", "b": "b-v1"} for r in results)
+    assert cache.stats()["coalesced"] == 8
+
+
+@pytest.mark.asyncio
+async def test_fresh_hit_skips_upstream():
+    cache = AsyncTTLCache(ttl=60)
+    upstream = Upstream()
+
+    await cache.get_many(["a"], upstream.fetch)
+    assert await cache.get_many(["a", "b"], upstream.fetch) == {"a": "a-v1", "b": "b-v2"}
+    assert upstream.calls == [["a"], ["b"]]
+
+
+@pytest.mark.asyncio
+async def test_stale_value_served_while_refreshing():
+    cache = AsyncTTLCache(ttl=0.01, stale_ttl=60)
+    upstream = Upstream(delay=0.05)
+
+    await cache.get_many(["a"], upstream.fetch)
+    await asyncio.sleep(0.02)
+
+    assert await cache.get_many(["a"], upstream.fetch) == {"a": "a-v1"}
+    assert await cache.get_many(["a"], upstream.fetch) == {"a": "a-v1"}
+    await asyncio.sleep(0.01)
+    assert len(upstream.calls) == 2
+
+    await asyncio.sleep(0.1)
+    assert cache.peek("a") == "a-v2"
+
+
+@pytest.mark.asyncio
+async def test_stale_value_survives_failed_refresh():
+    cache = AsyncTTLCache(ttl=0.01, stale_ttl=60)
+    await cache.get_many(["a"], Upstream().fetch)
+    await asyncio.sleep(0.02)
+
+    failing = Upstream(fail=True)
+    assert await cache.get_many(["a"], failing.fetch) == {"a": "a-v1"}
+    await asyncio.sleep(0.01)
+    assert cache.peek("a") == "a-v1"
+    assert await cache.get_many(["b"], failing.fetch) == {"b": None}
+    assert cache.peek("b") is None
+
+
+@pytest.mark.asyncio
+async def test_expired_past_stale_window_refetches():
+    cache = AsyncTTLCache(ttl=0.01, stale_ttl=0.01)
+    upstream = Upstream()
+
+    await cache.get_many(["a"], upstream.fetch)
+    await asyncio.sleep(0.03)
+
+    assert cache.peek("a") is None
+    assert await cache.get_many(["a"], upstream.fetch) == {"a": "a-v2"}
+
+
+def test_lru_eviction():
+    cache = AsyncTTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.peek("a")
+    cache.set("c", 3)
+
+    assert len(cache) == 2
+    assert cache.peek("a") == 1
+    assert cache.peek("b") is None
+    assert cache.peek("c") == 3
@@ -0,0 +1,98 @@
+"""
+Snapshot change gate tests
+Run with: pytest tests/test_change_gate.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.change_gate import SnapshotChangeGate, snapshot_fingerprint
+
+
+def asset(token, value, change=0.0, **extra):
+    return {"chain": "ethereum", "token": token, "value_usd": value, "change_24h": change, **extra}
+
+
+def fingerprint(assets, timestamp=1000.0):
+    return snapshot_fingerprint(assets, sum(a["value_usd"] for a in assets), timestamp)
+
+
+BASE = [asset("ETH", 6000, 2.0), asset("USDC", 4000)]
+
+
+def test_fingerprint_weights_and_extremes():
+    fp = fingerprint([asset("ETH", 750, -8.0), asset("USDC", 250, 1.0)])
+
+    assert fp["value"] == 1000
+    assert fp["weights"] == {"ethereum:ETH": 0.75, "ethereum:USDC": 0.25}
+    assert fp["max_change_24h"] == 8.0
+    assert fp["min_health_factor"] is None
+
+
+def test_unchanged_snapshot_is_suppressed():
+    gate = SnapshotChangeGate()
+    previous = fingerprint(BASE)
+
+    assert gate.check(None, previous) == "first snapshot"
+    assert gate.check(previous, fingerprint(BASE, timestamp=2000)) is None
+    assert gate.stats() == {"forwarded": 1, "suppressed": 1, "suppression_rate": 0.5}
+
+
+def test_value_change_threshold():
+    gate = SnapshotChangeGate(value_change=0.02)
+    previous = fingerprint(BASE)
+
+    small = fingerprint([asset("ETH", 6090, 2.0), asset("USDC", 4060)])
+    large = fingerprint([asset("ETH", 6180, 2.0), asset("USDC", 4120)])
+
+    assert gate.reason(previous, small) is None
+    assert gate.reason(previous, large) == "value +3.0%"
+
+
+def test_weight_drift_threshold():
+    gate = SnapshotChangeGate(weight_drift=0.05)
+    previous = fingerprint(BASE)
+
+    assert gate.reason(previous, fingerprint([asset("ETH", 6040, 2.0), asset("USDC", 3960)])) is None
+    assert gate.reason(previous, fingerprint([asset("ETH", 6600, 2.0), asset("USDC", 3400)])) == "weight drift 6.0%"
+
+
+def test_asset_set_ignores_dust():
+    gate = SnapshotChangeGate(min_weight=0.005)
+    previous = fingerprint(BASE)
+
+    dust = fingerprint([asset("ETH", 6000, 2.0), asset("USDC", 3990), asset("PEPE", 10)])
+    new = fingerprint([asset("ETH", 5500, 2.0), asset("USDC", 4000), asset("PEPE", 500)])
+
+    assert gate.reason(previous, dust) is None
+    assert gate.reason(previous, new) == "asset set changed"
+
+
+def test_24h_change_delta():
+    gate = SnapshotChangeGate(change_delta=5.0)
+    previous = fingerprint(BASE)
+
+    assert gate.reason(previous, fingerprint([asset("ETH", 6000, 6.0), asset("USDC", 4000)])) is None
+    assert gate.reason(previous, fingerprint([asset("ETH", 6000, -9.0), asset("USDC", 4000)])) == "24h change 9.0%"
+
+
+def test_max_staleness_forces_forward():
+    gate = SnapshotChangeGate(max_staleness=3600)
+    previous = fingerprint(BASE, timestamp=1000)
+
+    assert gate.reason(previous, fingerprint(BASE, timestamp=4599)) is None
+    assert gate.reason(previous, fingerprint(BASE, timestamp=4600)) == "max staleness"
+
+
+def test_health_factor_warning_and_delta():
+    gate = SnapshotChangeGate(health_factor_warning=1.2, health_factor_delta=0.05)
+
+    def lending(health_factor):
+        return fingerprint(BASE + [asset("aWETH", 0.0, health_factor=health_factor, debt_usd=5000)])
+
+    assert gate.reason(lending(1.5), lending(1.3)) is None
+    assert gate.reason(lending(1.3), lending(1.15)) == "health factor 1.15"
+    assert gate.reason(lending(1.15), lending(1.12)) is None
+    assert gate.reason(lending(1.15), lending(1.08)) == "health factor 1.08"
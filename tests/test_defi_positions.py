@@ -0,0 +1,133 @@
+"""
+DeFi position reader tests against a local JSON-RPC stand-in answering Multicall3 eth_calls
+Run with: pytest tests/test_defi_positions.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from aiohttp import web
+from eth_abi import decode, encode
+from utils.defi_positions import GET_USER_ACCOUNT_DATA_SELECTOR, TOTAL_SUPPLY_SELECTOR, DefiPositionReader, liquidation_risk
+from utils.multicall import BALANCE_OF_SELECTOR, DECIMALS_SELECTOR, SYMBOL_SELECTOR, TokenMetadataCache
+from utils.onchain_prices import GET_RESERVES_SELECTOR
+from utils.rpc import ProviderRegistry
+import pytest
+import pytest_asyncio
+
+LP_WALLET = "0x" + "11" * 20
+BORROWER = "0x" + "22" * 20
+USDC = "0x" + "a0" * 20
+WETH = "0x" + "c0" * 20
+PAIR = "0x" + "b4" * 20
+POOL = "0x" + "87" * 20
+
+
+class ContractNode:
+    """eth_call on Multicall3: a USDC/WETH pair, its two tokens and an Aave-style pool."""
+
+    def __init__(self):
+        self.subcalls = []
+
+    def call(self, target, data):
+        selector, args = data[:4], data[4:]
+        if target == PAIR and selector == TOTAL_SUPPLY_SELECTOR:
+            return encode(["uint256"], [10 ** 18])
+        if target == PAIR and selector == GET_RESERVES_SELECTOR:
+            return encode(["uint112", "uint112", "uint32"], [3_000_000 * 10 ** 6, 1_000 * 10 ** 18, 0])
+        if target == PAIR and selector == BALANCE_OF_SELECTOR:
+            return encode(["uint256"], [10 ** 16 if args[12:].hex() == LP_WALLET[2:] else 0])
+        if target in (USDC, WETH) and selector == DECIMALS_SELECTOR:
+            return encode(["uint8"], [6 if target == USDC else 18])
+        if target in (USDC, WETH) and selector == SYMBOL_SELECTOR:
+            return encode(["string"], ["USDC" if target == USDC else "WETH"])
+        if target == POOL and selector == GET_USER_ACCOUNT_DATA_SELECTOR:
+            if args[12:].hex() != BORROWER[2:]:
+                return encode(["uint256"] * 6, [0, 0, 0, 0, 0, 2 ** 256 - 1])
+            return encode(["uint256"] * 6, [50_000 * 10 ** 8, 30_000 * 10 ** 8, 5_000 * 10 ** 8, 8250, 8000, 105 * 10 ** 16])
+        raise ValueError("revert")
+
+    async def endpoint(self, request):
+        call = await request.json()
+        if call["method"] == "eth_chainId":
+            return web.json_response({"jsonrpc": "2.0", "id": call["id"], "result": "0x1"})
+
+        data = bytes.fromhex(call["params"][0]["data"][2:])
+        (calls,) = decode(["(address,bool,bytes)[]"], data[4:])
+        results = []
+        for target, _, call_data in calls:
+            self.subcalls.append(target)
+            try:
+                results.append((True, self.call(target, call_data)))
+            except ValueError:
+                results.append((False, b""))
+        return web.json_response({"jsonrpc": "2.0", "id": call["id"], "result": "0x" + encode(["(bool,bytes)[]"], [results]).hex()})
+
+
+@pytest_asyncio.fixture
+async def contract_node():
+    node = ContractNode()
+    app = web.Application()
+    app.router.add_post("/", node.endpoint)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    registry = ProviderRegistry({"local": {"rpc": f"http://127.0.0.1:{port}/"}}, hedge=False)
+    yield node, registry
+
+    await registry.close()
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_positions_read_in_one_multicall(contract_node):
+    node, registry = contract_node
+    reader = DefiPositionReader(
+        registry,
+        TokenMetadataCache(),
+        {"local": [{"protocol": "aave-v3", "pool": POOL, "base_decimals": 8}]},
+        {"local": [{"protocol": "uniswap-v2", "pair": PAIR, "token0": USDC, "token1": WETH}]}
+    )
+
+    positions = await reader.read("local", [LP_WALLET, BORROWER])
+
+    assert reader.calls == 1
+    (lp,) = positions[LP_WALLET]
+    assert lp["share"] == pytest.approx(0.01)
+    assert [(t["symbol"], t["amount"]) for t in lp["underlying"]] == [("USDC", pytest.approx(30_000)), ("WETH", pytest.approx(10))]
+
+    (lending,) = positions[BORROWER]
+    assert lending["collateral_usd"] == 50_000
+    assert lending["debt_usd"] == 30_000
+    assert lending["health_factor"] == pytest.approx(1.05)
+    assert lending["liquidation_threshold"] == pytest.approx(0.825)
+
+
+@pytest.mark.asyncio
+async def test_token_metadata_is_read_once(contract_node):
+    node, registry = contract_node
+    reader = DefiPositionReader(
+        registry,
+        TokenMetadataCache(),
+        {},
+        {"local": [{"protocol": "uniswap-v2", "pair": PAIR, "token0": USDC, "token1": WETH}]}
+    )
+
+    await reader.read("local", [LP_WALLET])
+    node.subcalls.clear()
+    await reader.read("local", [LP_WALLET])
+
+    assert USDC not in node.subcalls and WETH not in node.subcalls
+    assert len(node.subcalls) == 3
+
+
+def test_liquidation_risk_scale():
+    assert liquidation_risk(None) == 0.0
+    assert liquidation_risk(0.95) == 1.0
+    assert liquidation_risk(1.2) == pytest.approx(0.8)
+    assert liquidation_risk(2.5) == 0.0
@@ -0,0 +1,148 @@
+"""
+Holdings matrix tests
+Run with: pytest tests/test_holdings_matrix.py
+"""
+
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.holdings_matrix import HoldingsMatrix
+from utils.risk_engine import calculate_risk_score
+
+TOKENS = {
+    "ethereum": ("ethereum", 3000.0),
+    "usd-coin": ("ethereum", 1.0),
+    "matic-network": ("polygon", 0.8),
+    "binancecoin": ("bsc", 600.0),
+    "avalanche-2": ("avalanche", 30.0),
+}
+
+
+def holding(price_id, balance, change=0.0):
+    chain, price = TOKENS[price_id]
+    return {"chain": chain, "token": price_id, "balance": balance, "price": price,
+            "value_usd": balance * price, "change_24h": change}
+
+
+def lending(health_factor, net_usd=1000.0):
+    return {"chain": "ethereum", "token": "Aave V3", "position": "lending", "balance": net_usd, "price": 1.0,
+            "value_usd": net_usd, "change_24h": 0.0, "health_factor": health_factor, "debt_usd": 5000.0}
+
+
+def load(matrix, portfolios):
+    for user_id, assets in portfolios.items():
+        price_ids = ["usd" if a.get("position") == "lending" else a["token"] for a in assets]
+        matrix.upsert(user_id, assets, price_ids)
+
+
+def random_portfolios(seed=7, count=50):
+    rng = random.Random(seed)
+    portfolios = {}
+    for i in range(count):
+        picks = rng.sample(sorted(TOKENS), rng.randint(1, len(TOKENS)))
+        portfolios[f"user-{i}"] = [holding(p, rng.uniform(0.01, 100), rng.uniform(-30, 30)) for p in picks]
+    return portfolios
+
+
+def assert_parity(matrix, portfolios):
+    for user_id in portfolios:
+        assets, total_value, risk_score = matrix.snapshot(user_id)
+        assert total_value == pytest.approx(sum(a["value_usd"] for a in assets))
+        assert risk_score == pytest.approx(calculate_risk_score(assets))
+
+
+def test_revalue_matches_scalar_score():
+    matrix = HoldingsMatrix(capacity=8)
+    portfolios = random_portfolios()
+    load(matrix, portfolios)
+
+    matrix.revalue()
+
+    assert len(matrix) == 50
+    assert_parity(matrix, portfolios)
+
+
+def test_parity_holds_after_price_move():
+    matrix = HoldingsMatrix()
+    portfolios = random_portfolios()
+    load(matrix, portfolios)
+    matrix.revalue()
+
+    changed = matrix.update_prices({
+        "ethereum": {"price": 2400.0, "change_24h": -20.0},
+        "binancecoin": {"price": 600.0, "change_24h": 0.0},
+        "unknown": {"price": 1.0}
+    })
+    matrix.revalue()
+
+    assert changed == 2
+    assert_parity(matrix, portfolios)
+    eth_holder = next(u for u, assets in portfolios.items() if any(a["token"] == "ethereum" for a in assets))
+    assets, _, _ = matrix.snapshot(eth_holder)
+    assert next(a for a in assets if a["token"] == "ethereum")["price"] == 2400.0
+
+
+def test_lending_health_factor_sets_floor():
+    matrix = HoldingsMatrix()
+    portfolios = {
+        "safe": [holding("usd-coin", 5000), lending(3.0)],
+        "risky": [holding("usd-coin", 5000), lending(1.1)],
+        "debt-only": [lending(1.05, net_usd=0.0)],
+    }
+    load(matrix, portfolios)
+
+    matrix.revalue()
+
+    assert_parity(matrix, portfolios)
+    _, _, risky = matrix.snapshot("risky")
+    _, _, safe = matrix.snapshot("safe")
+    assert risky == pytest.approx(0.9) and risky > safe
+    assert matrix.snapshot("debt-only")[2] == pytest.approx(0.95)
+
+
+def test_rescan_remove_and_compact_keep_parity():
+    matrix = HoldingsMatrix(capacity=4)
+    portfolios = random_portfolios(count=20)
+    load(matrix, portfolios)
+
+    rng = random.Random(1)
+    for _ in range(100):
+        user_id = f"user-{rng.randrange(20)}"
+        portfolios[user_id] = [holding(p, rng.uniform(1, 10), rng.uniform(-5, 5)) for p in rng.sample(sorted(TOKENS), 2)]
+        load(matrix, {user_id: portfolios[user_id]})
+    matrix.remove("user-0")
+    del portfolios["user-0"]
+    matrix.compact()
+
+    matrix.revalue()
+
+    assert "user-0" not in matrix
+    assert matrix.stats()["dead_entries"] == 0
+    assert_parity(matrix, portfolios)
+
+
+def test_revalue_reports_threshold_crossings():
+    matrix = HoldingsMatrix()
+    load(matrix, {"calm": [holding("ethereum", 1, 1.0)], "other": [holding("usd-coin", 100, 0.0), holding("matic-network", 100, 0.0)]})
+    matrix.revalue()
+
+    matrix.update_prices({"ethereum": {"price": 1500.0, "change_24h": -50.0}})
+
+    assert matrix.revalue(risk_threshold=0.9) == ["calm"]
+    assert matrix.revalue(risk_threshold=0.9) == []
+
+
+def test_upsert_scores_assets_when_no_score_given():
+    matrix = HoldingsMatrix()
+    assets = [holding("ethereum", 2, 12.0), holding("matic-network", 500, -4.0)]
+
+    matrix.upsert("user", assets, ["ethereum", "matic-network"])
+    matrix.upsert("scored", assets, ["ethereum", "matic-network"], risk_score=0.1)
+
+    assert matrix.snapshot("user")[2] == pytest.approx(calculate_risk_score(assets))
+    assert matrix.snapshot("scored")[2] == 0.1
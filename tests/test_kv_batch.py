@@ -0,0 +1,81 @@
+"""
+Batched agent storage writes
+Run with: pytest tests/test_kv_batch.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from uagents.storage import KeyValueStore
+from utils.kv_batch import write_many
+import json
+
+
+def test_key_value_store_saves_once(tmp_path, monkeypatch):
+    store = KeyValueStore("batch", cwd=str(tmp_path))
+    store.set("stale", 1)
+    saves = []
+    original = store._save
+    monkeypatch.setattr(store, "_save", lambda: (saves.append(1), original()))
+
+    write_many(store, {f"k{i}": i for i in range(100)}, removals=["stale"])
+
+    assert len(saves) == 1
+    on_disk = json.loads((tmp_path / "batch_data.json").read_text())
+    assert on_disk["k99"] == 99 and "stale" not in on_disk
+
+
+def test_other_storage_uses_public_api():
+    class Storage:
+        def __init__(self):
+            self._data = {"stale": 1}
+            self.calls = []
+
+        def set(self, key, value):
+            self.calls.append(("set", key))
+            self._data[key] = value
+
+        def remove(self, key):
+            self.calls.append(("remove", key))
+            self._data.pop(key, None)
+
+    storage = Storage()
+    write_many(storage, {"a": 1, "b": 2}, removals=["stale"])
+
+    assert storage.calls == [("set", "a"), ("set", "b"), ("remove", "stale")]
+    assert storage._data == {"a": 1, "b": 2}
+
+
+def test_reshaped_key_value_store_falls_back(tmp_path):
+    # Stands in for a uagents release that renamed KeyValueStore._save
+    class RenamedStore(KeyValueStore):
+        _save = None
+
+        def __init__(self, *args, **kwargs):
+            self.saves = 0
+            super().__init__(*args, **kwargs)
+
+        def _persist(self):
+            self.saves += 1
+            KeyValueStore._save(self)
+
+        def set(self, key, value):
+            self._data[key] = value
+            self._persist()
+
+        def remove(self, key):
+            if key in self._data:
+                del self._data[key]
+                self._persist()
+
+    store = RenamedStore("batch", cwd=str(tmp_path))
+    store.set("stale", 1)
+    store.saves = 0
+
+    write_many(store, {"a": 1, "b": 2}, removals=["stale"])
+
+    assert store.saves == 3
+    on_disk = json.loads((tmp_path / "batch_data.json").read_text())
+    assert on_disk == {"a": 1, "b": 2}
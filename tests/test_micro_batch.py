@@ -0,0 +1,59 @@
+"""
+Micro-batcher tests
+Run with: pytest tests/test_micro_batch.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.micro_batch import MicroBatcher
+import asyncio
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_items_in_one_window_flush_together():
+    batches = []
+
+    async def flush(items):
+        batches.append(items)
+
+    batcher = MicroBatcher(flush, window=0.01, max_items=100)
+    for i in range(5):
+        batcher.add(i)
+        await asyncio.sleep(0)
+
+    assert batches == []
+    await asyncio.sleep(0.05)
+    assert batches == [[0, 1, 2, 3, 4]]
+
+
+@pytest.mark.asyncio
+async def test_full_batch_flushes_without_waiting():
+    batches = []
+
+    async def flush(items):
+        batches.append(items)
+
+    batcher = MicroBatcher(flush, window=10, max_items=3)
+    for i in range(7):
+        batcher.add(i)
+    await batcher.drain()
+
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert batcher.stats()["largest_batch"] == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_counted():
+    async def flush(items):
+        raise RuntimeError("boom")
+
+    batcher = MicroBatcher(flush, window=0)
+    batcher.add("a")
+    await batcher.drain()
+
+    assert batcher.stats()["failed"] == 1
+    assert len(batcher) == 0
@@ -0,0 +1,148 @@
+"""
+Multicall3 encoding, decoding and token metadata cache tests
+Run with: pytest tests/test_multicall.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from eth_abi import decode, encode
+from uagents.storage import KeyValueStore
+from utils.multicall import (
+    AGGREGATE3_SELECTOR,
+    BALANCE_OF_SELECTOR,
+    DECIMALS_SELECTOR,
+    MULTICALL3_ADDRESS,
+    SYMBOL_SELECTOR,
+    TokenMetadataCache,
+    aggregate3,
+    balance_of_call,
+    decode_aggregate3,
+    decode_symbol,
+    decode_uint,
+    encode_aggregate3,
+)
+import pytest
+
+TOKEN = "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48"
+WALLET = "0x" + "11" * 20
+
+
+class FakeEth:
+    """eth.call that answers each aggregate3 sub-call from `answers` (target, call_data) -> (success, data)."""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.requests = []
+
+    async def call(self, transaction):
+        self.requests.append(transaction)
+        data = bytes.fromhex(transaction["data"][2:])
+        assert data[:4] == AGGREGATE3_SELECTOR
+        (calls,) = decode(["(address,bool,bytes)[]"], data[4:])
+        return encode(["(bool,bytes)[]"], [[self.answers[(target.lower(), call_data)] for target, _, call_data in calls]])
+
+
+class FakeWeb3:
+    def __init__(self, answers):
+        self.eth = FakeEth(answers)
+
+
+def test_balance_of_calldata():
+    call = balance_of_call(WALLET)
+
+    assert call[:4] == BALANCE_OF_SELECTOR == bytes.fromhex("70a08231")
+    assert call[4:] == bytes(12) + bytes.fromhex("11" * 20)
+
+
+def test_aggregate3_calldata_allows_every_failure():
+    calls = [(TOKEN, DECIMALS_SELECTOR), (TOKEN, balance_of_call(WALLET))]
+
+    data = encode_aggregate3(calls)
+    (decoded,) = decode(["(address,bool,bytes)[]"], data[4:])
+
+    assert data[:4] == AGGREGATE3_SELECTOR
+    assert [(target.lower(), allow, call) for target, allow, call in decoded] == [
+        (TOKEN, True, DECIMALS_SELECTOR),
+        (TOKEN, True, balance_of_call(WALLET))
+    ]
+
+
+def test_decode_results_keeps_failed_slots():
+    raw = encode(["(bool,bytes)[]"], [[
+        (True, encode(["uint256"], [6])),
+        (False, b""),
+        (True, encode(["string"], ["USDC"]))
+    ]])
+
+    results = decode_aggregate3(raw)
+
+    assert [ok for ok, _ in results] == [True, False, True]
+    assert decode_uint(results[0][1]) == 6
+    assert decode_uint(results[1][1]) is None
+    assert decode_symbol(results[2][1]) == "USDC"
+
+
+def test_decode_symbol_variants():
+    assert decode_symbol(b"MKR".ljust(32, b"\x00")) == "MKR"
+    assert decode_symbol(encode(["string"], [""])) is None
+    assert decode_symbol(b"\x01\x02") is None
+
+
+@pytest.mark.asyncio
+async def test_aggregate3_round_trip_in_chunks():
+    wallets = ["0x" + f"{i:040x}" for i in range(1, 6)]
+    answers = {(TOKEN, balance_of_call(w)): (True, encode(["uint256"], [i * 10 ** 6])) for i, w in enumerate(wallets)}
+    answers[(TOKEN, DECIMALS_SELECTOR)] = (True, encode(["uint256"], [6]))
+    answers[(TOKEN, SYMBOL_SELECTOR)] = (False, b"")
+    web3 = FakeWeb3(answers)
+
+    calls = [(TOKEN, DECIMALS_SELECTOR), (TOKEN, SYMBOL_SELECTOR)] + [(TOKEN, balance_of_call(w)) for w in wallets]
+    results = await aggregate3(web3, calls, max_calls=3)
+
+    assert len(web3.eth.requests) == 3
+    assert all(r["to"] == MULTICALL3_ADDRESS for r in web3.eth.requests)
+    assert results[0] == (True, encode(["uint256"], [6]))
+    assert results[1] == (False, b"")
+    assert [decode_uint(data) for _, data in results[2:]] == [i * 10 ** 6 for i in range(5)]
+
+
+def test_metadata_cache_persists_through_storage(tmp_path):
+    storage = KeyValueStore("metadata", cwd=str(tmp_path))
+    cache = TokenMetadataCache()
+    cache.load(storage)
+    other = "0x" + "22" * 20
+
+    assert cache.missing("ethereum", [TOKEN, other]) == [TOKEN, other]
+    cache.set("ethereum", TOKEN.upper().replace("0X", "0x"), "USDC", 6)
+    assert cache.missing("ethereum", [TOKEN, other]) == [other]
+    assert cache.missing("polygon", [TOKEN]) == [TOKEN]
+    cache.save(storage)
+
+    reloaded = TokenMetadataCache()
+    reloaded.load(KeyValueStore("metadata", cwd=str(tmp_path)))
+    assert reloaded.get("ethereum", TOKEN) == {"symbol": "USDC", "decimals": 6}
+
+
+def test_metadata_cache_saves_only_when_changed():
+    class Storage:
+        def __init__(self):
+            self.sets = 0
+
+        def get(self, key):
+            return None
+
+        def set(self, key, value):
+            self.sets += 1
+
+    storage = Storage()
+    cache = TokenMetadataCache()
+    cache.load(storage)
+    cache.save(storage)
+    cache.set("ethereum", TOKEN, "USDC", 6)
+    cache.save(storage)
+    cache.save(storage)
+
+    assert storage.sets == 1
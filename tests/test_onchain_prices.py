@@ -0,0 +1,192 @@
+"""
+On-chain pricing tests (Chainlink feeds and Uniswap-V2 pairs)
+Run with: pytest tests/test_onchain_prices.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from eth_abi import decode, encode
+from utils.multicall import AGGREGATE3_SELECTOR, DECIMALS_SELECTOR, encode_call
+from utils.onchain_prices import (
+    GET_PAIR_SELECTOR,
+    GET_RESERVES_SELECTOR,
+    LATEST_ROUND_DATA_SELECTOR,
+    OnChainPricer,
+    decode_reserves,
+    decode_round_answer,
+    v2_pair_address,
+)
+import logging
+import pytest
+
+FACTORY = "0x5c69bee701ef814a2b6a3edd4b1652cb9cc5aa6f"
+INIT_CODE_HASH = "0x96e8ac4277198ff8b6f785478aa9a39f403cb768dd02cbee326c3e7da348845f"
+WETH = "0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2"
+USDC = "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48"
+NATIVE_FEED = "0x5f4ec3df9cbd43714fe2740f5e3616155c5b8419"
+BTC_FEED = "0xf4030086522a5beea4988f8ca5b36dbc97bee88c"
+LOW_TOKEN = "0x" + "11" * 20   # sorts before WETH: token0 of its pair
+HIGH_TOKEN = "0x" + "ee" * 20  # sorts after WETH: token1 of its pair
+
+
+def round_data(answer: int, updated_at: int) -> bytes:
+    return encode(["uint80", "int256", "uint256", "uint256", "uint80"], [7, answer, updated_at, updated_at, 7])
+
+
+def reserves(reserve0: int, reserve1: int) -> bytes:
+    return encode(["uint112", "uint112", "uint32"], [reserve0, reserve1, 0])
+
+
+class FakeEth:
+    """eth.call for Multicall3: answers each sub-call from `answers` (target, call_data) -> (success, data)."""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.sub_calls = []
+
+    async def call(self, transaction):
+        data = bytes.fromhex(transaction["data"][2:])
+        assert data[:4] == AGGREGATE3_SELECTOR
+        (calls,) = decode(["(address,bool,bytes)[]"], data[4:])
+        self.sub_calls.extend((target.lower(), call_data) for target, _, call_data in calls)
+        return encode(["(bool,bytes)[]"], [[self.answers.get((target.lower(), call_data), (False, b"")) for target, _, call_data in calls]])
+
+
+class Registry:
+    def __init__(self, answers):
+        self.eth = FakeEth(answers)
+
+    async def get(self, chain):
+        return self
+
+
+def pricer(answers, init_code_hash=INIT_CODE_HASH, **kwargs) -> OnChainPricer:
+    dex = {"factory": FACTORY, "wrapped_native": WETH, "native_feed": NATIVE_FEED}
+    if init_code_hash:
+        dex["init_code_hash"] = init_code_hash
+    return OnChainPricer(
+        Registry(answers),
+        feeds={"bitcoin": ("ethereum", BTC_FEED)},
+        dexes={"ethereum": dex},
+        min_liquidity_usd=10000.0,
+        **kwargs
+    )
+
+
+def test_pair_address_from_create2():
+    # Uniswap V2's USDC/WETH pair on Ethereum mainnet
+    assert v2_pair_address(FACTORY, INIT_CODE_HASH, USDC, WETH) == "0xb4e16d0168e52d35cacd2c6185b44281ec28c9dc"
+    assert v2_pair_address(FACTORY, INIT_CODE_HASH, WETH.upper().replace("0X", "0x"), USDC) == "0xb4e16d0168e52d35cacd2c6185b44281ec28c9dc"
+
+
+def test_latest_round_data_decoding():
+    now = 1_700_000_000
+
+    assert decode_round_answer(round_data(2500_12345678, now - 60), 8, 3600, now) == pytest.approx(2500.12345678)
+    assert decode_round_answer(round_data(2500_00000000, now - 3601), 8, 3600, now) is None
+    assert decode_round_answer(round_data(-1, now), 8, 3600, now) is None
+    assert decode_round_answer(round_data(1, now)[:128], 8, 3600, now) is None
+    assert decode_reserves(reserves(5, 9)) == (5, 9)
+    assert decode_reserves(b"\x00" * 64) is None
+
+
+@pytest.mark.asyncio
+async def test_pairs_priced_through_native_feed_in_either_token_order():
+    now = int(time.time())
+    low_pair = v2_pair_address(FACTORY, INIT_CODE_HASH, LOW_TOKEN, WETH)
+    high_pair = v2_pair_address(FACTORY, INIT_CODE_HASH, HIGH_TOKEN, WETH)
+    answers = {
+        (BTC_FEED, LATEST_ROUND_DATA_SELECTOR): (True, round_data(60000_00000000, now)),
+        (NATIVE_FEED, LATEST_ROUND_DATA_SELECTOR): (True, round_data(2500_00000000, now)),
+        # 1,000,000 LOW (6 decimals) against 400 WETH ($1M): $1 each
+        (low_pair, GET_RESERVES_SELECTOR): (True, reserves(1_000_000 * 10 ** 6, 400 * 10 ** 18)),
+        # 40 WETH ($100k) against 50,000 HIGH, decimals read on chain: $2 each
+        (high_pair, GET_RESERVES_SELECTOR): (True, reserves(40 * 10 ** 18, 50_000 * 10 ** 18)),
+        (HIGH_TOKEN, DECIMALS_SELECTOR): (True, encode(["uint8"], [18])),
+    }
+    onchain = pricer(answers)
+
+    prices = await onchain.fetch(["bitcoin", "weth", "low", "high"], {
+        "weth": ("ethereum", WETH, 18),
+        "low": ("ethereum", LOW_TOKEN, 6),
+        "high": ("ethereum", HIGH_TOKEN, None)
+    })
+
+    assert {price_id: p["price"] for price_id, p in prices.items()} == pytest.approx(
+        {"bitcoin": 60000.0, "weth": 2500.0, "low": 1.0, "high": 2.0}
+    )
+    assert all(p["source"] == "onchain" and p["change_24h"] == 0.0 for p in prices.values())
+    # CREATE2 addresses need no getPair round: one Multicall3 eth_call for the chain
+    assert onchain.stats() == {"multicalls": 1, "priced": 4, "unpriced": 0}
+    assert not any(call_data[:4] == GET_PAIR_SELECTOR for _, call_data in onchain.registry.eth.sub_calls)
+
+
+@pytest.mark.asyncio
+async def test_thin_pair_rejected():
+    now = int(time.time())
+    pair = v2_pair_address(FACTORY, INIT_CODE_HASH, LOW_TOKEN, WETH)
+    # 2 WETH of liquidity is $5k, under the $10k floor
+    onchain = pricer({
+        (NATIVE_FEED, LATEST_ROUND_DATA_SELECTOR): (True, round_data(2500_00000000, now)),
+        (pair, GET_RESERVES_SELECTOR): (True, reserves(10 ** 6, 2 * 10 ** 18)),
+    })
+
+    assert await onchain.fetch(["low"], {"low": ("ethereum", LOW_TOKEN, 6)}) == {}
+    assert onchain.stats()["unpriced"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_feeds_rejected():
+    now = int(time.time())
+    pair = v2_pair_address(FACTORY, INIT_CODE_HASH, LOW_TOKEN, WETH)
+    onchain = pricer({
+        (BTC_FEED, LATEST_ROUND_DATA_SELECTOR): (True, round_data(60000_00000000, now - 7200)),
+        (NATIVE_FEED, LATEST_ROUND_DATA_SELECTOR): (True, round_data(2500_00000000, now - 7200)),
+        (pair, GET_RESERVES_SELECTOR): (True, reserves(1_000_000 * 10 ** 6, 400 * 10 ** 18)),
+    }, max_feed_age=3600)
+
+    # A stale native feed also leaves every pair on the chain unpriced
+    assert await onchain.fetch(["bitcoin", "low"], {"low": ("ethereum", LOW_TOKEN, 6)}) == {}
+    assert onchain.stats()["unpriced"] == 2
+
+
+@pytest.mark.asyncio
+async def test_pairs_from_get_pair_resolved_once():
+    now = int(time.time())
+    pair = "0x" + "ab" * 20
+    answers = {
+        (FACTORY, encode_call(GET_PAIR_SELECTOR, ["address", "address"], [LOW_TOKEN, WETH])): (True, encode(["address"], [pair])),
+        (FACTORY, encode_call(GET_PAIR_SELECTOR, ["address", "address"], [HIGH_TOKEN, WETH])): (True, encode(["address"], ["0x" + "00" * 20])),
+        (NATIVE_FEED, LATEST_ROUND_DATA_SELECTOR): (True, round_data(2500_00000000, now)),
+        (pair, GET_RESERVES_SELECTOR): (True, reserves(1_000_000 * 10 ** 6, 400 * 10 ** 18)),
+    }
+    onchain = pricer(answers, init_code_hash=None)
+    tokens = {"low": ("ethereum", LOW_TOKEN, 6), "high": ("ethereum", HIGH_TOKEN, 18)}
+
+    for _ in range(2):
+        prices = await onchain.fetch(["low", "high"], tokens)
+        assert {price_id: p["price"] for price_id, p in prices.items()} == pytest.approx({"low": 1.0})
+
+    get_pair_calls = [call_data for _, call_data in onchain.registry.eth.sub_calls if call_data[:4] == GET_PAIR_SELECTOR]
+    # Both lookups (including the pair that does not exist) are cached after the first round
+    assert len(get_pair_calls) == 2
+    assert onchain.stats()["multicalls"] == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_chain_logged_and_skipped(caplog):
+    class DownRegistry:
+        async def get(self, chain):
+            raise ConnectionError("no provider")
+
+    onchain = OnChainPricer(DownRegistry(), feeds={"bitcoin": ("ethereum", BTC_FEED)}, dexes={})
+
+    with caplog.at_level(logging.WARNING, logger="utils.onchain_prices"):
+        assert await onchain.fetch(["bitcoin"]) == {}
+
+    assert "On-chain price read failed on ethereum: no provider" in caplog.text
+    assert onchain.stats()["unpriced"] == 1
@@ -0,0 +1,616 @@
+"""
+Portfolio monitor scan path tests
+Run with: pytest tests/test_portfolio_monitor.py
+"""
+
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from aiohttp import web
+from eth_abi import decode, encode
+from uagents.storage import KeyValueStore
+from utils.balance_cache import BalanceCache
+from utils.cache import AsyncTTLCache
+from storage import SnapshotStore
+from utils.multicall import AGGREGATE3_SELECTOR, DECIMALS_SELECTOR, SYMBOL_SELECTOR, TokenMetadataCache, balance_of_call
+import agents.portfolio_monitor as monitor
+import asyncio
+import logging
+import pytest
+import threading
+import time
+import pytest_asyncio
+
+TOKEN = "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48"
+WALLETS = ["0x" + "11" * 20, "0x" + "22" * 20]
+
+
+class Ctx:
+    def __init__(self, tmp_path):
+        self.storage = KeyValueStore("monitor", cwd=str(tmp_path))
+        self.logger = logging.getLogger("test_portfolio_monitor")
+
+
+class MulticallNode:
+    """eth.call for Multicall3: decodes each aggregate3 and answers its sub-calls from `answers`."""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.sub_calls = []
+
+    async def call(self, transaction):
+        data = bytes.fromhex(transaction["data"][2:])
+        assert data[:4] == AGGREGATE3_SELECTOR
+        (calls,) = decode(["(address,bool,bytes)[]"], data[4:])
+        self.sub_calls.extend(call_data for _, _, call_data in calls)
+        return encode(["(bool,bytes)[]"], [[self.answers[call_data] for _, _, call_data in calls]])
+
+
+class Web3Stand:
+    def __init__(self, eth):
+        self.eth = eth
+
+
+@pytest.mark.asyncio
+async def test_token_metadata_is_read_once_per_token(tmp_path, monkeypatch):
+    node = MulticallNode({
+        DECIMALS_SELECTOR: (True, encode(["uint256"], [6])),
+        SYMBOL_SELECTOR: (True, encode(["string"], ["USDC"])),
+        balance_of_call(WALLETS[0]): (True, encode(["uint256"], [2_500_000])),
+        balance_of_call(WALLETS[1]): (False, b""),
+    })
+
+    async def get(chain):
+        return Web3Stand(node)
+
+    async def prices(ids):
+        return {i.lower(): {"price": 1.0, "change_24h": 0.1, "success": True} for i in ids}
+
+    monkeypatch.setattr(monitor.rpc_registry, "get", get)
+    monkeypatch.setattr(monitor, "fetch_token_prices_batch", prices)
+    monkeypatch.setattr(monitor, "token_metadata", TokenMetadataCache())
+    monkeypatch.setattr(monitor, "TOKEN_DISCOVERY", False)
+    monkeypatch.setattr(monitor, "chain_tokens", {"ethereum": [{"address": TOKEN, "coingecko_id": "usd-coin"}]})
+    ctx = Ctx(tmp_path)
+
+    first = await monitor.get_token_balances_multicall(ctx, WALLETS, "ethereum")
+    node.sub_calls.clear()
+    second = await monitor.get_token_balances_multicall(ctx, WALLETS, "ethereum")
+
+    assert first == second
+    assert first[WALLETS[1]] == []
+    assert first[WALLETS[0]] == [{
+        "token": "USDC", "balance": 2.5, "price": 1.0, "value_usd": 2.5,
+        "change_24h": 0.1, "chain": "ethereum", "address": TOKEN
+    }]
+    # The second scan only asks for balances; decimals and symbol came from the persisted cache
+    assert node.sub_calls == [balance_of_call(w) for w in WALLETS]
+    assert ctx.storage.get(TokenMetadataCache.STORAGE_KEY) == {f"ethereum:{TOKEN}": {"symbol": "USDC", "decimals": 6}}
+
+
+@pytest.mark.asyncio
+async def test_token_without_decimals_is_skipped_and_retried(tmp_path, monkeypatch):
+    node = MulticallNode({
+        DECIMALS_SELECTOR: (False, b""),
+        SYMBOL_SELECTOR: (False, b""),
+        balance_of_call(WALLETS[0]): (True, encode(["uint256"], [10 ** 18])),
+    })
+
+    async def get(chain):
+        return Web3Stand(node)
+
+    monkeypatch.setattr(monitor.rpc_registry, "get", get)
+    monkeypatch.setattr(monitor, "token_metadata", TokenMetadataCache())
+    monkeypatch.setattr(monitor, "TOKEN_DISCOVERY", False)
+    monkeypatch.setattr(monitor, "chain_tokens", {"ethereum": [{"address": TOKEN, "coingecko_id": "usd-coin"}]})
+    ctx = Ctx(tmp_path)
+
+    assert await monitor.get_token_balances_multicall(ctx, WALLETS[:1], "ethereum") == {WALLETS[0]: []}
+    assert monitor.token_metadata.missing("ethereum", [TOKEN]) == [TOKEN]
+
+
+def test_portfolios_sharing_a_chain_pay_its_batch_job_once(monkeypatch):
+    scheduler = monitor.ScanScheduler()
+    monkeypatch.setattr(monitor, "scan_scheduler", scheduler)
+    monkeypatch.setattr(monitor, "wallet_registry", monitor.WalletRegistry())
+    limit = monitor.rpc_registry.batch_limit("ethereum")
+    job_calls = monitor.scan_job_calls("ethereum")
+
+    portfolios = {f"user-{i}": {"wallets": ["0x" + f"{i:040x}"], "chains": ["ethereum"]} for i in range(200)}
+    for user_id, portfolio in portfolios.items():
+        monitor.schedule_portfolio(user_id, portfolio)
+
+    cost = monitor.estimate_scan_cost(portfolios["user-0"])
+    assert cost["rpc"] == {"ethereum": job_calls, "ethereum:0x" + "0" * 40: job_calls / limit}
+    assert cost["price_ids"] == monitor.scan_price_ids(["ethereum"])
+
+    due = scheduler.pop_due({"rpc": monitor.SCAN_RPC_BUDGET, "price_ids": monitor.SCAN_PRICE_ID_BUDGET})
+    # One batch job per batch_limit wallets, plus the chain's first job
+    assert len(due) >= min(200, int((monitor.SCAN_RPC_BUDGET - job_calls) * limit / job_calls))
+
+
+class CoinGecko:
+    """/simple/price stand-in that records the ids of every request."""
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.requests = []
+
+    async def simple_price(self, request):
+        ids = request.query["ids"].split(",")
+        self.requests.append(ids)
+        return web.json_response({
+            i: {"usd": self.prices[i], "usd_24h_change": 1.5} for i in ids if i in self.prices
+        })
+
+
+@pytest_asyncio.fixture
+async def coingecko(monkeypatch):
+    api = CoinGecko({"ethereum": 2500.0, "binancecoin": 600.0, "matic-network": 0.8, "usd-coin": 1.0})
+    app = web.Application()
+    app.router.add_get("/simple/price", api.simple_price)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    monkeypatch.setattr(monitor, "COINGECKO_SIMPLE_PRICE_URL", f"http://127.0.0.1:{port}/simple/price")
+    monkeypatch.setattr(monitor, "_coingecko_session", None)
+    monkeypatch.setattr(monitor, "price_cache", AsyncTTLCache())
+    monkeypatch.setattr(monitor, "price_table", None)
+    monkeypatch.setattr(monitor, "ONCHAIN_PRICES", False)
+    yield api
+
+    await monitor.get_coingecko_session().close()
+    await runner.cleanup()
+
+
+def test_native_price_id_shared_across_chains(monkeypatch):
+    monkeypatch.setattr(monitor, "ERC20_SCAN", False)
+
+    ids = monitor.scan_price_ids(["ethereum", "arbitrum", "optimism", "base", "bsc"])
+
+    assert ids == {"ethereum", "binancecoin"}
+
+
+@pytest.mark.asyncio
+async def test_all_prices_resolved_in_one_call(coingecko):
+    prices = await monitor.fetch_token_prices_batch(["ethereum", "BinanceCoin", "ethereum", "usd-coin", "unlisted-coin"])
+
+    assert coingecko.requests == [["ethereum", "binancecoin", "usd-coin", "unlisted-coin"]]
+    assert prices["ethereum"] == {"price": 2500.0, "change_24h": 1.5, "success": True}
+    assert prices["binancecoin"]["price"] == 600.0
+    assert prices["unlisted-coin"] == {"price": 0, "change_24h": 0, "success": False}
+
+
+@pytest.mark.asyncio
+async def test_cached_prices_only_fetch_the_rest(coingecko):
+    await monitor.fetch_token_prices_batch(["ethereum", "binancecoin"])
+    prices = await monitor.fetch_token_prices_batch(["ethereum", "matic-network"])
+
+    assert coingecko.requests == [["ethereum", "binancecoin"], ["matic-network"]]
+    assert prices["matic-network"]["price"] == 0.8
+
+
+@pytest.mark.asyncio
+async def test_price_api_error_prices_nothing(coingecko, monkeypatch):
+    monkeypatch.setattr(monitor, "COINGECKO_SIMPLE_PRICE_URL", monitor.COINGECKO_SIMPLE_PRICE_URL.replace("/simple/price", "/missing"))
+
+    prices = await monitor.fetch_token_prices_batch(["ethereum"])
+
+    assert prices == {"ethereum": {"price": 0, "change_24h": 0, "success": False}}
+
+
+class ChainNode:
+    """batch_request stand-in holding a head block, block hashes, nonces and balances."""
+
+    def __init__(self, head):
+        self.head = head
+        self.hashes = {}
+        self.nonces = {}
+        self.balances = {}
+        self.balance_reads = []
+
+    def block_hash(self, number):
+        return self.hashes.get(number, f"0x{number:064x}")
+
+    async def batch_request(self, chain, calls):
+        results = []
+        for method, params in calls:
+            if method == "eth_getBlockByNumber":
+                number = self.head if params[0] == "latest" else int(params[0], 16)
+                results.append({"result": {"number": hex(number), "hash": self.block_hash(number)}})
+            elif method == "eth_getTransactionCount":
+                results.append({"result": hex(self.nonces[params[0]])})
+            elif method == "eth_getBalance":
+                self.balance_reads.append(params[0])
+                results.append({"result": hex(self.balances[params[0]])})
+        return results
+
+
+@pytest.fixture
+def chain_node(monkeypatch):
+    node = ChainNode(head=1000)
+    for i, wallet in enumerate(WALLETS):
+        node.nonces[wallet] = 5
+        node.balances[wallet] = (i + 1) * 10 ** 18
+    monkeypatch.setattr(monitor.rpc_registry, "batch_request", node.batch_request)
+    monkeypatch.setattr(monitor, "balance_cache", BalanceCache(max_block_age=300, reorg_depth=64))
+    return node
+
+
+@pytest.mark.asyncio
+async def test_unchanged_nonce_reuses_cached_balance(chain_node):
+    first = await monitor.read_native_balances_cached("ethereum", WALLETS)
+    chain_node.head = 1010
+    chain_node.nonces[WALLETS[1]] = 6
+    chain_node.balances[WALLETS[1]] = 7
+    chain_node.balance_reads.clear()
+
+    second = await monitor.read_native_balances_cached("ethereum", WALLETS)
+
+    assert first == {WALLETS[0]: {"balance_wei": 10 ** 18}, WALLETS[1]: {"balance_wei": 2 * 10 ** 18}}
+    assert second == {WALLETS[0]: {"balance_wei": 10 ** 18}, WALLETS[1]: {"balance_wei": 7}}
+    assert chain_node.balance_reads == [WALLETS[1]]
+    assert monitor.balance_cache.stats() == {"entries": 2, "reused": 1, "refreshed": 3}
+
+
+@pytest.mark.asyncio
+async def test_old_cached_balance_is_reread(chain_node):
+    await monitor.read_native_balances_cached("ethereum", WALLETS)
+    chain_node.head = 1300
+    chain_node.balance_reads.clear()
+
+    await monitor.read_native_balances_cached("ethereum", WALLETS)
+
+    assert chain_node.balance_reads == WALLETS
+
+
+@pytest.mark.asyncio
+async def test_reorged_block_drops_cached_balance(chain_node):
+    await monitor.read_native_balances_cached("ethereum", WALLETS)
+    # Block 1000 was replaced; the balances read at it may no longer hold
+    chain_node.hashes[1000] = "0x" + "ab" * 32
+    chain_node.head = 1005
+    chain_node.balances[WALLETS[0]] = 3
+    chain_node.balance_reads.clear()
+
+    balances = await monitor.read_native_balances_cached("ethereum", WALLETS)
+
+    assert chain_node.balance_reads == WALLETS
+    assert balances[WALLETS[0]] == {"balance_wei": 3}
+    assert monitor.balance_cache.get("ethereum", WALLETS[0])["block_hash"] == chain_node.block_hash(1005)
+
+
+@pytest.mark.asyncio
+async def test_snapshot_writes_run_off_the_event_loop(tmp_path, monkeypatch):
+    store = SnapshotStore(str(tmp_path / "snapshots"))
+    threads = []
+    append = store.append
+
+    def recording_append(*args, **kwargs):
+        threads.append(threading.get_ident())
+        append(*args, **kwargs)
+
+    monkeypatch.setattr(store, "append", recording_append)
+    monkeypatch.setattr(monitor, "snapshot_store", store)
+    monkeypatch.setattr(monitor, "_last_compaction", {})
+
+    await monitor.record_snapshot(Ctx(tmp_path), "user", 1500.0, 0.4, 2.0, 3)
+
+    assert threads and threads[0] != threading.get_ident()
+    assert store.latest("user")["total_value_usd"] == 1500.0
+    assert "user" in monitor._last_compaction
+
+
+@pytest.mark.asyncio
+async def test_legacy_snapshot_lists_imported_once(tmp_path, monkeypatch):
+    store = SnapshotStore(str(tmp_path / "snapshots"))
+    monkeypatch.setattr(monitor, "snapshot_store", store)
+    ctx = Ctx(tmp_path)
+    assets = [{"token": "ETH", "change_24h": -4.0}, {"token": "USDC", "change_24h": 0.0}]
+    ctx.storage.set("snapshots_alice", [
+        {"user_id": "alice", "total_value_usd": 200.0, "assets": assets,
+         "timestamp": "2025-10-15T11:00:00+00:00", "risk_score": 0.5},
+        {"user_id": "alice", "total_value_usd": 100.0, "assets": assets,
+         "timestamp": "2025-10-15T10:00:00+00:00", "risk_score": 0.3},
+        {"user_id": "alice", "timestamp": "not a date"},
+    ])
+    ctx.storage.set("snapshots_bob", [])
+    store.append("carol", 50.0, 0.1, timestamp=2e9)
+    ctx.storage.set("snapshots_carol", [
+        {"user_id": "carol", "total_value_usd": 10.0, "assets": [], "timestamp": "2025-10-15T10:00:00+00:00", "risk_score": 0.1}
+    ])
+    keys = ["portfolio_alice", "portfolio_bob", "portfolio_carol"]
+
+    assert await monitor.import_legacy_snapshots(ctx, keys) == 2
+    assert await monitor.import_legacy_snapshots(ctx, keys) == 0
+
+    history = list(store.query("alice", 0, 2e9))
+    assert [(r["total_value_usd"], r["risk_score"], r["asset_count"]) for r in history] == [(100.0, pytest.approx(0.3), 2), (200.0, pytest.approx(0.5), 2)]
+    assert history[0]["volatility"] == pytest.approx(2.0)
+    assert [r["total_value_usd"] for r in store.query("carol", 0, 3e9)] == [50.0]
+    assert ctx.storage.get("snapshots_alice") is None and ctx.storage.get("snapshots_carol") is None
+
+
+@pytest.mark.asyncio
+async def test_scan_status_reports_rate_limits(monkeypatch):
+    limiter = monitor.RateLimiter(rate=100, burst=10)
+    monkeypatch.setattr(monitor.rpc_registry, "rate_limiter", limiter)
+
+    await limiter.acquire("https://rpc.example/v1")
+    status = monitor.scan_status()
+    await limiter.close()
+
+    assert status["rate_limits"]["rpc.example"]["acquired"] == 1
+    assert {"supervisor", "scheduler", "forwarding", "block_watch"} <= set(status)
+
+
+def test_checksum_matches_web3():
+    from web3 import Web3
+
+    addresses = ["0x" + os.urandom(20).hex() for _ in range(200)] + [
+        "0xd8da6bf26964af9d7eed9e03e53415d37aa96045",
+        "0x" + "f" * 40,
+        "0x" + "0" * 39 + "1"
+    ]
+    for address in addresses:
+        assert monitor.checksum_address(address) == Web3.to_checksum_address(address)
+
+
+def test_validate_wallet_addresses_matches_web3():
+    from web3 import Web3
+
+    vitalik = "0xd8da6bf26964af9d7eed9e03e53415d37aa96045"
+    valid, invalid = monitor.validate_wallet_addresses([
+        vitalik.upper().replace("0X", "0x"),
+        f"  {vitalik}  ",
+        "0x" + "ab" * 20,
+        monitor.ZERO_ADDRESS,
+        "0x1234",
+        42
+    ])
+
+    assert valid == [Web3.to_checksum_address(vitalik), Web3.to_checksum_address("0x" + "ab" * 20)]
+    assert invalid == [
+        f"{monitor.ZERO_ADDRESS}: Cannot use zero address",
+        "0x1234: Invalid EVM address format",
+        "42: Address must be a string"
+    ]
+    for address in [vitalik, "0x" + "ab" * 20]:
+        assert monitor.validate_wallet_address(address)["checksum"] == Web3.to_checksum_address(address)
+
+
+def test_bulk_register_with_precomputed_checks_matches_inline(tmp_path, monkeypatch):
+    monkeypatch.setattr(monitor, "scan_scheduler", monitor.ScanScheduler())
+    monkeypatch.setattr(monitor, "wallet_registry", monitor.WalletRegistry())
+    wallet = "0x" + "ab" * 20
+    portfolios = [
+        {"user_id": "alice", "wallets": [wallet], "chains": ["Ethereum"]},
+        {"user_id": "bob", "wallets": ["0x1234"], "chains": ["ethereum"]},
+        {"user_id": "taken", "wallets": [wallet], "chains": ["ethereum"]},
+        "not an object",
+        {"user_id": "carol", "wallets": [wallet], "chains": ["ethereum", "solana"]}
+    ]
+    (tmp_path / "inline").mkdir()
+    (tmp_path / "threaded").mkdir()
+    inline = Ctx(tmp_path / "inline").storage
+    threaded = Ctx(tmp_path / "threaded").storage
+    for storage in (inline, threaded):
+        storage.set("portfolio_taken", {"owner": "someone else"})
+
+    expected = monitor.register_portfolios_bulk(inline, portfolios, owner="http:partner")
+    checks = monitor.check_portfolios_bulk(portfolios)
+    result = monitor.register_portfolios_bulk(threaded, portfolios, owner="http:partner", checks=checks)
+
+    assert result == expected
+    assert result["registered"] == 1
+    assert [(r["user_id"], r["error"].split(":")[0]) for r in result["rejected"]] == [
+        ("bob", "Invalid wallet(s)"),
+        ("taken", "Registered by another owner"),
+        (None, "Portfolio must be an object"),
+        ("carol", "Unsupported chain(s)")
+    ]
+    assert threaded.get("portfolio_alice")["wallets"] == [monitor.checksum_address(wallet)]
+    assert threaded.get("portfolio_keys") == ["portfolio_alice"]
+
+
+@pytest.mark.asyncio
+async def test_shared_wallet_read_once_for_every_portfolio(tmp_path, monkeypatch):
+    monkeypatch.setattr(monitor, "scan_scheduler", monitor.ScanScheduler())
+    monkeypatch.setattr(monitor, "wallet_registry", monitor.WalletRegistry())
+    monkeypatch.setattr(monitor, "holdings_matrix", monitor.HoldingsMatrix())
+    monkeypatch.setattr(monitor, "snapshot_store", SnapshotStore(str(tmp_path / "snapshots")))
+    monkeypatch.setattr(monitor, "_last_compaction", {})
+    shared, own = "0x" + "a" * 40, "0x" + "b" * 40
+    reads = []
+
+    async def no_prices(ids):
+        return {}
+
+    async def scan_chain_holdings(ctx, wallets, chain):
+        reads.extend((chain, wallet) for wallet in wallets)
+        return {
+            wallet: [{"chain": chain, "token": "ETH", "balance": 0.1, "value_usd": 0.5 if wallet == shared else 0.25,
+                      "price": 5.0, "change_24h": 1.0}]
+            for wallet in wallets
+        }
+
+    monkeypatch.setattr(monitor, "fetch_token_prices_batch", no_prices)
+    monkeypatch.setattr(monitor, "scan_chain_holdings", scan_chain_holdings)
+    ctx = Ctx(tmp_path)
+    monitor.store_portfolios(ctx, {
+        "alice": {"wallets": [shared], "chains": ["ethereum"], "last_scan": None},
+        "bob": {"wallets": [shared, own], "chains": ["ethereum"], "last_scan": None}
+    })
+
+    assert await monitor.run_scan_cycle(ctx, ["alice", "bob"]) == 2
+
+    assert sorted(reads) == [("ethereum", shared), ("ethereum", own)]
+    assert ctx.storage.get("portfolio_alice")["last_value_usd"] == pytest.approx(0.5)
+    assert ctx.storage.get("portfolio_bob")["last_value_usd"] == pytest.approx(0.75)
+
+
+@pytest.mark.asyncio
+async def test_cycle_past_deadline_reschedules_unfinished_portfolios(tmp_path, monkeypatch):
+    scheduler = monitor.ScanScheduler(min_interval=60)
+    supervisor = monitor.ScanSupervisor(concurrency=1, deadline=0.05)
+    monkeypatch.setattr(monitor, "scan_scheduler", scheduler)
+    monkeypatch.setattr(monitor, "scan_supervisor", supervisor)
+    monkeypatch.setattr(monitor, "wallet_registry", monitor.WalletRegistry())
+    ctx = Ctx(tmp_path)
+    monitor.store_portfolios(ctx, {
+        user_id: {"wallets": ["0x" + f"{i + 1:040x}"], "chains": ["ethereum"], "last_scan": None}
+        for i, user_id in enumerate(["alice", "bob"])
+    })
+
+    async def holdings(ctx, chain_wallets):
+        return {}
+
+    async def scan(ctx, user_id, holdings, updates):
+        if user_id == "bob":
+            await asyncio.sleep(10)
+        updates[f"portfolio_{user_id}"] = {"last_scan": "2025-10-15T10:00:00+00:00"}
+        scheduler.record_scan(user_id, risk_score=0.0, value_usd=0.0, volatility=0.0)
+
+    monkeypatch.setattr(monitor, "scan_wallet_holdings", holdings)
+    monkeypatch.setattr(monitor, "run_scheduled_scan", scan)
+
+    due = scheduler.pop_due({"rpc": monitor.SCAN_RPC_BUDGET, "price_ids": monitor.SCAN_PRICE_ID_BUDGET})
+    assert sorted(due) == ["alice", "bob"]
+    supervisor.submit("cycle-1", lambda: monitor.run_scan_cycle(ctx, due), size=len(due))
+    while supervisor.running or supervisor.queued:
+        await asyncio.sleep(0.01)
+    await supervisor.stop()
+
+    assert supervisor.timed_out == 1
+    # The finished scan is still committed; the cut-off one is due again after the minimum interval
+    assert ctx.storage.get("portfolio_alice")["last_scan"] == "2025-10-15T10:00:00+00:00"
+    assert ctx.storage.get("portfolio_bob")["last_scan"] is None
+    now = time.time()
+    assert scheduler.pop_due({"rpc": 1e9}, now=now) == []
+    assert scheduler.pop_due({"rpc": 1e9}, now=now + 61) == ["bob"]
+
+
+@pytest.mark.asyncio
+async def test_full_scan_queue_leaves_portfolios_on_the_schedule(tmp_path, monkeypatch):
+    scheduler = monitor.ScanScheduler()
+    supervisor = monitor.ScanSupervisor(concurrency=1)
+    monkeypatch.setattr(monitor, "scan_scheduler", scheduler)
+    monkeypatch.setattr(monitor, "scan_supervisor", supervisor)
+    monkeypatch.setattr(monitor, "wallet_registry", monitor.WalletRegistry())
+    monkeypatch.setattr(monitor, "shard_membership", None)
+    monkeypatch.setattr(monitor, "BLOCK_WATCH", False)
+    monkeypatch.setattr(monitor, "SCAN_QUEUE_LIMIT", 2)
+    ctx = Ctx(tmp_path)
+    monitor.store_portfolios(ctx, {"alice": {"wallets": ["0x" + "a" * 40], "chains": ["ethereum"], "last_scan": None}})
+
+    gate = asyncio.Event()
+    for i in range(3):
+        supervisor.submit(f"earlier-{i}", gate.wait)
+    await asyncio.sleep(0.01)
+    assert (supervisor.running, supervisor.queued) == (1, 2)
+
+    try:
+        await monitor.monitor_portfolios(ctx)
+        assert supervisor.queued == 2
+        assert scheduler.stats()["overdue"] == 1
+
+        # Once the queue drains below the limit the next tick queues a cycle
+        supervisor.cancel("earlier-1")
+        monkeypatch.setattr(monitor, "run_scan_cycle", lambda ctx, due: gate.wait())
+        await monitor.monitor_portfolios(ctx)
+        assert supervisor.queued == 2
+        assert scheduler.stats()["overdue"] == 0
+    finally:
+        await supervisor.stop()
+
+
+@pytest_asyncio.fixture
+async def warmup(tmp_path, monkeypatch):
+    """Three stored portfolios and a fresh scheduler, supervisor and warm-up status; cycles wait on `release`."""
+    scheduler = monitor.ScanScheduler()
+    supervisor = monitor.ScanSupervisor(concurrency=2)
+    monkeypatch.setattr(monitor, "scan_scheduler", scheduler)
+    monkeypatch.setattr(monitor, "scan_supervisor", supervisor)
+    monkeypatch.setattr(monitor, "wallet_registry", monitor.WalletRegistry())
+    monkeypatch.setattr(monitor, "shard_membership", None)
+    monkeypatch.setattr(monitor, "warmup_status", {
+        "state": "pending", "total": 0, "scanned": 0, "started_at": None, "finished_at": None
+    })
+    monkeypatch.setattr(monitor, "WARMUP_BATCH", 1)
+    monkeypatch.setattr(monitor, "WARMUP_CONCURRENCY", 1)
+    ctx = Ctx(tmp_path)
+    monitor.store_portfolios(ctx, {
+        user_id: {"wallets": ["0x" + f"{i + 1:040x}"], "chains": ["ethereum"], "last_scan": None}
+        for i, user_id in enumerate(["alice", "bob", "carol"])
+    })
+
+    state = SimpleNamespace(ctx=ctx, scheduler=scheduler, supervisor=supervisor, release=asyncio.Event(), cycles=[])
+
+    async def run_scan_cycle(ctx, due):
+        state.cycles.append(list(due))
+        await state.release.wait()
+        for user_id in due:
+            scheduler.record_scan(user_id, risk_score=0.0, value_usd=0.0, volatility=0.0)
+        return len(due)
+
+    monkeypatch.setattr(monitor, "run_scan_cycle", run_scan_cycle)
+    yield state
+
+    await supervisor.stop()
+
+
+def due_now(scheduler):
+    return sorted(scheduler.pop_due({"rpc": 1e9, "price_ids": 1e9}))
+
+
+@pytest.mark.asyncio
+async def test_warmup_holds_regular_ticks_off_and_reports_progress(warmup, monkeypatch):
+    monkeypatch.setattr(monitor, "WARMUP_WINDOW", 60)
+
+    monitor.start_warmup(warmup.ctx, ["portfolio_alice", "portfolio_bob", "portfolio_carol"])
+    status = monitor.scan_status()["warmup"]
+    assert (status["state"], status["total"], status["started_at"]) == ("queued", 3, None)
+    # Parked for the window, so regular ticks leave them to the warm-up
+    assert due_now(warmup.scheduler) == []
+
+    await asyncio.sleep(0.01)
+    status = monitor.scan_status()["warmup"]
+    assert (status["state"], status["scanned"], status["finished_at"]) == ("running", 0, None)
+    assert warmup.cycles == [["alice"]]
+    assert monitor.scan_status()["supervisor"]["running"][0]["id"] == "warmup"
+
+    warmup.release.set()
+    while warmup.supervisor.running:
+        await asyncio.sleep(0.01)
+
+    status = monitor.scan_status()["warmup"]
+    assert (status["state"], status["scanned"], status["total"]) == ("done", 3, 3)
+    assert status["finished_at"] >= status["started_at"]
+    assert warmup.cycles == [["alice"], ["bob"], ["carol"]]
+    # Rescheduled by their scans, not due again until their regular interval
+    assert due_now(warmup.scheduler) == []
+
+
+@pytest.mark.asyncio
+async def test_warmup_past_its_window_is_incomplete(warmup, monkeypatch):
+    monkeypatch.setattr(monitor, "WARMUP_WINDOW", 0.05)
+
+    monitor.start_warmup(warmup.ctx, ["portfolio_alice", "portfolio_bob", "portfolio_carol"])
+    await asyncio.sleep(0.01)
+    assert monitor.scan_status()["warmup"]["state"] == "running"
+    while warmup.supervisor.running:
+        await asyncio.sleep(0.01)
+
+    status = monitor.scan_status()["warmup"]
+    assert (status["state"], status["scanned"]) == ("incomplete", 0)
+    assert status["finished_at"] is not None
+    assert warmup.supervisor.timed_out == 1
+    # Nothing was scanned, so every portfolio is due again once the window closed
+    assert due_now(warmup.scheduler) == ["alice", "bob", "carol"]
@@ -0,0 +1,123 @@
+"""
+Shared price table tests: a writer and readers in separate processes
+Run with: pytest tests/test_price_table.py
+"""
+
+import multiprocessing
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.price_table import SEQ_WORD, SharedPriceTable
+import pytest
+
+
+@pytest.fixture
+def writer():
+    table = SharedPriceTable(f"dg-test-{os.getpid()}", capacity=64, writer=True)
+    assert table.open()
+    yield table
+    table.unlink()
+
+
+def read_in_child(name, price_ids, results):
+    table = SharedPriceTable(name)
+    results.put(table.read(price_ids))
+    table.close()
+
+
+def check_coherence(name, rounds, results):
+    # Every publish writes one value to both ids, so a torn read would see them differ
+    table = SharedPriceTable(name)
+    torn = 0
+    for _ in range(rounds):
+        prices = table.read(["a", "b"])
+        if prices and prices["a"]["price"] != prices["b"]["price"]:
+            torn += 1
+    table.close()
+    results.put(torn)
+
+
+def test_reader_process_sees_published_prices(writer):
+    writer.publish({"ethereum": {"price": 2500.0, "change_24h": -1.5}, "bitcoin": {"price": 60000.0}})
+
+    results = multiprocessing.Queue()
+    child = multiprocessing.Process(target=read_in_child, args=(writer.name, ["ethereum", "bitcoin", "solana"], results))
+    child.start()
+    prices = results.get(timeout=10)
+    child.join()
+
+    assert prices["ethereum"]["price"] == 2500.0
+    assert prices["ethereum"]["change_24h"] == -1.5
+    assert prices["bitcoin"]["change_24h"] == 0.0
+    assert "solana" not in prices
+
+
+def test_reads_are_never_torn(writer):
+    writer.publish({"a": {"price": 1.0}, "b": {"price": 1.0}})
+    results = multiprocessing.Queue()
+    child = multiprocessing.Process(target=check_coherence, args=(writer.name, 20000, results))
+    child.start()
+    price = 1.0
+    while child.is_alive() and results.empty():
+        price += 1.0
+        writer.publish({"a": {"price": price}, "b": {"price": price}})
+
+    assert results.get(timeout=10) == 0
+    child.join()
+
+
+def test_reader_backs_off_from_unfinished_publish(writer):
+    writer.publish({"ethereum": {"price": 2500.0}})
+    reader = SharedPriceTable(writer.name)
+
+    writer._header[SEQ_WORD] += 1
+    assert reader.read(["ethereum"]) == {}
+    assert reader.contended == 1
+
+    writer._header[SEQ_WORD] += 1
+    assert reader.read(["ethereum"], max_age=60)["ethereum"]["price"] == 2500.0
+    assert reader.read(["ethereum"], max_age=-1) == {}
+    reader.close()
+
+
+def test_ids_wait_for_a_finished_publish(writer):
+    writer.publish({"ethereum": {"price": 2500.0}})
+    reader = SharedPriceTable(writer.name)
+
+    writer._header[SEQ_WORD] += 1
+    assert reader.ids() == []
+    assert reader.contended == 1
+
+    writer._header[SEQ_WORD] += 1
+    writer.publish({"bitcoin": {"price": 60000.0}})
+    assert reader.ids() == ["ethereum", "bitcoin"]
+    assert writer.ids() == ["ethereum", "bitcoin"]
+    reader.close()
+
+
+def test_ids_torn_by_a_publish_are_not_kept(writer):
+    writer.publish({"ethereum": {"price": 2500.0}})
+    reader = SharedPriceTable(writer.name)
+    assert reader.open()
+    new_ids = reader._new_ids
+    attempts = []
+
+    def racing_new_ids():
+        # First attempt sees an id mid-write while a whole publish goes by
+        attempts.append(1)
+        if len(attempts) > 1:
+            return new_ids()
+        writer._ids[0] = b"ethe"
+        torn = new_ids()
+        writer._ids[0] = b"ethereum"
+        writer._header[SEQ_WORD] += 2
+        return torn
+
+    reader._new_ids = racing_new_ids
+    assert reader.read(["ethereum"])["ethereum"]["price"] == 2500.0
+    assert reader.ids() == ["ethereum"]
+    assert (len(attempts), reader.retries) == (3, 1)
+    reader.close()
@@ -0,0 +1,94 @@
+"""
+RPC rate limiter tests
+Run with: pytest tests/test_rate_limit.py
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.rate_limit import HostLimiter, RateLimiter, TokenBucket, rate_limit_owner
+
+
+def test_token_bucket_refills_up_to_burst():
+    bucket = TokenBucket(rate=10, burst=2)
+    now = bucket.updated
+
+    assert bucket.try_take(now) and bucket.try_take(now)
+    assert not bucket.try_take(now)
+    assert bucket.time_until_token(now) == pytest.approx(0.1)
+    assert bucket.try_take(now + 0.1)
+    assert bucket.try_take(now + 10) and bucket.try_take(now + 10)
+    assert not bucket.try_take(now + 10)
+
+
+def test_token_bucket_honours_explicit_zero_time():
+    bucket = TokenBucket(rate=1, burst=1)
+    bucket.tokens = 0.0
+    bucket.updated = 0.0
+
+    assert not bucket.try_take(0.0)
+    assert bucket.time_until_token(0.0) == pytest.approx(1.0)
+    assert bucket.try_take(1.0)
+
+
+@pytest.mark.asyncio
+async def test_owners_are_served_round_robin():
+    limiter = HostLimiter("rpc.example", rate=200, burst=1)
+    await limiter.acquire("warmup")
+    order = []
+
+    async def request(owner):
+        await limiter.acquire(owner)
+        order.append(owner)
+
+    tasks = [asyncio.create_task(request("whale")) for _ in range(10)]
+    tasks += [asyncio.create_task(request("minnow")) for _ in range(2)]
+    await asyncio.gather(*tasks)
+
+    assert order[:5] == ["whale", "minnow", "whale", "minnow", "whale"]
+    assert limiter.stats()["waited"] == 12
+    assert limiter.queue_depth() == 0
+    await limiter.close()
+
+
+@pytest.mark.asyncio
+async def test_throttle_pauses_host():
+    limiter = HostLimiter("rpc.example", rate=1000, burst=5)
+    limiter.throttle(0.1)
+
+    start = time.monotonic()
+    await limiter.acquire()
+
+    assert time.monotonic() - start >= 0.09
+    assert limiter.stats()["throttled"] == 1
+    await limiter.close()
+
+
+@pytest.mark.asyncio
+async def test_limits_are_per_host_and_use_owner_context():
+    limiter = RateLimiter(rate=1, burst=1, host_limits={"free.example": (0, 0)})
+
+    assert limiter.limiter("https://free.example/rpc") is None
+    assert limiter.limiter("https://a.example/x") is limiter.limiter("https://A.example/y")
+
+    await limiter.acquire("https://a.example/rpc")
+    token = rate_limit_owner.set("cycle-1")
+    try:
+        waiter = asyncio.create_task(limiter.acquire("https://a.example/rpc"))
+        await asyncio.sleep(0.01)
+        assert list(limiter.limiter("https://a.example")._queues) == ["cycle-1"]
+        assert limiter.stats()["a.example"]["queue_depth"] == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+    finally:
+        rate_limit_owner.reset(token)
+
+    await limiter.acquire("https://b.example/rpc")
+    assert set(limiter.stats()) == {"a.example", "b.example"}
+    await limiter.close()
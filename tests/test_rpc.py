@@ -0,0 +1,202 @@
+"""
+RPC failover, circuit breaker and hedging tests against local JSON-RPC stand-ins
+Run with: pytest tests/test_rpc.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from aiohttp import web
+from utils.rpc import ProviderRegistry
+import aiohttp
+import asyncio
+import pytest
+import pytest_asyncio
+
+
+class Endpoint:
+    """
+    Answers every call with its name after `delay` seconds, or with HTTP
+    `status` when set. Batches larger than `max_batch` get `reject_status`.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.delay = 0.0
+        self.status = None
+        self.max_batch = None
+        self.reject_status = 413
+        self.calls = 0
+        self.batch_sizes = []
+
+    async def handle(self, request):
+        call = await request.json()
+        self.calls += 1
+        if self.status is not None:
+            return web.Response(status=self.status, text="unavailable")
+        await asyncio.sleep(self.delay)
+        if isinstance(call, list):
+            self.batch_sizes.append(len(call))
+            if self.max_batch is not None and len(call) > self.max_batch:
+                return web.Response(status=self.reject_status, text="batch too large")
+            return web.json_response([{"jsonrpc": "2.0", "id": c["id"], "result": f"{self.name}:{c['params'][0]}"} for c in call])
+        return web.json_response({"jsonrpc": "2.0", "id": call["id"], "result": self.name})
+
+
+@pytest_asyncio.fixture
+async def endpoints():
+    nodes, runners, urls = [Endpoint("primary"), Endpoint("backup")], [], []
+    for node in nodes:
+        app = web.Application()
+        app.router.add_post("/", node.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        runners.append(runner)
+        urls.append(f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/")
+
+    yield nodes, {"local": {"rpc": urls[0], "rpcs": urls[1:]}}
+
+    for runner in runners:
+        await runner.cleanup()
+
+
+def seed_latency(registry, latencies):
+    # Five samples give an endpoint a p95, which is what turns hedging on
+    for endpoint, latency in zip(registry.endpoints("local"), latencies):
+        for _ in range(5):
+            endpoint.record_success(latency)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("hedge", [False, True])
+async def test_fails_over_to_backup_on_server_error(endpoints, hedge):
+    (primary, backup), config = endpoints
+    registry = ProviderRegistry(config, hedge=hedge)
+    seed_latency(registry, [0.05, 0.1])
+    primary.status = 502
+
+    try:
+        assert await registry.request("local", "eth_chainId", []) == "backup"
+    finally:
+        await registry.close()
+
+    assert primary.calls == 1 and backup.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_after_repeated_failures(endpoints):
+    (primary, backup), config = endpoints
+    registry = ProviderRegistry(config, hedge=False, failure_threshold=2, circuit_cooldown=60)
+    seed_latency(registry, [0.001, 0.1])
+    primary.status = 500
+
+    try:
+        for _ in range(4):
+            assert await registry.request("local", "eth_chainId", []) == "backup"
+        stats = registry.stats()["local"]
+    finally:
+        await registry.close()
+
+    # Two failures open the primary's circuit; later requests go straight to the backup
+    assert primary.calls == 2
+    assert stats[0]["circuit_open"] and not stats[1]["circuit_open"]
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged(endpoints):
+    (primary, backup), config = endpoints
+    registry = ProviderRegistry(config, hedge=True, timeout=5.0)
+    seed_latency(registry, [0.01, 0.02])
+    primary.delay = 1.0
+
+    try:
+        started = asyncio.get_running_loop().time()
+        assert await registry.request("local", "eth_chainId", []) == "backup"
+        elapsed = asyncio.get_running_loop().time() - started
+    finally:
+        await registry.close()
+
+    assert elapsed < 0.5
+    assert registry.hedged_requests == 1
+
+
+@pytest.mark.asyncio
+async def test_all_endpoints_failing_raises(endpoints):
+    (primary, backup), config = endpoints
+    registry = ProviderRegistry(config, hedge=True)
+    seed_latency(registry, [0.05, 0.1])
+    primary.status = backup.status = 503
+
+    try:
+        with pytest.raises(aiohttp.ClientResponseError):
+            await registry.request("local", "eth_chainId", [])
+    finally:
+        await registry.close()
+
+    assert primary.calls == 1 and backup.calls == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("reject_status", [400, 413])
+async def test_rejected_batch_shrinks_and_splits(endpoints, reject_status):
+    (primary, backup), config = endpoints
+    registry = ProviderRegistry(config, hedge=False, max_batch_size=100)
+    primary.max_batch = 30
+    primary.reject_status = reject_status
+    calls = [("eth_getBalance", [i]) for i in range(100)]
+
+    try:
+        results = await registry.batch_request("local", calls)
+        stats = registry.stats()["local"]
+    finally:
+        await registry.close()
+
+    assert results == [{"result": f"primary:{i}"} for i in range(100)]
+    assert primary.batch_sizes[:3] == [100, 50, 25]
+    assert max(primary.batch_sizes[3:]) < 50
+    # A size rejection is not the endpoint's fault: no failures, no failover
+    assert stats[0]["failures"] == 0 and backup.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_batch_limit_grows_back_below_rejected_size(endpoints):
+    (primary, backup), config = endpoints
+    registry = ProviderRegistry(config, hedge=False, max_batch_size=40)
+    primary.max_batch = 30
+    calls = [("eth_getBalance", [i]) for i in range(40)]
+
+    try:
+        for _ in range(20):
+            results = await registry.batch_request("local", calls)
+            assert all("result" in r for r in results)
+    finally:
+        await registry.close()
+
+    # The first rejection halves the limit to 20 and caps growth at 39, so 40 is never tried again
+    assert primary.batch_sizes[:2] == [40, 20]
+    assert primary.batch_sizes.count(40) == 1
+    assert max(primary.batch_sizes[1:]) <= 39
+    assert max(size for size in primary.batch_sizes if size <= 30) > 20
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status", [400, 413])
+async def test_single_request_rejection_fails_over(endpoints, status):
+    (primary, backup), config = endpoints
+    registry = ProviderRegistry(config, hedge=False)
+    seed_latency(registry, [0.001, 0.1])
+    primary.status = status
+
+    try:
+        assert await registry.request("local", "eth_chainId", []) == "backup"
+        results = await registry.batch_request("local", [("eth_getBalance", ["0xa"])])
+        stats = registry.stats()["local"]
+    finally:
+        await registry.close()
+
+    assert results == [{"result": "backup:0xa"}]
+    assert stats[0]["failures"] == 2
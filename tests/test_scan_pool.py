@@ -0,0 +1,80 @@
+"""
+Chain worker pool and scan supervisor tests
+Run with: pytest tests/test_scan_pool.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.scan_pool import ChainWorkerPool, ChainWorkerPools
+from utils.scan_supervisor import ScanSupervisor
+import asyncio
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_cancels_running_job():
+    pool = ChainWorkerPool("ethereum", 1)
+    finished = []
+
+    async def job(name, seconds):
+        await asyncio.sleep(seconds)
+        finished.append(name)
+        return name
+
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(pool.submit(job, "slow", 10), timeout=0.05)
+        # The single worker is free again right away
+        assert await asyncio.wait_for(pool.submit(job, "next", 0), timeout=1) == "next"
+    finally:
+        await pool.close()
+
+    assert finished == ["next"]
+    assert pool.stats()["cancelled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_supervisor_deadline_stops_pool_jobs():
+    pools = ChainWorkerPools({"ethereum": 2})
+    supervisor = ScanSupervisor(deadline=0.05)
+    finished = []
+
+    async def read_chain(wallet):
+        await asyncio.sleep(0.3)
+        finished.append(wallet)
+
+    async def cycle():
+        await pools.map([("ethereum", ("0xa",)), ("ethereum", ("0xb",))], read_chain)
+
+    try:
+        supervisor.submit("cycle-1", cycle)
+        await asyncio.sleep(0.5)
+        stats = supervisor.stats()
+    finally:
+        await supervisor.stop()
+        await pools.close()
+
+    assert stats["timed_out"] == 1
+    assert finished == []
+
+
+@pytest.mark.asyncio
+async def test_map_returns_results_in_order_with_failures():
+    pools = ChainWorkerPools({}, default_size=2)
+
+    async def job(value):
+        if value < 0:
+            raise ValueError("negative")
+        await asyncio.sleep(0.01 * (3 - value))
+        return value * 10
+
+    try:
+        results = await pools.map([("a", (1,)), ("b", (-1,)), ("a", (2,))], job)
+    finally:
+        await pools.close()
+
+    assert results[0] == 10 and results[2] == 20
+    assert isinstance(results[1], ValueError)
@@ -0,0 +1,170 @@
+"""
+Background scan supervisor tests
+Run with: pytest tests/test_scan_supervisor.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.scan_supervisor import ScanSupervisor
+import asyncio
+import pytest
+
+
+async def wait_idle(supervisor: ScanSupervisor):
+    while supervisor.queued or supervisor.running:
+        await asyncio.sleep(0.005)
+
+
+@pytest.mark.asyncio
+async def test_jobs_start_in_order_within_concurrency():
+    supervisor = ScanSupervisor(concurrency=2)
+    started = []
+    active = 0
+    peak = 0
+
+    async def cycle(name):
+        nonlocal active, peak
+        started.append(name)
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+
+    try:
+        for i in range(6):
+            assert supervisor.submit(f"cycle-{i}", lambda i=i: cycle(f"cycle-{i}"))
+        assert supervisor.queued == 6
+        await wait_idle(supervisor)
+    finally:
+        await supervisor.stop()
+
+    assert started == [f"cycle-{i}" for i in range(6)]
+    assert peak == 2
+    assert supervisor.completed == 6
+
+
+@pytest.mark.asyncio
+async def test_duplicate_job_id_not_queued_twice():
+    supervisor = ScanSupervisor(concurrency=1)
+    gate = asyncio.Event()
+
+    try:
+        assert supervisor.submit("warmup", gate.wait)
+        assert not supervisor.submit("warmup", gate.wait)
+        gate.set()
+        await wait_idle(supervisor)
+        # Free again once it has finished
+        assert supervisor.submit("warmup", gate.wait)
+        await wait_idle(supervisor)
+    finally:
+        await supervisor.stop()
+
+    assert supervisor.completed == 2
+
+
+@pytest.mark.asyncio
+async def test_job_past_deadline_cancelled_and_next_runs():
+    supervisor = ScanSupervisor(concurrency=1, deadline=0.05)
+    cleaned_up = []
+    ran = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        finally:
+            cleaned_up.append("slow")
+
+    async def quick():
+        ran.append("quick")
+
+    try:
+        supervisor.submit("slow", slow)
+        supervisor.submit("quick", quick)
+        await wait_idle(supervisor)
+    finally:
+        await supervisor.stop()
+
+    assert cleaned_up == ["slow"] and ran == ["quick"]
+    assert (supervisor.timed_out, supervisor.completed) == (1, 1)
+    assert supervisor.recent[0]["outcome"] == "timed_out"
+    assert supervisor.recent[0]["duration"] == pytest.approx(0.05, abs=0.05)
+
+
+@pytest.mark.asyncio
+async def test_per_job_deadline_overrides_default():
+    supervisor = ScanSupervisor(concurrency=1, deadline=0.01)
+
+    try:
+        supervisor.submit("warmup", lambda: asyncio.sleep(0.05), deadline=1.0)
+        await wait_idle(supervisor)
+    finally:
+        await supervisor.stop()
+
+    assert (supervisor.completed, supervisor.timed_out) == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_cancel_queued_and_running_jobs():
+    supervisor = ScanSupervisor(concurrency=1)
+
+    try:
+        supervisor.submit("running", lambda: asyncio.sleep(10))
+        supervisor.submit("queued", lambda: asyncio.sleep(10))
+        await asyncio.sleep(0.01)
+
+        assert supervisor.cancel("queued")
+        assert supervisor.cancel("running")
+        assert not supervisor.cancel("unknown")
+        await wait_idle(supervisor)
+    finally:
+        await supervisor.stop()
+
+    assert supervisor.cancelled == 2
+    assert {job["id"]: job["outcome"] for job in supervisor.recent} == {"queued": "cancelled", "running": "cancelled"}
+
+
+@pytest.mark.asyncio
+async def test_stats_report_queue_running_and_outcomes():
+    supervisor = ScanSupervisor(concurrency=1)
+    gate = asyncio.Event()
+
+    async def fail():
+        raise RuntimeError("rpc down")
+
+    try:
+        supervisor.submit("failing", fail)
+        await wait_idle(supervisor)
+        supervisor.submit("cycle-1", gate.wait, size=40)
+        supervisor.submit("cycle-2", gate.wait, size=10)
+        await asyncio.sleep(0.01)
+
+        stats = supervisor.stats()
+        assert stats["queued"] == 1
+        assert [(job["id"], job["size"]) for job in stats["running"]] == [("cycle-1", 40)]
+        assert stats["failed"] == 1 and stats["recent"][-1]["error"] == "rpc down"
+
+        gate.set()
+        await wait_idle(supervisor)
+    finally:
+        await supervisor.stop()
+
+    stats = supervisor.stats()
+    assert (stats["queued"], stats["running"], stats["completed"]) == (0, [], 2)
+    assert [job["id"] for job in stats["recent"]] == ["failing", "cycle-1", "cycle-2"]
+    assert stats["avg_duration"] >= 0.0
+
+
+@pytest.mark.asyncio
+async def test_stop_cancels_everything():
+    supervisor = ScanSupervisor(concurrency=1)
+    supervisor.submit("running", lambda: asyncio.sleep(10))
+    supervisor.submit("queued", lambda: asyncio.sleep(10))
+    await asyncio.sleep(0.01)
+
+    await supervisor.stop()
+
+    assert (supervisor.queued, supervisor.running) == (0, 0)
+    assert supervisor.cancelled == 2
@@ -0,0 +1,94 @@
+"""
+Scan scheduler tests
+Run with: pytest tests/test_scheduler.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.scheduler import ScanScheduler
+
+
+def test_interval_shrinks_for_risky_valuable_volatile():
+    scheduler = ScanScheduler()
+
+    calm = scheduler.compute_interval(risk_score=0.1, value_usd=1_000, volatility=1)
+    risky = scheduler.compute_interval(risk_score=0.9, value_usd=1_000, volatility=1)
+    valuable = scheduler.compute_interval(risk_score=0.1, value_usd=1_000_000, volatility=1)
+    volatile = scheduler.compute_interval(risk_score=0.1, value_usd=1_000, volatility=30)
+
+    assert risky < calm and valuable < calm and volatile < calm
+    assert scheduler.compute_interval(value_usd=0) == scheduler.max_interval
+    assert scheduler.compute_interval(1.0, 1e12, 1000) == scheduler.min_interval
+
+
+def test_most_overdue_popped_first():
+    scheduler = ScanScheduler()
+    scheduler.upsert("late", {"rpc": 1}, last_scan=1000)
+    scheduler.upsert("later", {"rpc": 1}, last_scan=0)
+    scheduler.upsert("fresh", {"rpc": 1}, last_scan=10 ** 9)
+
+    assert scheduler.pop_due({"rpc": 10}, now=200_000) == ["later", "late"]
+    assert "fresh" in scheduler
+
+
+def test_budget_limits_each_tick():
+    scheduler = ScanScheduler()
+    for i in range(5):
+        scheduler.upsert(f"p{i}", {"rpc": 3}, last_scan=i)
+
+    first = scheduler.pop_due({"rpc": 7}, now=200_000)
+    second = scheduler.pop_due({"rpc": 7}, now=200_000)
+
+    assert first == ["p0", "p1"]
+    assert second == ["p2", "p3"]
+
+
+def test_oversized_portfolio_is_not_starved():
+    scheduler = ScanScheduler()
+    scheduler.upsert("whale", {"rpc": 50}, last_scan=0)
+    scheduler.upsert("small", {"rpc": 1}, last_scan=10)
+
+    assert scheduler.pop_due({"rpc": 10}, now=200_000) == ["whale"]
+    assert scheduler.pop_due({"rpc": 10}, now=200_000) == ["small"]
+
+
+def test_shared_set_costs_charged_once():
+    scheduler = ScanScheduler()
+    scheduler.upsert("a", {"prices": {"eth", "usdc"}}, last_scan=0)
+    scheduler.upsert("b", {"prices": {"eth", "usdc"}}, last_scan=1)
+    scheduler.upsert("c", {"prices": {"dai", "wbtc"}}, last_scan=2)
+
+    assert scheduler.pop_due({"prices": 3}, now=200_000) == ["a", "b"]
+
+
+def test_record_scan_and_mark_due_reschedule():
+    scheduler = ScanScheduler()
+    scheduler.upsert("a", {"rpc": 1}, last_scan=0)
+    assert scheduler.pop_due({"rpc": 1}, now=200_000) == ["a"]
+    assert scheduler.next_due() is None
+
+    due_at = scheduler.record_scan("a", 0.5, 10_000, 2, now=200_000)
+    assert scheduler.next_due() == due_at > 200_000
+
+    scheduler.mark_due("a", due_at=200_001)
+    assert scheduler.pop_due({"rpc": 1}, now=200_001) == ["a"]
+
+    scheduler.remove("a")
+    assert scheduler.next_due() is None and len(scheduler) == 0
+
+
+def test_weighted_shared_costs_charged_once():
+    scheduler = ScanScheduler()
+    # Each portfolio shares the chain's batch job (4 calls) and adds a quarter call per wallet
+    scheduler.upsert("a", {"rpc": {"ethereum": 4, "ethereum:0xa": 0.25}}, last_scan=0)
+    scheduler.upsert("b", {"rpc": {"ethereum": 4, "ethereum:0xa": 0.25, "ethereum:0xb": 0.25}}, last_scan=1)
+    scheduler.upsert("c", {"rpc": {"polygon": 4, "polygon:0xc": 0.25}}, last_scan=2)
+    scheduler.upsert("d", {"rpc": {"ethereum": 4, "ethereum:0xd": 0.25}}, last_scan=3)
+
+    # a: 4.25, b: 0.25 (chain and 0xa already charged), c: 4.25 would exceed 5, so the tick stops there
+    assert scheduler.pop_due({"rpc": 5}, now=200_000) == ["a", "b"]
+    assert scheduler.pop_due({"rpc": 5}, now=200_000) == ["c"]
+    assert scheduler.pop_due({"rpc": 5}, now=200_000) == ["d"]
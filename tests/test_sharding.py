@@ -0,0 +1,96 @@
+"""
+Monitor sharding tests
+Run with: pytest tests/test_sharding.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.sharding import ConsistentHashRing, ShardMembership
+
+KEYS = [f"user-{i}" for i in range(4000)]
+
+
+def test_ring_spreads_keys_across_nodes():
+    ring = ConsistentHashRing(["w1", "w2", "w3", "w4"])
+    counts = {}
+    for key in KEYS:
+        owner = ring.owner(key)
+        counts[owner] = counts.get(owner, 0) + 1
+
+    assert set(counts) == {"w1", "w2", "w3", "w4"}
+    assert all(600 < c < 1400 for c in counts.values())
+    assert ConsistentHashRing().owner("user-1") is None
+
+
+def test_join_moves_about_one_nth_to_new_node():
+    ring = ConsistentHashRing(["w1", "w2", "w3", "w4"])
+    before = {key: ring.owner(key) for key in KEYS}
+
+    ring.add("w5")
+    after = {key: ring.owner(key) for key in KEYS}
+    moved = [key for key in KEYS if before[key] != after[key]]
+
+    assert all(after[key] == "w5" for key in moved)
+    assert 0.1 < len(moved) / len(KEYS) < 0.3
+
+
+def test_leave_moves_only_departed_keys():
+    ring = ConsistentHashRing(["w1", "w2", "w3"])
+    before = {key: ring.owner(key) for key in KEYS}
+
+    ring.remove("w2")
+    after = {key: ring.owner(key) for key in KEYS}
+
+    assert "w2" not in ring and len(ring) == 2
+    assert all(before[key] == after[key] for key in KEYS if before[key] != "w2")
+    assert "w2" not in after.values()
+
+
+def test_membership_follows_heartbeats(tmp_path):
+    a = ShardMembership(str(tmp_path), "worker-a", "agent1a", ttl=60)
+    b = ShardMembership(str(tmp_path), "worker-b", "agent1b", ttl=60)
+    a.heartbeat(now=1000)
+    b.heartbeat(now=1000)
+
+    assert a.refresh(now=1010)
+    assert a.stats()["members"] == ["worker-a", "worker-b"]
+    assert a.address_of("worker-b") == "agent1b"
+    assert a.is_member_address("agent1b")
+    assert not a.refresh(now=1020)
+
+    owners = {a.owner(key) for key in KEYS[:200]}
+    assert owners == {"worker-a", "worker-b"}
+
+    b.refresh(now=1010)
+    assert all(a.owns(key) != b.owns(key) for key in KEYS[:200])
+
+
+def test_stale_heartbeat_drops_out(tmp_path):
+    a = ShardMembership(str(tmp_path), "worker-a", "agent1a", ttl=60)
+    b = ShardMembership(str(tmp_path), "worker-b", "agent1b", ttl=60)
+    b.heartbeat(now=1000)
+    a.refresh(now=1000)
+
+    assert a.refresh(now=1100)
+    assert a.stats()["members"] == ["worker-a"]
+    assert all(a.owns(key) for key in KEYS[:50])
+    assert a.rebalances == 2
+
+
+def test_leave_removes_worker(tmp_path):
+    a = ShardMembership(str(tmp_path), "worker-a", "agent1a")
+    b = ShardMembership(str(tmp_path), "worker-b", "agent1b")
+    a.heartbeat()
+    b.heartbeat()
+    a.refresh()
+
+    b.leave()
+    b.heartbeat()
+    assert b.refresh()
+    assert "worker-b" not in b.members
+
+    assert a.refresh()
+    assert a.stats()["members"] == ["worker-a"]
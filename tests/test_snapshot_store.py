@@ -0,0 +1,102 @@
+"""
+Snapshot store tests
+Run with: pytest tests/test_snapshot_store.py
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from storage import DAY, HOUR, SnapshotStore
+
+# Day- and hour-aligned start so bucket boundaries are predictable
+BASE = 20000 * DAY
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path / "snapshots"))
+
+
+def test_append_and_range_query(store):
+    for i in range(5):
+        store.append("user", 100.0 + i, 0.1 * i, volatility=2.0, asset_count=3, timestamp=BASE + i * 60)
+
+    records = list(store.query("user", BASE + 60, BASE + 180))
+
+    assert [r["total_value_usd"] for r in records] == [101.0, 102.0, 103.0]
+    assert all(r["resolution"] == "raw" and r["samples"] == 1 for r in records)
+    assert store.latest("user")["total_value_usd"] == 104.0
+    assert store.latest("someone-else") is None
+
+
+def test_query_spans_segments(store):
+    store.append("user", 1.0, 0.1, timestamp=BASE + 10)
+    store.append("user", 2.0, 0.1, timestamp=BASE + DAY + 10)
+    store.append("user", 3.0, 0.1, timestamp=BASE + 2 * DAY + 10)
+
+    values = [r["total_value_usd"] for r in store.query("user", BASE, BASE + 3 * DAY)]
+    assert values == [1.0, 2.0, 3.0]
+
+
+def test_raw_downsampled_to_hourly(store):
+    store.append("user", 100.0, 0.2, volatility=1.0, timestamp=BASE)
+    store.append("user", 80.0, 0.6, volatility=3.0, timestamp=BASE + 600)
+    store.append("user", 90.0, 0.4, volatility=2.0, timestamp=BASE + 1200)
+    store.append("user", 50.0, 0.1, timestamp=BASE + HOUR + 60)
+
+    result = store.compact("user", now=BASE + 8 * DAY)
+    hourly = list(store.query("user", 0, BASE + DAY))
+
+    assert result["raw_to_hourly"] == 1
+    assert list(store.query("user", 0, BASE + DAY, resolution="raw")) == []
+    assert len(hourly) == 2
+
+    first = hourly[0]
+    assert first["resolution"] == "hourly"
+    assert first["timestamp"] == BASE
+    assert first["total_value_usd"] == 90.0
+    assert (first["min_value_usd"], first["max_value_usd"]) == (80.0, 100.0)
+    assert first["samples"] == 3
+    assert first["risk_score"] == pytest.approx(0.4)
+    assert first["max_risk_score"] == pytest.approx(0.6)
+    assert first["volatility"] == pytest.approx(2.0)
+
+
+def test_recent_raw_kept_and_queried_after_rollups(store):
+    store.append("user", 10.0, 0.1, timestamp=BASE)
+    store.append("user", 20.0, 0.1, timestamp=BASE + 7 * DAY + 60)
+
+    store.compact("user", now=BASE + 8 * DAY)
+    records = list(store.query("user", 0, BASE + 8 * DAY))
+
+    assert [(r["resolution"], r["total_value_usd"]) for r in records] == [("hourly", 10.0), ("raw", 20.0)]
+
+
+def test_hourly_to_daily_and_expiry(store):
+    store.append("user", 100.0, 0.2, timestamp=BASE)
+    store.append("user", 200.0, 0.4, timestamp=BASE + 2 * HOUR)
+
+    store.compact("user", now=BASE + 8 * DAY)
+    result = store.compact("user", now=BASE + 130 * DAY)
+    daily = list(store.query("user", 0, BASE + DAY))
+
+    assert result["hourly_to_daily"] == 1
+    assert len(daily) == 1
+    assert daily[0]["resolution"] == "daily"
+    assert daily[0]["samples"] == 2
+    assert daily[0]["max_value_usd"] == 200.0
+
+    result = store.compact("user", now=BASE + 7 * 365 * DAY)
+    assert result["daily_expired"] == 1
+    assert store.latest("user") is None
+
+
+def test_custom_retention(tmp_path):
+    store = SnapshotStore(str(tmp_path), retention={"raw": DAY})
+    store.append("user", 1.0, 0.1, timestamp=BASE)
+
+    assert store.compact("user", now=BASE + 2 * DAY)["raw_to_hourly"] == 1
@@ -0,0 +1,169 @@
+"""
+Token discovery tests against a local JSON-RPC stand-in
+Run with: pytest tests/test_token_discovery.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from aiohttp import web
+from utils.rpc import ProviderRegistry
+from utils.token_discovery import TRANSFER_TOPIC, TokenDiscovery, address_topic
+import pytest
+import pytest_asyncio
+
+WALLET = "0x" + "11" * 20
+OTHER = "0x" + "22" * 20
+TOKEN = "0x" + "aa" * 20
+NFT = "0x" + "bb" * 20
+
+
+class LogNode:
+    """eth_blockNumber and eth_getLogs over a fixed log list, refusing ranges wider than max_range."""
+
+    def __init__(self, max_range=500):
+        self.head = 10000
+        self.max_range = max_range
+        self.failure = None
+        self.logs = []
+        self.ranges = []
+
+    def add_transfer(self, block, token, sender, recipient, token_id=None):
+        topics = [TRANSFER_TOPIC, address_topic(sender), address_topic(recipient)]
+        if token_id is not None:
+            topics.append(hex(token_id))
+        self.logs.append((block, {"address": token, "topics": topics, "blockNumber": hex(block)}))
+
+    def get_logs(self, query):
+        start, end = int(query["fromBlock"], 16), int(query["toBlock"], 16)
+        self.ranges.append((start, end))
+        if self.failure:
+            raise ValueError(self.failure)
+        if end - start + 1 > self.max_range:
+            raise ValueError("query returned more than 10000 results")
+
+        matched = []
+        for block, log in self.logs:
+            if not start <= block <= end:
+                continue
+            if all(wanted is None or log["topics"][i] in wanted for i, wanted in enumerate(query["topics"][1:], 1)):
+                matched.append(log)
+        return matched
+
+    async def endpoint(self, request):
+        call = await request.json()
+        try:
+            if call["method"] == "eth_blockNumber":
+                result = hex(self.head)
+            else:
+                result = self.get_logs(call["params"][0])
+        except ValueError as e:
+            return web.json_response({"jsonrpc": "2.0", "id": call["id"], "error": {"code": -32005, "message": str(e)}})
+        return web.json_response({"jsonrpc": "2.0", "id": call["id"], "result": result})
+
+
+class MemoryStorage(dict):
+    def set(self, key, value):
+        self[key] = value
+
+
+@pytest_asyncio.fixture
+async def log_node():
+    node = LogNode()
+    app = web.Application()
+    app.router.add_post("/", node.endpoint)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    registry = ProviderRegistry({"local": {"rpc": f"http://127.0.0.1:{port}/"}}, hedge=False)
+    yield node, registry
+
+    await registry.close()
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_backfill_splits_refused_ranges(log_node):
+    node, registry = log_node
+    node.add_transfer(9000, TOKEN, OTHER, WALLET)
+    node.add_transfer(9500, NFT, OTHER, WALLET, token_id=1)
+
+    discovery = TokenDiscovery(registry, backfill_blocks=2000, initial_range=2000, max_requests=50)
+    found = await discovery.discover("local", [WALLET])
+
+    assert found == {WALLET: [TOKEN]}
+    assert discovery.checkpoint("local", WALLET) == node.head
+    assert discovery.splits > 0
+    assert all(end - start + 1 <= node.max_range for start, end in node.ranges[-2:])
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_limits_next_run_to_new_blocks(log_node):
+    node, registry = log_node
+    storage = MemoryStorage()
+
+    discovery = TokenDiscovery(registry, backfill_blocks=400)
+    discovery.load(storage)
+    await discovery.discover("local", [WALLET])
+    discovery.save(storage)
+
+    node.head += 50
+    node.add_transfer(node.head, TOKEN, WALLET, OTHER)
+    node.ranges.clear()
+
+    resumed = TokenDiscovery(registry)
+    resumed.load(storage)
+    found = await resumed.discover("local", [WALLET])
+
+    assert found == {WALLET: [TOKEN]}
+    assert node.ranges == [(node.head - 49, node.head)] * 2
+    assert resumed.tokens("local", WALLET) == [TOKEN]
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_is_not_split(log_node):
+    node, registry = log_node
+    node.failure = "rate limit exceeded, too many requests"
+
+    discovery = TokenDiscovery(registry, backfill_blocks=400)
+    with pytest.raises(ValueError):
+        await discovery.discover("local", [WALLET])
+
+    assert len(node.ranges) == 1
+    assert discovery.splits == 0
+
+
+@pytest.mark.asyncio
+async def test_splits_count_against_request_budget(log_node):
+    node, registry = log_node
+    node.max_range = 1
+
+    discovery = TokenDiscovery(registry, backfill_blocks=2000, initial_range=2000, max_requests=6)
+    await discovery.discover("local", [WALLET])
+
+    assert len(node.ranges) == 6
+    # The refused range was never fully read, so the next run starts from the same block
+    assert discovery.checkpoint("local", WALLET) is None
+
+
+@pytest.mark.asyncio
+async def test_range_ceiling_recovers(log_node):
+    node, registry = log_node
+    node.max_range = 1
+
+    discovery = TokenDiscovery(registry, backfill_blocks=2, initial_range=2, max_requests=10)
+    await discovery.discover("local", [WALLET])
+    assert discovery.range_size("local") == 1
+
+    node.max_range = 500
+    node.head += 200
+    discovery.max_requests = 200
+    discovery.probe_after = 5
+    await discovery.discover("local", [WALLET])
+
+    assert discovery.range_size("local") > 2
@@ -0,0 +1,67 @@
+"""
+Wallet subscription registry tests
+Run with: pytest tests/test_wallet_registry.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.wallet_registry import WalletRegistry
+
+
+def test_shared_wallet_maps_to_every_portfolio():
+    registry = WalletRegistry()
+    registry.subscribe("alice", ["0xa", "0xb"], ["ethereum", "polygon"])
+    registry.subscribe("bob", ["0xa"], ["ethereum"])
+
+    assert registry.subscribers("ethereum", "0xa") == {"alice", "bob"}
+    assert registry.subscribers("polygon", "0xa") == {"alice"}
+    assert registry.subscribers("ethereum", "0xc") == set()
+    assert sorted(registry.wallets("ethereum")) == ["0xa", "0xb"]
+    assert registry.chains() == {"ethereum", "polygon"}
+    assert len(registry) == 4
+
+
+def test_resubscribe_replaces_pairs():
+    registry = WalletRegistry()
+    registry.subscribe("alice", ["0xa", "0xb"], ["ethereum"])
+    registry.subscribe("bob", ["0xb"], ["ethereum"])
+    registry.subscribe("alice", ["0xc"], ["base"])
+
+    assert registry.subscribers("ethereum", "0xa") == set()
+    assert registry.subscribers("ethereum", "0xb") == {"bob"}
+    assert registry.subscribers("base", "0xc") == {"alice"}
+    assert registry.chains() == {"ethereum", "base"}
+
+
+def test_unsubscribe_drops_pairs_nobody_watches():
+    registry = WalletRegistry()
+    registry.subscribe("alice", ["0xa", "0xb"], ["ethereum"])
+    registry.subscribe("bob", ["0xa"], ["ethereum"])
+
+    registry.unsubscribe("alice")
+    registry.unsubscribe("carol")
+
+    assert registry.subscribers("ethereum", "0xa") == {"bob"}
+    assert registry.wallets("ethereum") == ["0xa"]
+    assert registry.stats() == {"portfolios": 1, "subscriptions": 1, "unique_wallets": 1}
+
+    registry.unsubscribe("bob")
+    assert len(registry) == 0 and registry.chains() == set()
+
+
+def test_group_reads_each_wallet_once():
+    registry = WalletRegistry()
+    registry.subscribe("alice", ["0xa", "0xb"], ["ethereum", "polygon"])
+    registry.subscribe("bob", ["0xa"], ["ethereum"])
+    registry.subscribe("carol", ["0xd"], ["base"])
+
+    grouped = registry.group(["alice", "bob", "unknown"])
+
+    assert {chain: sorted(wallets) for chain, wallets in grouped.items()} == {
+        "ethereum": ["0xa", "0xb"],
+        "polygon": ["0xa", "0xb"]
+    }
+    assert registry.stats() == {"portfolios": 3, "subscriptions": 6, "unique_wallets": 5}
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+class BalanceCache:
+    """
+    Native balances per (chain, wallet), tagged with the block and nonce they
+    were read at.
+
+    A cached balance is reused while the wallet's nonce is unchanged and the
+    entry is younger than max_block_age blocks. The nonce only moves on
+    outgoing transactions, so the block age bound is what catches incoming
+    transfers. Entries recorded at a block whose hash no longer matches the
+    canonical chain are dropped (reorg). Past maxsize, the entry refreshed
+    longest ago is evicted in O(1).
+    """
+
+    def __init__(self, max_block_age: int = 300, reorg_depth: int = 64, maxsize: int = 100000):
+        self.max_block_age = max_block_age
+        self.reorg_depth = reorg_depth
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        self.reused = 0
+        self.refreshed = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, chain: str, wallet: str) -> Optional[Dict]:
+        return self._entries.get((chain, wallet))
+
+    def is_stale(self, entry: Optional[Dict], nonce: Optional[int], head_block: int) -> bool:
+        if entry is None or nonce is None:
+            return True
+        return entry["nonce"] != nonce or head_block - entry["block"] >= self.max_block_age
+
+    def update(self, chain: str, wallet: str, balance_wei: int, nonce: int, block: int, block_hash: str):
+        key = (chain, wallet)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        elif len(self._entries) >= self.maxsize:
+            # Entries are kept in refresh order, so the first one is the next to go stale anyway
+            self._entries.popitem(last=False)
+
+        self._entries[key] = {
+            "balance_wei": balance_wei,
+            "nonce": nonce,
+            "block": block,
+            "block_hash": block_hash
+        }
+
+    def blocks_to_verify(self, chain: str, wallets: List[str], head_block: int) -> Dict[int, str]:
+        """Distinct (block -> hash) recorded for these wallets that are still within reorg depth."""
+        blocks = {}
+        for wallet in wallets:
+            entry = self._entries.get((chain, wallet))
+            if entry and head_block - entry["block"] <= self.reorg_depth:
+                blocks[entry["block"]] = entry["block_hash"]
+        return blocks
+
+    def invalidate(self, chain: str, wallet: str):
+        self._entries.pop((chain, wallet), None)
+
+    def invalidate_from(self, chain: str, block: int) -> int:
+        stale_keys = [k for k, e in self._entries.items() if k[0] == chain and e["block"] >= block]
+        for key in stale_keys:
+            del self._entries[key]
+        return len(stale_keys)
+
+    def stats(self) -> Dict:
+        return {"entries": len(self._entries), "reused": self.reused, "refreshed": self.refreshed}
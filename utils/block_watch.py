@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import math
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+# ERC-20 transfer(address,uint256) and transferFrom(address,address,uint256)
+TRANSFER_SELECTOR = "0xa9059cbb"
+TRANSFER_FROM_SELECTOR = "0x23b872dd"
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over one blake2b digest."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class AddressIndex:
+    """
+    Monitored addresses for one chain: a Bloom filter for the per-transaction
+    test, backed by the exact set to discard false positives.
+    """
+
+    def __init__(self, addresses: Iterable[str] = (), error_rate: float = 0.001):
+        self.error_rate = error_rate
+        self.rebuild(addresses)
+        self.checked = 0
+        self.false_positives = 0
+
+    def rebuild(self, addresses: Iterable[str]):
+        self._exact: Set[str] = {a.lower() for a in addresses}
+        self._bloom = BloomFilter(len(self._exact), self.error_rate)
+        for address in self._exact:
+            self._bloom.add(address)
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def __contains__(self, address: str) -> bool:
+        self.checked += 1
+        if address not in self._bloom:
+            return False
+        if address in self._exact:
+            return True
+        self.false_positives += 1
+        return False
+
+
+def transaction_addresses(tx: Dict) -> List[str]:
+    """from/to of a transaction plus the counterparties of a plain ERC-20 transfer call."""
+    addresses = [tx.get("from"), tx.get("to")]
+    data = tx.get("input") or tx.get("data") or ""
+
+    if data.startswith(TRANSFER_SELECTOR) and len(data) >= 74:
+        addresses.append("0x" + data[34:74])
+    elif data.startswith(TRANSFER_FROM_SELECTOR) and len(data) >= 138:
+        addresses.append("0x" + data[34:74])
+        addresses.append("0x" + data[98:138])
+
+    return [a.lower() for a in addresses if a]
+
+
+class BlockWatcher:
+    """
+    Follows new heads on one chain by polling eth_blockNumber, fetches every
+    new block with full transactions in one batch, and reports the monitored
+    addresses each block touched.
+
+    When the watcher falls more than max_catchup blocks behind it skips ahead
+    to the head; the regular scan schedule covers anything skipped.
+    """
+
+    def __init__(
+            self,
+            registry,
+            chain: str,
+            index: AddressIndex,
+            on_touched: Callable[[str, Set[str], int], Awaitable[None]],
+            poll_interval: float = 12.0,
+            max_catchup: int = 10
+    ):
+        self.registry = registry
+        self.chain = chain
+        self.index = index
+        self.on_touched = on_touched
+        self.poll_interval = poll_interval
+        self.max_catchup = max_catchup
+        self.last_block: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self.blocks = 0
+        self.transactions = 0
+        self.touched = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def scan_block(self, block: Dict) -> Set[str]:
+        touched = set()
+        for tx in block.get("transactions") or []:
+            if not isinstance(tx, dict):
+                continue
+            self.transactions += 1
+            for address in transaction_addresses(tx):
+                if address in self.index:
+                    touched.add(address)
+        return touched
+
+    async def poll(self) -> int:
+        """Process every block since the last poll; returns how many were processed."""
+        head = int(await self.registry.request(self.chain, "eth_blockNumber", []), 16)
+
+        if self.last_block is None:
+            self.last_block = head
+            return 0
+        if head <= self.last_block:
+            return 0
+
+        start = self.last_block + 1
+        if head - start + 1 > self.max_catchup:
+            skipped = head - self.max_catchup + 1 - start
+            self.skipped += skipped
+            print(f"⚠️ {self.chain} block watch {head - start + 1} block(s) behind, skipped {skipped}")
+            start = head - self.max_catchup + 1
+
+        numbers = list(range(start, head + 1))
+        responses = await self.registry.batch_request(
+            self.chain, [("eth_getBlockByNumber", [hex(n), True]) for n in numbers]
+        )
+
+        processed = 0
+        for number, response in zip(numbers, responses):
+            block = response.get("result")
+            if not block:
+                # Not served yet (lagging node); retry from here next poll
+                break
+
+            touched = self.scan_block(block)
+            self.blocks += 1
+            processed += 1
+            self.last_block = number
+
+            if touched:
+                self.touched += len(touched)
+                await self.on_touched(self.chain, touched, number)
+
+        return processed
+
+    async def run(self):
+        while True:
+            try:
+                if len(self.index):
+                    await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors += 1
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name=f"block-watch-{self.chain}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "last_block": self.last_block,
+            "addresses": len(self.index),
+            "blocks": self.blocks,
+            "transactions": self.transactions,
+            "touched": self.touched,
+            "poll_interval": self.poll_interval,
+            "max_catchup": self.max_catchup,
+            "skipped_blocks": self.skipped,
+            "false_positives": self.index.false_positives,
+            "errors": self.errors
+        }
@@ -0,0 +1,164 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class AsyncTTLCache:
+    """
+    Bounded async cache with per-key TTL, single-flight fetches and
+    stale-while-revalidate.
+
+    - Fresh entries are returned directly.
+    - Entries past their TTL but inside the stale window are returned right
+      away while one background refresh runs.
+    - Misses are fetched once per key; concurrent callers await the same
+      in-flight fetch instead of hitting upstream again.
+    - The least recently used entries are evicted beyond maxsize.
+
+    Fetchers return None (or leave a key out of a batch result) for values
+    they could not load; those are not cached, so a stale value survives an
+    upstream outage until its stale window ends.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, stale_ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._background: set = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: Hashable, now: float):
+        """Return (value, state) where state is 'fresh', 'stale' or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, None
+
+        value, expires_at, stale_until = entry
+        if now < expires_at:
+            self._entries.move_to_end(key)
+            return value, "fresh"
+        if now < stale_until:
+            self._entries.move_to_end(key)
+            return value, "stale"
+
+        del self._entries[key]
+        return None, None
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        value, _ = self._lookup(key, time.monotonic())
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.monotonic()
+        self._entries[key] = (value, now + ttl, now + ttl + self.stale_ttl)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def _start_fetch(
+            self,
+            keys: List[Hashable],
+            batch_fetcher: Callable[[List[Hashable]], Awaitable[Dict]],
+            ttl: Optional[float]
+    ) -> asyncio.Task:
+        loop = asyncio.get_running_loop()
+        for key in keys:
+            self._inflight[key] = loop.create_future()
+
+        async def run():
+            try:
+                values = await batch_fetcher(keys) or {}
+            except Exception:
+                values = {}
+
+            for key in keys:
+                future = self._inflight.pop(key, None)
+                value = values.get(key)
+                if value is not None:
+                    self.set(key, value, ttl)
+                if future is not None and not future.done():
+                    future.set_result(value)
+
+        task = asyncio.create_task(run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def get_many(
+            self,
+            keys: List[Hashable],
+            batch_fetcher: Callable[[List[Hashable]], Awaitable[Dict]],
+            ttl: Optional[float] = None
+    ) -> Dict[Hashable, Any]:
+        """Resolve many keys, fetching every miss in a single batch_fetcher call."""
+        now = time.monotonic()
+        results: Dict[Hashable, Any] = {}
+        waiting: Dict[Hashable, asyncio.Future] = {}
+        misses: List[Hashable] = []
+        stale: List[Hashable] = []
+
+        for key in dict.fromkeys(keys):
+            value, state = self._lookup(key, now)
+            if state == "fresh":
+                self.hits += 1
+                results[key] = value
+            elif state == "stale":
+                self.stale_hits += 1
+                results[key] = value
+                if key not in self._inflight:
+                    stale.append(key)
+            elif key in self._inflight:
+                self.coalesced += 1
+                waiting[key] = self._inflight[key]
+            else:
+                self.misses += 1
+                misses.append(key)
+
+        # Stale keys ride along with the misses so one upstream call refreshes both
+        if misses or stale:
+            self._start_fetch(misses + stale, batch_fetcher, ttl)
+            waiting.update({key: self._inflight[key] for key in misses})
+
+        if waiting:
+            # shield: one caller being cancelled must not cancel the shared fetch
+            values = await asyncio.gather(*(asyncio.shield(f) for f in waiting.values()))
+            results.update(zip(waiting.keys(), values))
+
+        return results
+
+    async def get(
+            self,
+            key: Hashable,
+            fetcher: Callable[[], Awaitable[Any]],
+            ttl: Optional[float] = None
+    ) -> Any:
+        async def batch_fetcher(keys: List[Hashable]) -> Dict:
+            return {key: await fetcher()}
+
+        results = await self.get_many([key], batch_fetcher, ttl)
+        return results.get(key)
+
+    def stats(self) -> Dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight)
+        }
@@ -0,0 +1,107 @@
+import time
+from typing import Dict, List, Optional
+
+from utils.defi_positions import min_health_factor
+
+
+def snapshot_fingerprint(assets: List[Dict], total_value_usd: float, timestamp: Optional[float] = None) -> Dict:
+    """The parts of a snapshot the gate compares, small enough to keep on the portfolio record."""
+    weights = {}
+    max_change = 0.0
+    for asset in assets:
+        key = f"{asset['chain']}:{asset.get('address') or asset['token']}"
+        weights[key] = weights.get(key, 0.0) + (asset["value_usd"] / total_value_usd if total_value_usd > 0 else 0.0)
+        max_change = max(max_change, abs(asset.get("change_24h", 0.0)))
+
+    return {
+        "value": total_value_usd,
+        "weights": {key: round(weight, 6) for key, weight in weights.items()},
+        "max_change_24h": max_change,
+        "min_health_factor": min_health_factor(assets),
+        "timestamp": timestamp or time.time()
+    }
+
+
+class SnapshotChangeGate:
+    """
+    Decides whether a snapshot differs enough from the last forwarded one to
+    be worth a risk analysis.
+
+    A snapshot passes when the total value moved by more than value_change
+    (relative), any asset's weight drifted by more than weight_drift, the
+    largest 24h move changed by more than change_delta percentage points,
+    the set of assets above min_weight changed, or max_staleness seconds
+    passed since the last forward. A lending position's health factor below
+    health_factor_warning passes when it first drops there and again each
+    time it falls a further health_factor_delta.
+    """
+
+    def __init__(
+            self,
+            value_change: float = 0.02,
+            weight_drift: float = 0.05,
+            change_delta: float = 5.0,
+            max_staleness: float = 21600.0,
+            min_weight: float = 0.005,
+            health_factor_warning: float = 1.2,
+            health_factor_delta: float = 0.05
+    ):
+        self.value_change = value_change
+        self.weight_drift = weight_drift
+        self.change_delta = change_delta
+        self.max_staleness = max_staleness
+        self.min_weight = min_weight
+        self.health_factor_warning = health_factor_warning
+        self.health_factor_delta = health_factor_delta
+        self.forwarded = 0
+        self.suppressed = 0
+
+    def _asset_set(self, fingerprint: Dict) -> set:
+        return {key for key, weight in fingerprint["weights"].items() if weight >= self.min_weight}
+
+    def reason(self, previous: Optional[Dict], current: Dict) -> Optional[str]:
+        """Why current should be forwarded, or None if it should be suppressed."""
+        if not previous:
+            return "first snapshot"
+
+        health_factor = current.get("min_health_factor")
+        if health_factor is not None and health_factor < self.health_factor_warning:
+            last = previous.get("min_health_factor")
+            if last is None or last >= self.health_factor_warning or last - health_factor > self.health_factor_delta:
+                return f"health factor {health_factor:.2f}"
+
+        if current["timestamp"] - previous["timestamp"] >= self.max_staleness:
+            return "max staleness"
+
+        base = previous["value"]
+        if base > 0 and abs(current["value"] - base) / base > self.value_change:
+            return f"value {(current['value'] - base) / base:+.1%}"
+
+        if self._asset_set(previous) != self._asset_set(current):
+            return "asset set changed"
+
+        keys = previous["weights"].keys() | current["weights"].keys()
+        drift = max((abs(current["weights"].get(k, 0.0) - previous["weights"].get(k, 0.0)) for k in keys), default=0.0)
+        if drift > self.weight_drift:
+            return f"weight drift {drift:.1%}"
+
+        if abs(current["max_change_24h"] - previous["max_change_24h"]) > self.change_delta:
+            return f"24h change {current['max_change_24h']:.1f}%"
+
+        return None
+
+    def check(self, previous: Optional[Dict], current: Dict) -> Optional[str]:
+        reason = self.reason(previous, current)
+        if reason:
+            self.forwarded += 1
+        else:
+            self.suppressed += 1
+        return reason
+
+    def stats(self) -> Dict:
+        total = self.forwarded + self.suppressed
+        return {
+            "forwarded": self.forwarded,
+            "suppressed": self.suppressed,
+            "suppression_rate": self.suppressed / total if total else 0.0
+        }
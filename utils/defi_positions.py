@@ -0,0 +1,173 @@
+from typing import Dict, List, Optional
+
+from utils.multicall import DECIMALS_SELECTOR, SYMBOL_SELECTOR, aggregate3, balance_of_call, decode_symbol, decode_uint, encode_call
+from utils.onchain_prices import GET_RESERVES_SELECTOR, decode_reserves
+
+GET_USER_ACCOUNT_DATA_SELECTOR = bytes.fromhex("bf92857c")
+TOTAL_SUPPLY_SELECTOR = bytes.fromhex("18160ddd")
+
+# Aave V3 reports health factor with 18 decimals and uint256 max when there is no debt
+HEALTH_FACTOR_DECIMALS = 18
+NO_DEBT_HEALTH_FACTOR = 2 ** 256 - 1
+
+# Health factor at which a lending position stops adding liquidation risk; 1.0 is liquidation itself
+SAFE_HEALTH_FACTOR = 2.0
+
+
+def liquidation_risk(health_factor: Optional[float], safe: float = SAFE_HEALTH_FACTOR) -> float:
+    """0 at or above `safe`, rising linearly to 1 at a health factor of 1.0 (liquidatable); 0 without debt."""
+    if health_factor is None:
+        return 0.0
+    if health_factor <= 1.0:
+        return 1.0
+    return min(max((safe - health_factor) / (safe - 1.0), 0.0), 1.0)
+
+
+def min_health_factor(assets: List[Dict]) -> Optional[float]:
+    factors = [a["health_factor"] for a in assets if a.get("health_factor") is not None]
+    return min(factors) if factors else None
+
+
+def decode_account_data(data: bytes, base_decimals: int) -> Optional[Dict]:
+    # getUserAccountData(user) -> (totalCollateralBase, totalDebtBase, availableBorrowsBase,
+    #                              currentLiquidationThreshold, ltv, healthFactor)
+    if len(data) < 192:
+        return None
+    words = [int.from_bytes(data[i:i + 32], "big") for i in range(0, 192, 32)]
+    collateral, debt, available, threshold, ltv, health_factor = words
+    if not collateral and not debt:
+        return None
+    return {
+        "collateral_usd": collateral / 10 ** base_decimals,
+        "debt_usd": debt / 10 ** base_decimals,
+        "available_borrows_usd": available / 10 ** base_decimals,
+        "liquidation_threshold": threshold / 10000,
+        "ltv": ltv / 10000,
+        "health_factor": None if health_factor == NO_DEBT_HEALTH_FACTOR else health_factor / 10 ** HEALTH_FACTOR_DECIMALS
+    }
+
+
+class DefiPositionReader:
+    """
+    Lending and LP positions for a batch of wallets, read in one Multicall3
+    eth_call per chain (more only past max_calls sub-calls).
+
+    - lending: chain -> [{"protocol", "pool", "base_decimals"}], Aave-V3-style
+      pools answering getUserAccountData(wallet) in USD.
+    - lp_pools: chain -> [{"protocol", "pair", "token0", "token1"}], Uniswap-V2-
+      style pairs. Each wallet's balanceOf(pair) is turned into its share of
+      the pair's reserves using totalSupply() and getReserves() read in the
+      same call.
+
+    Symbol and decimals of pair tokens go through the shared token metadata
+    cache and are only read the first time a token is seen.
+    """
+
+    def __init__(
+            self,
+            registry,
+            metadata,
+            lending: Dict[str, List[Dict]],
+            lp_pools: Dict[str, List[Dict]],
+            max_calls: int = 500
+    ):
+        self.registry = registry
+        self.metadata = metadata
+        self.lending = lending
+        self.lp_pools = lp_pools
+        self.max_calls = max_calls
+        self.calls = 0
+        self.positions = 0
+
+    @property
+    def chains(self) -> set:
+        return {chain for chain, pools in self.lending.items() if pools} | {
+            chain for chain, pools in self.lp_pools.items() if pools
+        }
+
+    def _plan(self, chain: str, wallets: List[str]) -> List:
+        lending = self.lending.get(chain, [])
+        pools = self.lp_pools.get(chain, [])
+        tokens = list(dict.fromkeys(pool[side].lower() for pool in pools for side in ("token0", "token1")))
+
+        plan = []
+        for address in self.metadata.missing(chain, tokens):
+            plan.append(("symbol", address, (address, SYMBOL_SELECTOR)))
+            plan.append(("decimals", address, (address, DECIMALS_SELECTOR)))
+        for pool in pools:
+            plan.append(("supply", pool, (pool["pair"], TOTAL_SUPPLY_SELECTOR)))
+            plan.append(("reserves", pool, (pool["pair"], GET_RESERVES_SELECTOR)))
+        for wallet in wallets:
+            for pool in pools:
+                plan.append(("lp", (wallet, pool), (pool["pair"], balance_of_call(wallet))))
+            for market in lending:
+                call = encode_call(GET_USER_ACCOUNT_DATA_SELECTOR, ["address"], [wallet])
+                plan.append(("lending", (wallet, market), (market["pool"], call)))
+        return plan
+
+    async def read(self, chain: str, wallets: List[str]) -> Dict[str, List[Dict]]:
+        """
+        Open positions per wallet, unpriced:
+        {"kind": "lending", "protocol", "pool", "collateral_usd", "debt_usd", ...}
+        or {"kind": "lp", "protocol", "pool", "share", "underlying": [{"address", "symbol", "amount"}]}.
+        """
+        positions: Dict[str, List[Dict]] = {wallet: [] for wallet in wallets}
+        plan = self._plan(chain, wallets)
+        if not plan:
+            return positions
+
+        web3 = await self.registry.get(chain)
+        results = await aggregate3(web3, [call for _, _, call in plan], max_calls=self.max_calls)
+        self.calls += 1
+
+        symbols, supplies, reserves = {}, {}, {}
+        for (kind, key, _), (ok, data) in zip(plan, results):
+            if kind == "symbol" and ok:
+                symbols[key] = decode_symbol(data)
+            elif kind == "decimals" and ok:
+                decimals = decode_uint(data)
+                if decimals is not None:
+                    self.metadata.set(chain, key, symbols.get(key) or key[:10], decimals)
+            elif kind == "supply" and ok:
+                supplies[key["pair"]] = decode_uint(data)
+            elif kind == "reserves" and ok:
+                reserves[key["pair"]] = decode_reserves(data)
+
+        for (kind, key, _), (ok, data) in zip(plan, results):
+            if not ok:
+                continue
+            if kind == "lending":
+                wallet, market = key
+                account = decode_account_data(data, market.get("base_decimals", 8))
+                if account:
+                    positions[wallet].append({"kind": "lending", "protocol": market["protocol"], "pool": market["pool"], **account})
+            elif kind == "lp":
+                wallet, pool = key
+                position = self._lp_position(chain, pool, decode_uint(data), supplies.get(pool["pair"]), reserves.get(pool["pair"]))
+                if position:
+                    positions[wallet].append(position)
+
+        self.positions += sum(len(p) for p in positions.values())
+        return positions
+
+    def _lp_position(self, chain: str, pool: Dict, balance: Optional[int], supply: Optional[int], reserves) -> Optional[Dict]:
+        if not balance or not supply or not reserves:
+            return None
+
+        share = balance / supply
+        underlying = []
+        for side, reserve in zip(("token0", "token1"), reserves):
+            address = pool[side].lower()
+            metadata = self.metadata.get(chain, address)
+            if metadata is None:
+                return None
+            underlying.append({
+                "address": address,
+                "symbol": metadata["symbol"],
+                "amount": share * reserve / 10 ** metadata["decimals"]
+            })
+
+        return {"kind": "lp", "protocol": pool["protocol"], "pool": pool["pair"], "share": share, "underlying": underlying}
+
+    def stats(self) -> Dict:
+        return {"multicalls": self.calls, "positions": self.positions}
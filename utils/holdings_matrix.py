@@ -0,0 +1,244 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.defi_positions import liquidation_risk
+from utils.risk_engine import calculate_risk_score
+
+
+def _grow(array: np.ndarray, size: int) -> np.ndarray:
+    if size <= len(array):
+        return array
+    grown = np.zeros(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class HoldingsMatrix:
+    """
+    Sparse portfolios × price-id holdings built from the latest scanned
+    balances, stored as coordinate arrays with one entry per merged asset.
+
+    revalue() reprices every portfolio from the current price vector in a few
+    array operations: total value, asset weights, HHI, average 24h move and
+    the same risk score calculate_risk_score() gives for those assets,
+    including its floor from lending positions' liquidation risk (health
+    factors only change on a scan, so that floor is fixed at upsert). No RPC
+    is involved, so a market move reaches every portfolio as soon as prices
+    refresh rather than at each one's next scan.
+
+    A portfolio's entries are contiguous; rescanning one appends its new
+    entries and zeroes the old ones, which are compacted away once they
+    outnumber the live ones.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.users: List[Optional[str]] = []
+        self._row_of: Dict[str, int] = {}
+        self._free_rows: List[int] = []
+        self.tokens: List[str] = []
+        self._col_of: Dict[str, int] = {}
+        self.prices = np.zeros(0)
+        self.changes = np.zeros(0)
+
+        self._rows = np.zeros(capacity, dtype=np.int64)
+        self._cols = np.zeros(capacity, dtype=np.int64)
+        self._balances = np.zeros(capacity)
+        self._live = np.zeros(capacity)
+        self._size = 0
+        self._dead = 0
+        self._spans: Dict[str, Tuple[int, int]] = {}
+        self._assets: Dict[str, Tuple[List[Dict], List[str]]] = {}
+
+        self._counts = np.zeros(0)
+        self._chain_scores = np.zeros(0)
+        self._liquidation = np.zeros(0)
+        self.total_value = np.zeros(0)
+        self.hhi = np.zeros(0)
+        self.volatility = np.zeros(0)
+        self.risk_score = np.zeros(0)
+        self.revaluations = 0
+        self.last_duration = 0.0
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._row_of
+
+    def _column(self, price_id: str, price: float, change: float) -> int:
+        col = self._col_of.get(price_id)
+        if col is None:
+            col = len(self.tokens)
+            self._col_of[price_id] = col
+            self.tokens.append(price_id)
+            self.prices = _grow(self.prices, col + 1)
+            self.changes = _grow(self.changes, col + 1)
+            self.prices[col] = price
+            self.changes[col] = change
+        return col
+
+    def _row(self, user_id: str) -> int:
+        row = self._row_of.get(user_id)
+        if row is not None:
+            return row
+
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self.users[row] = user_id
+        else:
+            row = len(self.users)
+            self.users.append(user_id)
+            for name in ("_counts", "_chain_scores", "_liquidation", "total_value", "hhi", "volatility", "risk_score"):
+                setattr(self, name, _grow(getattr(self, name), row + 1))
+        self._row_of[user_id] = row
+        return row
+
+    def _release(self, user_id: str):
+        span = self._spans.pop(user_id, None)
+        if span is None:
+            return
+        start, end = span
+        self._balances[start:end] = 0.0
+        self._live[start:end] = 0.0
+        self._dead += end - start
+
+    def upsert(self, user_id: str, assets: List[Dict], price_ids: List[str], risk_score: Optional[float] = None):
+        """
+        Replace user_id's holdings with a freshly scanned, merged asset list.
+        risk_score defaults to calculate_risk_score() of those assets.
+        """
+        self._release(user_id)
+        row = self._row(user_id)
+
+        start = self._size
+        end = start + len(assets)
+        if end > len(self._rows):
+            for name in ("_rows", "_cols", "_balances", "_live"):
+                setattr(self, name, _grow(getattr(self, name), end))
+
+        for i, (asset, price_id) in enumerate(zip(assets, price_ids), start):
+            self._rows[i] = row
+            self._cols[i] = self._column(price_id, asset["price"], asset.get("change_24h", 0.0))
+            self._balances[i] = asset["balance"]
+            self._live[i] = 1.0
+
+        self._size = end
+        self._spans[user_id] = (start, end)
+        self._assets[user_id] = (assets, price_ids)
+
+        unique_chains = len({a["chain"] for a in assets})
+        self._counts[row] = len(assets)
+        self._chain_scores[row] = 1.0 if unique_chains == 1 else max(0.0, 1.0 - unique_chains / 5.0)
+        self._liquidation[row] = max((liquidation_risk(a.get("health_factor")) for a in assets), default=0.0)
+        self.total_value[row] = sum(a["value_usd"] for a in assets)
+        self.risk_score[row] = calculate_risk_score(assets) if risk_score is None else risk_score
+
+        if self._dead > 1024 and self._dead > self._size - self._dead:
+            self.compact()
+
+    def remove(self, user_id: str):
+        row = self._row_of.pop(user_id, None)
+        if row is None:
+            return
+        self._release(user_id)
+        self._assets.pop(user_id, None)
+        self.users[row] = None
+        self._counts[row] = 0.0
+        self._liquidation[row] = 0.0
+        self.total_value[row] = 0.0
+        self.risk_score[row] = 0.0
+        self._free_rows.append(row)
+
+    def compact(self):
+        order = sorted(self._spans.items(), key=lambda item: item[1][0])
+        keep = np.concatenate([np.arange(start, end) for _, (start, end) in order]) if order else np.zeros(0, dtype=np.int64)
+
+        size = len(keep)
+        for name in ("_rows", "_cols", "_balances", "_live"):
+            array = getattr(self, name)
+            compacted = np.zeros(max(size, 1024), dtype=array.dtype)
+            compacted[:size] = array[keep]
+            setattr(self, name, compacted)
+
+        offset = 0
+        for user_id, (start, end) in order:
+            self._spans[user_id] = (offset, offset + end - start)
+            offset += end - start
+
+        self._size = size
+        self._dead = 0
+
+    def update_prices(self, prices: Dict[str, Dict]) -> int:
+        """Load {price_id: {"price", "change_24h"}}; returns how many known tokens changed."""
+        changed = 0
+        for price_id, data in prices.items():
+            col = self._col_of.get(price_id)
+            if col is None:
+                continue
+            price, change = data["price"], data.get("change_24h", 0.0)
+            if self.prices[col] != price or self.changes[col] != change:
+                self.prices[col] = price
+                self.changes[col] = change
+                changed += 1
+        return changed
+
+    def revalue(self, risk_threshold: float = 1.1) -> List[str]:
+        """
+        Reprice every portfolio from the current price vector and return the
+        user_ids whose risk score rose to risk_threshold or above.
+        """
+        started = time.perf_counter()
+        n = len(self.users)
+        size = self._size
+        rows = self._rows[:size]
+        cols = self._cols[:size]
+
+        values = self._balances[:size] * self.prices[cols]
+        totals = np.bincount(rows, weights=values, minlength=n)
+        weights = values / np.where(totals > 0, totals, 1.0)[rows]
+        hhi = np.bincount(rows, weights=weights * weights, minlength=n)
+        moves = np.bincount(rows, weights=np.abs(self.changes[cols]) * self._live[:size], minlength=n)
+        volatility = moves / np.maximum(self._counts[:n], 1.0)
+
+        risk = 0.35 * hhi + 0.45 * np.minimum(volatility / 20.0, 1.0) + 0.20 * self._chain_scores[:n]
+        risk = np.maximum(np.where(totals > 0, np.minimum(risk, 1.0), 0.0), self._liquidation[:n])
+
+        crossed = np.flatnonzero((risk >= risk_threshold) & (self.risk_score[:n] < risk_threshold))
+
+        self.total_value[:n] = totals
+        self.hhi[:n] = hhi
+        self.volatility[:n] = volatility
+        self.risk_score[:n] = risk
+        self.revaluations += 1
+        self.last_duration = time.perf_counter() - started
+
+        return [self.users[row] for row in crossed if self.users[row] is not None]
+
+    def snapshot(self, user_id: str) -> Tuple[List[Dict], float, float]:
+        """The portfolio's last scanned assets at current prices, with its total value and risk score."""
+        assets, price_ids = self._assets[user_id]
+        repriced = []
+        for asset, price_id in zip(assets, price_ids):
+            col = self._col_of[price_id]
+            price = float(self.prices[col])
+            repriced.append({
+                **asset,
+                "price": price,
+                "value_usd": asset["balance"] * price,
+                "change_24h": float(self.changes[col])
+            })
+
+        row = self._row_of[user_id]
+        return repriced, float(self.total_value[row]), float(self.risk_score[row])
+
+    def stats(self) -> Dict:
+        return {
+            "portfolios": len(self),
+            "tokens": len(self.tokens),
+            "entries": self._size - self._dead,
+            "dead_entries": self._dead,
+            "revaluations": self.revaluations,
+            "last_revalue_ms": self.last_duration * 1000
+        }
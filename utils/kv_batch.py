@@ -0,0 +1,39 @@
+from typing import Any, Dict, List, Optional
+
+from uagents.storage import KeyValueStore
+
+# The single-save path writes KeyValueStore's private _data dict and calls its
+# _save(), as laid out in uagents 0.22.x (pinned in requirements.txt). A bump
+# that reshapes them falls back to the public set()/remove() automatically;
+# tests/test_kv_batch.py covers both paths, so re-run it when upgrading.
+
+
+def _single_save(storage) -> bool:
+    # Only uagents' own file-backed store, and only while its internals still look the way we expect
+    return (
+            isinstance(storage, KeyValueStore) and
+            isinstance(getattr(storage, "_data", None), dict) and
+            callable(getattr(storage, "_save", None))
+    )
+
+
+def write_many(storage, updates: Dict[str, Any], removals: Optional[List[str]] = None):
+    """
+    Write (and remove) many keys of agent storage together.
+
+    KeyValueStore rewrites its whole JSON file on every set(), so for that
+    store the batch goes into its dict and is saved once. Any other storage,
+    or a KeyValueStore whose internals changed shape, gets the public
+    set()/remove() calls one key at a time.
+    """
+    if _single_save(storage):
+        storage._data.update(updates)
+        for key in removals or []:
+            storage._data.pop(key, None)
+        storage._save()
+        return
+
+    for key, value in updates.items():
+        storage.set(key, value)
+    for key in removals or []:
+        storage.remove(key)
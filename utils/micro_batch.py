@@ -0,0 +1,74 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class MicroBatcher:
+    """
+    Collects items for up to `window` seconds or `max_items`, whichever comes
+    first, and hands them to flush(items) together.
+
+    add() never waits, so a handler that queues an item returns at once and
+    the next message can join the same batch. Each flush runs as its own
+    task; drain() flushes what is pending and waits for running flushes.
+    A window of 0 flushes every item on its own.
+    """
+
+    def __init__(self, flush: Callable[[List[Any]], Awaitable[None]], window: float = 0.005, max_items: int = 256):
+        self.flush = flush
+        self.window = window
+        self.max_items = max(1, max_items)
+        self._pending: List[Any] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.batches = 0
+        self.items = 0
+        self.largest = 0
+        self.failed = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, item: Any):
+        self._pending.append(item)
+        if len(self._pending) >= self.max_items or self.window <= 0:
+            self._flush_pending()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush_pending)
+
+    def _flush_pending(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        items, self._pending = self._pending, []
+        self.batches += 1
+        self.items += len(items)
+        self.largest = max(self.largest, len(items))
+
+        task = asyncio.create_task(self._run(items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, items: List[Any]):
+        try:
+            await self.flush(items)
+        except Exception as e:
+            self.failed += len(items)
+            print(f"⚠️ Batch of {len(items)} failed: {str(e)[:100]}")
+
+    async def drain(self):
+        self._flush_pending()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": self.items / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest,
+            "failed": self.failed
+        }
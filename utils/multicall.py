@@ -0,0 +1,111 @@
+from typing import Dict, List, Optional, Tuple
+from eth_abi import decode, encode
+from web3 import AsyncWeb3
+
+# Same deterministic deployment on every supported EVM chain
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+AGGREGATE3_SELECTOR = bytes.fromhex("82ad56cb")
+BALANCE_OF_SELECTOR = bytes.fromhex("70a08231")
+DECIMALS_SELECTOR = bytes.fromhex("313ce567")
+SYMBOL_SELECTOR = bytes.fromhex("95d89b41")
+
+
+def encode_call(selector: bytes, types: Optional[List[str]] = None, args: Optional[List] = None) -> bytes:
+    if not types:
+        return selector
+    return selector + encode(types, args)
+
+
+def balance_of_call(wallet: str) -> bytes:
+    return encode_call(BALANCE_OF_SELECTOR, ["address"], [wallet])
+
+
+def encode_aggregate3(calls: List[Tuple[str, bytes]]) -> bytes:
+    return AGGREGATE3_SELECTOR + encode(
+        ["(address,bool,bytes)[]"],
+        [[(target, True, call_data) for target, call_data in calls]]
+    )
+
+
+def decode_aggregate3(data: bytes) -> List[Tuple[bool, bytes]]:
+    (results,) = decode(["(bool,bytes)[]"], data)
+    return [(success, return_data) for success, return_data in results]
+
+
+def decode_uint(data: bytes) -> Optional[int]:
+    if len(data) < 32:
+        return None
+    return int.from_bytes(data[:32], "big")
+
+
+def decode_symbol(data: bytes) -> Optional[str]:
+    # Older tokens (MKR, SAI) return bytes32 instead of string
+    if len(data) == 32:
+        return data.rstrip(b"\x00").decode("utf-8", errors="ignore") or None
+    try:
+        (symbol,) = decode(["string"], data)
+        return symbol or None
+    except Exception:
+        return None
+
+
+async def aggregate3(
+        web3: AsyncWeb3,
+        calls: List[Tuple[str, bytes]],
+        max_calls: int = 500
+) -> List[Tuple[bool, bytes]]:
+    """
+    Execute (target, call_data) pairs through Multicall3.aggregate3.
+
+    Every sub-call allows failure, so a reverting token only fails its own
+    slot. Calls are sent as one eth_call unless they exceed max_calls, which
+    keeps very large scans under providers' eth_call gas caps.
+    """
+    results: List[Tuple[bool, bytes]] = []
+
+    for start in range(0, len(calls), max_calls):
+        chunk = calls[start:start + max_calls]
+        raw = await web3.eth.call({
+            "to": MULTICALL3_ADDRESS,
+            "data": "0x" + encode_aggregate3(chunk).hex()
+        })
+        results.extend(decode_aggregate3(bytes(raw)))
+
+    return results
+
+
+class TokenMetadataCache:
+    """Permanent (chain, token) -> {"symbol", "decimals"} cache, persisted through agent storage."""
+
+    STORAGE_KEY = "token_metadata"
+
+    def __init__(self):
+        self._data: Dict[str, Dict] = {}
+        self._loaded = False
+        self._dirty = False
+
+    @staticmethod
+    def _key(chain: str, address: str) -> str:
+        return f"{chain}:{address.lower()}"
+
+    def load(self, storage):
+        if self._loaded:
+            return
+        self._data.update(storage.get(self.STORAGE_KEY) or {})
+        self._loaded = True
+
+    def save(self, storage):
+        if self._dirty:
+            storage.set(self.STORAGE_KEY, self._data)
+            self._dirty = False
+
+    def get(self, chain: str, address: str) -> Optional[Dict]:
+        return self._data.get(self._key(chain, address))
+
+    def set(self, chain: str, address: str, symbol: str, decimals: int):
+        self._data[self._key(chain, address)] = {"symbol": symbol, "decimals": decimals}
+        self._dirty = True
+
+    def missing(self, chain: str, addresses: List[str]) -> List[str]:
+        return [a for a in addresses if self._key(chain, a) not in self._data]
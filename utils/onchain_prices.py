@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from eth_utils import keccak
+
+from utils.multicall import DECIMALS_SELECTOR, aggregate3, decode_uint, encode_call
+
+LATEST_ROUND_DATA_SELECTOR = bytes.fromhex("feaf968c")
+GET_RESERVES_SELECTOR = bytes.fromhex("0902f1ac")
+GET_PAIR_SELECTOR = bytes.fromhex("e6a43905")
+
+logger = logging.getLogger(__name__)
+
+HISTORY_SAMPLE_INTERVAL = 600
+HISTORY_WINDOW = 25 * 3600
+
+
+def v2_pair_address(factory: str, init_code_hash: str, token_a: str, token_b: str) -> str:
+    """CREATE2 address of a Uniswap-V2-style pair, without asking the factory."""
+    token0, token1 = sorted((token_a.lower(), token_b.lower()))
+    salt = keccak(bytes.fromhex(token0[2:]) + bytes.fromhex(token1[2:]))
+    digest = keccak(b"\xff" + bytes.fromhex(factory[2:]) + salt + bytes.fromhex(init_code_hash[2:]))
+    return "0x" + digest[12:].hex()
+
+
+def decode_round_answer(data: bytes, decimals: int, max_age: float, now: float) -> Optional[float]:
+    # latestRoundData() -> (roundId, answer, startedAt, updatedAt, answeredInRound)
+    if len(data) < 160:
+        return None
+    answer = int.from_bytes(data[32:64], "big", signed=True)
+    updated_at = int.from_bytes(data[96:128], "big")
+    if answer <= 0 or now - updated_at > max_age:
+        return None
+    return answer / 10 ** decimals
+
+
+def decode_reserves(data: bytes) -> Optional[Tuple[int, int]]:
+    if len(data) < 96:
+        return None
+    return int.from_bytes(data[:32], "big"), int.from_bytes(data[32:64], "big")
+
+
+class OnChainPricer:
+    """
+    USD prices read from chain state, one Multicall3 eth_call per chain.
+
+    - feeds: price_id -> (chain, Chainlink USD aggregator), for majors.
+    - dexes: chain -> {"factory", "wrapped_native", "native_feed",
+      "init_code_hash" (optional)}. Any other token on that chain is priced
+      from its Uniswap-V2-style pair with the wrapped native token, valued
+      through the chain's native Chainlink feed read in the same call. Pair
+      addresses come from CREATE2 when the init code hash is configured,
+      otherwise from one factory.getPair() round that is cached for good.
+      Pairs whose native side is worth less than min_liquidity_usd are
+      ignored.
+
+    No 24h change is available on chain, so it is derived from prices this
+    pricer has seen about a day earlier (0 until it has that history).
+    """
+
+    def __init__(
+            self,
+            registry,
+            feeds: Dict[str, Tuple[str, str]],
+            dexes: Dict[str, Dict],
+            feed_decimals: int = 8,
+            max_feed_age: float = 90000.0,
+            min_liquidity_usd: float = 10000.0,
+            max_calls: int = 500
+    ):
+        self.registry = registry
+        self.feeds = feeds
+        self.dexes = dexes
+        self.feed_decimals = feed_decimals
+        self.max_feed_age = max_feed_age
+        self.min_liquidity_usd = min_liquidity_usd
+        self.max_calls = max_calls
+        self._history: Dict[str, deque] = {}
+        self._pairs: Dict[Tuple[str, str], Optional[str]] = {}
+        self.calls = 0
+        self.priced = 0
+        self.unpriced = 0
+
+    def change_24h(self, price_id: str, price: float, now: float) -> float:
+        history = self._history.setdefault(price_id, deque())
+        while history and now - history[0][0] > HISTORY_WINDOW:
+            history.popleft()
+        if not history or now - history[-1][0] >= HISTORY_SAMPLE_INTERVAL:
+            history.append((now, price))
+
+        oldest_time, oldest_price = history[0]
+        if now - oldest_time < 23 * 3600 or oldest_price <= 0:
+            return 0.0
+        return (price / oldest_price - 1) * 100
+
+    def _plan(self, price_ids: List[str], tokens: Dict[str, Tuple[str, str, Optional[int]]]) -> Dict[str, List]:
+        """Per chain: the calls to make and what each one prices."""
+        plans: Dict[str, List] = {}
+        for price_id in price_ids:
+            if price_id in self.feeds:
+                chain, feed = self.feeds[price_id]
+                plans.setdefault(chain, []).append(("feed", price_id, feed))
+                continue
+
+            target = tokens.get(price_id)
+            if target is None or target[0] not in self.dexes:
+                continue
+            chain, address, decimals = target
+            dex = self.dexes[chain]
+            if address.lower() == dex["wrapped_native"].lower():
+                plans.setdefault(chain, []).append(("feed", price_id, dex["native_feed"]))
+                continue
+            if dex.get("init_code_hash"):
+                self._pairs[(chain, address.lower())] = v2_pair_address(
+                    dex["factory"], dex["init_code_hash"], address, dex["wrapped_native"]
+                )
+            plans.setdefault(chain, []).append(("pair", price_id, (address.lower(), decimals)))
+
+        for chain, plan in plans.items():
+            if any(kind == "pair" for kind, _, _ in plan):
+                plan.append(("native", None, self.dexes[chain]["native_feed"]))
+        return plans
+
+    async def _resolve_pairs(self, web3, chain: str, addresses: List[str]):
+        dex = self.dexes[chain]
+        results = await aggregate3(web3, [
+            (dex["factory"], encode_call(GET_PAIR_SELECTOR, ["address", "address"], [address, dex["wrapped_native"]]))
+            for address in addresses
+        ], max_calls=self.max_calls)
+        self.calls += 1
+
+        for address, (ok, data) in zip(addresses, results):
+            pair = "0x" + data[12:32].hex() if ok and len(data) >= 32 else None
+            self._pairs[(chain, address)] = pair if pair and int(pair, 16) else None
+
+    async def _price_chain(self, chain: str, plan: List, now: float) -> Dict[str, float]:
+        web3 = await self.registry.get(chain)
+
+        unresolved = [target[0] for kind, _, target in plan if kind == "pair" and (chain, target[0]) not in self._pairs]
+        if unresolved:
+            await self._resolve_pairs(web3, chain, unresolved)
+        plan = [entry for entry in plan if entry[0] != "pair" or self._pairs.get((chain, entry[2][0]))]
+        if all(kind == "native" for kind, _, _ in plan):
+            return {}
+
+        calls = []
+        for kind, _, target in plan:
+            if kind == "pair":
+                address, decimals = target
+                calls.append((self._pairs[(chain, address)], GET_RESERVES_SELECTOR))
+                if decimals is None:
+                    calls.append((address, DECIMALS_SELECTOR))
+            else:
+                calls.append((target, LATEST_ROUND_DATA_SELECTOR))
+
+        results = await aggregate3(web3, calls, max_calls=self.max_calls)
+        self.calls += 1
+
+        native_usd = None
+        if plan[-1][0] == "native":
+            ok, data = results[-1]
+            native_usd = decode_round_answer(data, self.feed_decimals, self.max_feed_age, now) if ok else None
+
+        prices = {}
+        results = iter(results)
+        wrapped_native = self.dexes.get(chain, {}).get("wrapped_native", "").lower()
+        for kind, price_id, target in plan:
+            if kind == "pair":
+                address, decimals = target
+                reserves_ok, reserves_data = next(results)
+                if decimals is None:
+                    decimals_ok, decimals_data = next(results)
+                    decimals = decode_uint(decimals_data) if decimals_ok else None
+                reserves = decode_reserves(reserves_data) if reserves_ok else None
+                if native_usd is None or decimals is None or not reserves:
+                    continue
+
+                token_is_0 = address < wrapped_native
+                token_reserve, native_reserve = reserves if token_is_0 else reserves[::-1]
+                native_value = native_reserve / 1e18 * native_usd
+                if token_reserve == 0 or native_value < self.min_liquidity_usd:
+                    continue
+                prices[price_id] = native_value / (token_reserve / 10 ** decimals)
+            else:
+                ok, data = next(results)
+                if kind == "feed" and ok:
+                    price = decode_round_answer(data, self.feed_decimals, self.max_feed_age, now)
+                    if price is not None:
+                        prices[price_id] = price
+
+        return prices
+
+    async def fetch(
+            self,
+            price_ids: List[str],
+            tokens: Optional[Dict[str, Tuple[str, str, Optional[int]]]] = None
+    ) -> Dict[str, Dict]:
+        """
+        Price whatever it can of price_ids; tokens maps ids without a feed to
+        (chain, address, decimals or None). Ids it cannot price are left out,
+        matching the CoinGecko fetchers.
+        """
+        now = time.time()
+        plans = self._plan(price_ids, tokens or {})
+
+        prices = {}
+        results = await asyncio.gather(
+            *(self._price_chain(chain, plan, now) for chain, plan in plans.items()), return_exceptions=True
+        )
+        for chain, result in zip(plans, results):
+            if isinstance(result, Exception):
+                logger.warning(f"⚠️ On-chain price read failed on {chain}: {str(result)[:100]}")
+                continue
+            prices.update(result)
+
+        self.priced += len(prices)
+        self.unpriced += len(price_ids) - len(prices)
+        return {
+            price_id: {"price": price, "change_24h": self.change_24h(price_id, price, now), "success": True, "source": "onchain"}
+            for price_id, price in prices.items()
+        }
+
+    def stats(self) -> Dict:
+        return {"multicalls": self.calls, "priced": self.priced, "unpriced": self.unpriced}
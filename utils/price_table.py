@@ -0,0 +1,245 @@
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+MAGIC = 0x4447505249434531  # "DGPRICE1"
+ID_BYTES = 96
+HEADER_WORDS = 4  # magic, capacity, seq, count
+MAGIC_WORD, CAPACITY_WORD, SEQ_WORD, COUNT_WORD = range(HEADER_WORDS)
+PRICE, CHANGE, UPDATED_AT = range(3)
+READ_RETRIES = 100
+
+
+def _segment_size(capacity: int) -> int:
+    return HEADER_WORDS * 8 + capacity * (3 * 8 + ID_BYTES)
+
+
+class SharedPriceTable:
+    """
+    Prices shared by every monitor process on a box through one
+    multiprocessing.shared_memory segment.
+
+    The segment holds a header, a fixed array of (price, change_24h,
+    updated_at) rows and the price id of each row. Ids are only ever
+    appended, so readers keep a local id -> row map and extend it when the
+    count grows, under the same seqlock check as the rows.
+
+    Exactly one process opens the table as writer and publishes into it;
+    the rest read it in place. Consistency is a seqlock: the writer makes
+    the sequence number odd, writes rows and ids, then makes it even again.
+    A reader copies the rows it wants and keeps the copy only if the
+    sequence was even and unchanged around it, so a batch always comes from
+    one coherent publish. A reader that keeps losing the race (or finds the
+    writer died mid-publish) gets nothing back and falls back to its own
+    fetch.
+
+    The segment outlives the writer, so a restarted writer picks up the
+    same table; unlink() removes it.
+    """
+
+    def __init__(self, name: str, capacity: int = 8192, writer: bool = False):
+        self.name = name
+        self.capacity = capacity
+        self.writer = writer
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._header: Optional[np.ndarray] = None
+        self._rows: Optional[np.ndarray] = None
+        self._ids: Optional[np.ndarray] = None
+        self._slot_of: Dict[str, int] = {}
+        self.publishes = 0
+        self.dropped = 0
+        self.reads = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.retries = 0
+        self.contended = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self._shm is not None
+
+    def __len__(self) -> int:
+        return int(self._header[COUNT_WORD]) if self.is_open else 0
+
+    def open(self) -> bool:
+        """Map the segment, creating it as writer; False if a reader finds no table yet."""
+        if self.is_open:
+            return True
+
+        try:
+            shm = shared_memory.SharedMemory(name=self.name)
+            created = False
+        except FileNotFoundError:
+            if not self.writer:
+                return False
+            shm = shared_memory.SharedMemory(name=self.name, create=True, size=_segment_size(self.capacity))
+            created = True
+        # Python < 3.13 tracks attached segments too and unlinks them when any process exits
+        resource_tracker.unregister(shm._name, "shared_memory")
+
+        header = np.ndarray((HEADER_WORDS,), dtype=np.uint64, buffer=shm.buf)
+        if created:
+            header[CAPACITY_WORD] = self.capacity
+            header[SEQ_WORD] = 0
+            header[COUNT_WORD] = 0
+            header[MAGIC_WORD] = MAGIC
+        elif header[MAGIC_WORD] != MAGIC:
+            shm.close()
+            return False
+
+        capacity = int(header[CAPACITY_WORD])
+        offset = HEADER_WORDS * 8
+        self._rows = np.ndarray((capacity, 3), dtype=np.float64, buffer=shm.buf, offset=offset)
+        self._ids = np.ndarray((capacity,), dtype=f"S{ID_BYTES}", buffer=shm.buf, offset=offset + capacity * 24)
+        self._header = header
+        self._shm = shm
+        self.capacity = capacity
+        self._slot_of = {}
+
+        if self.writer:
+            # Only the writer publishes, so it can take the ids as they are
+            self._slot_of.update(self._new_ids())
+        if self.writer and header[SEQ_WORD] % 2:
+            # The previous writer died mid-publish; its half-written rows are overwritten on the next one
+            header[SEQ_WORD] += 1
+        return True
+
+    def _new_ids(self) -> Dict[str, int]:
+        """Ids appended since the local map was last extended; only trustworthy once a seq check passes."""
+        count = int(self._header[COUNT_WORD])
+        return {self._ids[slot].decode(): slot for slot in range(len(self._slot_of), min(count, self.capacity))}
+
+    def _consistent(self, copy: Callable[[Dict[str, int]], Any]) -> Optional[Any]:
+        """
+        Run copy(new_ids) inside the seqlock and return its result, or None
+        if every retry overlapped a publish. new_ids join the local id map
+        only after the sequence check passes, so ids torn by a concurrent
+        publish are never kept.
+        """
+        header = self._header
+        for _ in range(READ_RETRIES):
+            seq = int(header[SEQ_WORD])
+            if seq % 2:
+                self.retries += 1
+                time.sleep(0)
+                continue
+
+            new_ids = self._new_ids()
+            result = copy(new_ids)
+            if int(header[SEQ_WORD]) == seq:
+                self._slot_of.update(new_ids)
+                return result
+            self.retries += 1
+
+        self.contended += 1
+        return None
+
+    def ids(self) -> List[str]:
+        """Every id in the table; only those confirmed so far if the writer keeps publishing."""
+        if not self.open():
+            return []
+        self._consistent(lambda new_ids: None)
+        return list(self._slot_of)
+
+    def publish(self, prices: Dict[str, Dict], now: Optional[float] = None) -> int:
+        """Write {price_id: {"price", "change_24h"}} as one update; returns how many rows were written."""
+        if not self.writer or not self.open():
+            return 0
+
+        now = time.time() if now is None else now
+        header = self._header
+        count = int(header[COUNT_WORD])
+        written = 0
+
+        header[SEQ_WORD] += 1
+        try:
+            for price_id, data in prices.items():
+                if not data or not data.get("price"):
+                    continue
+                slot = self._slot_of.get(price_id)
+                if slot is None:
+                    encoded = price_id.encode()
+                    if count >= self.capacity or len(encoded) > ID_BYTES:
+                        self.dropped += 1
+                        continue
+                    slot = count
+                    self._ids[slot] = encoded
+                    self._slot_of[price_id] = slot
+                    count += 1
+                self._rows[slot] = (data["price"], data.get("change_24h") or 0.0, now)
+                written += 1
+            header[COUNT_WORD] = count
+        finally:
+            header[SEQ_WORD] += 1
+
+        self.publishes += 1
+        return written
+
+    def read(self, price_ids: List[str], max_age: Optional[float] = None) -> Dict[str, Dict]:
+        """
+        Prices for whichever of price_ids the table holds, from one coherent
+        publish, leaving out rows older than max_age seconds.
+        """
+        if not price_ids or not self.open():
+            return {}
+
+        self.reads += 1
+
+        def copy(new_ids: Dict[str, int]):
+            found = []
+            for price_id in price_ids:
+                slot = self._slot_of.get(price_id, new_ids.get(price_id))
+                if slot is not None:
+                    found.append((price_id, slot))
+            return found, self._rows[[slot for _, slot in found]]
+
+        snapshot = self._consistent(copy)
+        if snapshot is None:
+            return {}
+        found, rows = snapshot
+
+        now = time.time()
+        prices = {}
+        for (price_id, _), (price, change, updated_at) in zip(found, rows.tolist()):
+            if max_age is not None and now - updated_at > max_age:
+                self.stale += 1
+                continue
+            prices[price_id] = {"price": price, "change_24h": change, "success": True, "source": "shared"}
+
+        self.hits += len(prices)
+        self.misses += len(price_ids) - len(prices)
+        return prices
+
+    def close(self):
+        if self._shm is None:
+            return
+        self._header = self._rows = self._ids = None
+        self._shm.close()
+        self._shm = None
+
+    def unlink(self):
+        if self.open():
+            # unlink() unregisters from the resource tracker, which open() already did
+            resource_tracker.register(self._shm._name, "shared_memory")
+            self._shm.unlink()
+        self.close()
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "role": "writer" if self.writer else "reader",
+            "open": self.is_open,
+            "entries": len(self),
+            "capacity": self.capacity,
+            "publishes": self.publishes,
+            "dropped": self.dropped,
+            "reads": self.reads,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "retries": self.retries,
+            "contended": self.contended
+        }
@@ -0,0 +1,195 @@
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Whose work an RPC request is for; requests from different owners are queued fairly
+rate_limit_owner: contextvars.ContextVar[str] = contextvars.ContextVar("rate_limit_owner", default="")
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc.lower() or url
+
+
+class TokenBucket:
+    """Refills at `rate` tokens per second up to `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_take(self, now: Optional[float] = None) -> bool:
+        now = now if now is not None else time.monotonic()
+        if now < self.paused_until:
+            return False
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def time_until_token(self, now: Optional[float] = None) -> float:
+        now = now if now is not None else time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def pause(self, seconds: float):
+        """Provider said slow down: empty the bucket and hand out nothing for `seconds`."""
+        now = time.monotonic()
+        self.tokens = 0.0
+        self.updated = max(self.updated, now + seconds)
+        self.paused_until = max(self.paused_until, now + seconds)
+
+
+class HostLimiter:
+    """
+    Token bucket for one RPC host with a round-robin queue per owner.
+
+    Requests take a token immediately when nobody is waiting. Otherwise they
+    join their owner's queue and a single dispatcher hands out tokens as they
+    refill, one owner at a time, so a portfolio with hundreds of wallets
+    cannot starve a small one queued behind it.
+    """
+
+    def __init__(self, host: str, rate: float, burst: float):
+        self.host = host
+        self.bucket = TokenBucket(rate, burst)
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.acquired = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.throttled = 0
+
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    async def acquire(self, owner: str = ""):
+        if not self._queues and self.bucket.try_take():
+            self.acquired += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(owner, deque()).append((future, time.monotonic()))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    def _next_waiter(self) -> Optional[Tuple[asyncio.Future, float]]:
+        while self._queues:
+            owner, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(owner)
+            else:
+                del self._queues[owner]
+            if not waiter[0].done():
+                return waiter
+        return None
+
+    async def _dispatch(self):
+        while self._queues:
+            delay = self.bucket.time_until_token()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+
+            future, enqueued_at = waiter
+            self.bucket.try_take()
+            wait = time.monotonic() - enqueued_at
+            self.acquired += 1
+            self.waited += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            future.set_result(None)
+
+    def throttle(self, retry_after: float):
+        self.throttled += 1
+        self.bucket.pause(retry_after)
+
+    def stats(self) -> Dict:
+        return {
+            "rate": self.bucket.rate,
+            "burst": self.bucket.burst,
+            "queue_depth": self.queue_depth(),
+            "queued_owners": len(self._queues),
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "avg_wait": self.total_wait / self.waited if self.waited else 0.0,
+            "max_wait": self.max_wait,
+            "throttled": self.throttled
+        }
+
+    async def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+        for queue in self._queues.values():
+            for future, _ in queue:
+                future.cancel()
+        self._queues.clear()
+
+
+class RateLimiter:
+    """
+    HostLimiters keyed by RPC host, created on first use.
+
+    Limits are per host rather than per chain because that is how providers
+    meter us. A rate of 0 disables limiting for that host.
+    """
+
+    def __init__(
+            self,
+            rate: float = 25.0,
+            burst: float = 50.0,
+            host_limits: Optional[Dict[str, Tuple[float, float]]] = None
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.host_limits = {host.lower(): limit for host, limit in (host_limits or {}).items()}
+        self._hosts: Dict[str, HostLimiter] = {}
+
+    def limiter(self, url: str) -> Optional[HostLimiter]:
+        host = host_of(url)
+        if host not in self._hosts:
+            rate, burst = self.host_limits.get(host, (self.rate, self.burst))
+            if rate <= 0:
+                return None
+            self._hosts[host] = HostLimiter(host, rate, burst)
+        return self._hosts[host]
+
+    async def acquire(self, url: str):
+        limiter = self.limiter(url)
+        if limiter is not None:
+            await limiter.acquire(rate_limit_owner.get())
+
+    def throttle(self, url: str, retry_after: Optional[float] = None):
+        limiter = self.limiter(url)
+        if limiter is not None:
+            limiter.throttle(retry_after if retry_after is not None else 1.0)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {host: limiter.stats() for host, limiter in self._hosts.items()}
+
+    async def close(self):
+        await asyncio.gather(*(limiter.close() for limiter in self._hosts.values()))
+        self._hosts = {}
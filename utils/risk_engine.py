@@ -0,0 +1,207 @@
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from utils.defi_positions import liquidation_risk
+
+CONCENTRATION_LEVELS = ("low", "medium", "high", "critical")
+VOLATILITY_LEVELS = ("low", "medium", "high", "extreme")
+ASSET_CLASSES = ("low", "medium", "high", "critical")
+
+# Per-asset quality score by class; the last slot is any other answer from the knowledge base
+ASSET_CLASS_SCORES = np.array([0.0, 0.3, 0.7, 1.0, 0.0])
+OTHER_CLASS = len(ASSET_CLASSES)
+
+# Medium-concentration holdings are only flagged above this share, and medium-risk assets above MEDIUM_ASSET_WEIGHT
+MODERATE_CONCENTRATION = 0.30
+MEDIUM_ASSET_WEIGHT = 0.1
+
+
+def _edges(thresholds: Dict[str, float], levels: Tuple[str, ...]) -> np.ndarray:
+    return np.array([thresholds[level] for level in levels[1:]], dtype=float)
+
+
+def calculate_risk_score(assets: List[Dict]) -> float:
+    if not assets:
+        return 0.0
+
+    # A lending position close to liquidation sets a floor however the rest of the portfolio looks
+    liquidation = max((liquidation_risk(a.get("health_factor")) for a in assets), default=0.0)
+
+    total_value = sum(a["value_usd"] for a in assets)
+    if total_value == 0:
+        return liquidation
+
+    concentration = sum((a["value_usd"] / total_value) ** 2 for a in assets)
+
+    # Volatility risk
+    avg_volatility = sum(abs(a.get("change_24h", 0)) for a in assets) / len(assets)
+    volatility_score = min(avg_volatility / 20, 1)
+
+    unique_chains = len(set(a["chain"] for a in assets))
+    chain_diversity_score = 1.0 if unique_chains == 1 else max(0.0, 1.0 - (unique_chains / 5.0))
+
+    risk_score = (
+            concentration * 0.35 +
+            volatility_score * 0.45 +
+            chain_diversity_score * 0.20
+    )
+
+    return max(min(risk_score, 1.0), liquidation)
+
+
+class RiskEngine:
+    """
+    Concentration, volatility and asset-quality analysis of a portfolio in
+    one pass over columnar arrays, for one portfolio or a batch of them.
+
+    The asset list is turned into value, |24h change| and asset-class
+    columns once; weights, HHI, threshold buckets (np.searchsorted against
+    the knowledge base's thresholds), volatility stats and class scores are
+    array operations on those. Concern strings are only built for the rows
+    that are flagged.
+
+    classify(token) answers a token's risk class; it is asked once per
+    distinct token symbol and cached, since the knowledge base does not
+    change while the agent runs.
+
+    Lending positions (assets with a health_factor) add "liquidation" (the
+    worst position's liquidation risk) and "min_health_factor" to the asset
+    quality analysis, with a concern for each one below
+    health_factor_warning.
+    """
+
+    def __init__(
+            self,
+            classify: Callable[[str], str],
+            concentration_thresholds: Dict[str, float],
+            volatility_thresholds: Dict[str, float],
+            health_factor_warning: float = 1.2
+    ):
+        self.classify = classify
+        self.health_factor_warning = health_factor_warning
+        self._concentration_edges = _edges(concentration_thresholds, CONCENTRATION_LEVELS)
+        self._volatility_edges = _edges(volatility_thresholds, VOLATILITY_LEVELS)
+        self._classes: Dict[str, int] = {}
+
+    def asset_class(self, token: str) -> int:
+        index = self._classes.get(token)
+        if index is None:
+            level = self.classify(token)
+            index = ASSET_CLASSES.index(level) if level in ASSET_CLASSES else OTHER_CLASS
+            self._classes[token] = index
+        return index
+
+    def columns(self, assets: List[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        known = self._classes
+        classes = [known.get(a["token"].lower(), -1) for a in assets]
+        if -1 in classes:
+            classes = [self.asset_class(a["token"].lower()) for a in assets]
+
+        values = np.array([a.get("value_usd", 0.0) for a in assets], dtype=float)
+        changes = np.array([a.get("change_24h") or 0.0 for a in assets], dtype=float)
+        return values, np.abs(changes), np.array(classes, dtype=np.int64)
+
+    def analyze_batch(self, portfolios: List[Tuple[List[Dict], float]]) -> List[Tuple[Dict, Dict, Dict]]:
+        """
+        (concentration, volatility, asset quality) analyses for many
+        (assets, total_value) portfolios at once: their assets share one set
+        of columns, and per-portfolio sums are bincounts over an owner index.
+        """
+        m = len(portfolios)
+        counts = np.array([len(assets) for assets, _ in portfolios], dtype=np.int64)
+        totals = np.array([total_value for _, total_value in portfolios], dtype=float)
+        owners = np.repeat(np.arange(m), counts)
+        assets = [asset for portfolio, _ in portfolios for asset in portfolio]
+        values, changes, classes = self.columns(assets)
+
+        # Concentration: each asset's share of its portfolio's reported total
+        row_totals = totals[owners]
+        priced = row_totals != 0
+        shares = np.divide(values, row_totals, out=np.zeros_like(values), where=priced)
+        hhi = np.bincount(owners, weights=shares * shares, minlength=m)
+        concentration_levels = np.searchsorted(self._concentration_edges, shares, side="right")
+        concentration_flags = priced & (
+                (concentration_levels >= 2) | ((concentration_levels == 1) & (shares > MODERATE_CONCENTRATION))
+        )
+
+        # Volatility
+        volatility_levels = np.searchsorted(self._volatility_edges, changes, side="right")
+        avg_volatility = np.bincount(owners, weights=changes, minlength=m) / np.maximum(counts, 1)
+
+        # Asset quality: medium-risk assets only count above MEDIUM_ASSET_WEIGHT of the assets' own sum
+        asset_totals = np.bincount(owners, weights=values, minlength=m)[owners]
+        medium = (classes == 1) & (asset_totals > 0)
+        medium &= np.divide(values, asset_totals, out=np.zeros_like(values), where=asset_totals > 0) > MEDIUM_ASSET_WEIGHT
+        asset_scores = np.bincount(
+            owners, weights=np.where(classes == 1, 0.0, ASSET_CLASS_SCORES[classes]) + 0.3 * medium, minlength=m
+        )
+
+        concerns = [([], [], []) for _ in range(m)]
+
+        rows = np.flatnonzero(concentration_flags)
+        labels = ("moderate", "high", "CRITICAL")
+        for i, owner, share, level in zip(rows.tolist(), owners[rows].tolist(), shares[rows].tolist(), concentration_levels[rows].tolist()):
+            concerns[owner][0].append(
+                f"{assets[i]['token']} represents {share * 100:.1f}% - {labels[level - 1]} concentration (MeTTa)"
+            )
+
+        rows = np.flatnonzero(volatility_levels >= 2)
+        for i, owner, change, level in zip(rows.tolist(), owners[rows].tolist(), changes[rows].tolist(), volatility_levels[rows].tolist()):
+            if level == 3:
+                concerns[owner][1].append(f"{assets[i]['token']} EXTREME volatility: {change:.1f}% in 24h (MeTTa)")
+            else:
+                concerns[owner][1].append(f"{assets[i]['token']} high volatility: {change:.1f}% in 24h (MeTTa)")
+
+        messages = {
+            3: "{} classified as CRITICAL risk by MeTTa knowledge graph",
+            2: "{} classified as HIGH risk by MeTTa knowledge graph",
+            1: "{} has medium risk classification (MeTTa)"
+        }
+        rows = np.flatnonzero((classes == 2) | (classes == 3) | medium)
+        for i, owner, asset_class in zip(rows.tolist(), owners[rows].tolist(), classes[rows].tolist()):
+            concerns[owner][2].append(messages[asset_class].format(assets[i]["token"]))
+
+        # Lending positions are rare; only they are looked at here
+        lending: Dict[int, List[Dict]] = {}
+        for owner, asset in zip(owners.tolist(), assets):
+            if asset.get("health_factor") is not None:
+                lending.setdefault(owner, []).append(asset)
+
+        results = []
+        for k in range(m):
+            count = int(counts[k])
+            if count and totals[k] != 0:
+                concentration = {"concerns": concerns[k][0], "score": min(float(hhi[k]) * 2.0, 1.0), "hhi": float(hhi[k])}
+            else:
+                concentration = {"concerns": [], "score": 0}
+
+            if count:
+                volatility = {
+                    "concerns": concerns[k][1],
+                    "score": min(float(avg_volatility[k]) / 30, 1.0),
+                    "avg_volatility": float(avg_volatility[k])
+                }
+            else:
+                volatility = {"concerns": [], "score": 0}
+
+            asset_risk = {"concerns": concerns[k][2], "score": min(float(asset_scores[k]) / max(count, 1), 1.0)}
+            if k in lending:
+                self._add_liquidation(asset_risk, lending[k])
+            results.append((concentration, volatility, asset_risk))
+
+        return results
+
+    def _add_liquidation(self, asset_risk: Dict, positions: List[Dict]):
+        asset_risk["liquidation"] = max(liquidation_risk(p["health_factor"]) for p in positions)
+        asset_risk["min_health_factor"] = min(p["health_factor"] for p in positions)
+        for position in positions:
+            if position["health_factor"] < self.health_factor_warning:
+                asset_risk["concerns"].append(
+                    f"{position['token']} health factor {position['health_factor']:.2f} with "
+                    f"${position.get('debt_usd', 0.0):,.0f} debt - liquidation risk"
+                )
+
+    def analyze(self, assets: List[Dict], total_value: float) -> Tuple[Dict, Dict, Dict]:
+        """(concentration, volatility, asset quality) analyses, each {"concerns", "score", ...}."""
+        return self.analyze_batch([(assets, total_value)])[0]
@@ -0,0 +1,450 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from web3 import AsyncWeb3
+from web3.providers.async_base import AsyncJSONBaseProvider
+import aiohttp
+from utils.rate_limit import RateLimiter
+
+# Status codes that mean "this batch is too big", not "this endpoint is unhealthy", when the request is a batch
+BATCH_REJECTED_STATUSES = (400, 413)
+THROTTLED_STATUS = 429
+
+
+class EndpointStats:
+    """
+    Health of one RPC endpoint: EWMA latency and error rate, a rolling p95,
+    and a circuit breaker that opens after consecutive failures and backs
+    off exponentially while the endpoint keeps failing its trial requests.
+    """
+
+    def __init__(
+            self,
+            url: str,
+            default_timeout: float,
+            min_timeout: float = 0.5,
+            alpha: float = 0.2,
+            window: int = 100,
+            failure_threshold: int = 3,
+            cooldown: float = 30.0,
+            max_cooldown: float = 600.0
+    ):
+        self.url = url
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.samples: deque = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.cooldown = cooldown
+        self.open_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < 5:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def timeout(self) -> float:
+        p95 = self.p95()
+        if p95 is None:
+            return self.default_timeout
+        return min(max(p95 * 3, self.min_timeout), self.default_timeout)
+
+    def available(self, now: float) -> bool:
+        return now >= self.open_until
+
+    def score(self) -> float:
+        latency = self.latency_ewma if self.latency_ewma is not None else self.default_timeout / 2
+        return latency * (1 + 4 * self.error_ewma)
+
+    def _observe_latency(self, latency: float):
+        self.samples.append(latency)
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += self.alpha * (latency - self.latency_ewma)
+
+    def record_success(self, latency: float):
+        self.requests += 1
+        self._observe_latency(latency)
+        self.error_ewma *= 1 - self.alpha
+        self.consecutive_failures = 0
+        self.cooldown = self.base_cooldown
+        self.open_until = 0.0
+
+    def record_failure(self, latency: Optional[float] = None):
+        self.requests += 1
+        self.failures += 1
+        if latency is not None:
+            self._observe_latency(latency)
+        self.error_ewma += self.alpha * (1 - self.error_ewma)
+        self.consecutive_failures += 1
+
+        if self.consecutive_failures >= self.failure_threshold:
+            self.open_until = time.monotonic() + self.cooldown
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+
+    def stats(self) -> Dict:
+        return {
+            "url": self.url,
+            "latency_ewma": self.latency_ewma,
+            "p95": self.p95(),
+            "timeout": self.timeout(),
+            "error_rate": self.error_ewma,
+            "circuit_open": not self.available(time.monotonic()),
+            "requests": self.requests,
+            "failures": self.failures
+        }
+
+
+class FailoverProvider(AsyncJSONBaseProvider):
+    """AsyncWeb3 provider that sends every request through ProviderRegistry.post."""
+
+    def __init__(self, registry: "ProviderRegistry", chain: str):
+        self.registry = registry
+        self.chain = chain
+        super().__init__()
+
+    async def make_request(self, method, params) -> Dict:
+        return await self.registry.post(self.chain, self.encode_rpc_request(method, params))
+
+    async def is_connected(self, show_traceback: bool = False) -> bool:
+        try:
+            await self.make_request("eth_chainId", [])
+            return True
+        except Exception:
+            if show_traceback:
+                raise
+            return False
+
+
+class ProviderRegistry:
+    """
+    Long-lived AsyncWeb3 providers, one per chain, built from CHAIN_CONFIG.
+
+    Each chain gets its own aiohttp session with a keep-alive connection pool,
+    so balance calls reuse warm TCP+TLS connections and never block the
+    event loop the way a synchronous Web3.HTTPProvider does.
+
+    A chain may list several endpoints ("rpc" plus "rpcs"). Requests go to the
+    healthiest one with a timeout derived from its observed p95, fail over on
+    errors, skip endpoints whose circuit is open, and (when hedging is on)
+    send a duplicate to the runner-up once the first is slower than its p95.
+    With a RateLimiter, every attempt first takes a token for its host, and
+    a 429 pauses that host for its Retry-After.
+    """
+
+    def __init__(
+            self,
+            chain_config: Dict[str, Dict],
+            pool_size: int = 10,
+            timeout: float = 5.0,
+            keepalive_timeout: float = 60.0,
+            max_batch_size: int = 100,
+            hedge: bool = True,
+            failure_threshold: int = 3,
+            circuit_cooldown: float = 30.0,
+            rate_limiter: Optional[RateLimiter] = None
+    ):
+        self.chain_config = chain_config
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.hedge = hedge
+        self.failure_threshold = failure_threshold
+        self.circuit_cooldown = circuit_cooldown
+        self.rate_limiter = rate_limiter
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._providers: Dict[str, AsyncWeb3] = {}
+        self._endpoints: Dict[str, List[EndpointStats]] = {}
+        self._lock = asyncio.Lock()
+        self.max_batch_size = max_batch_size
+        self._batch_limits: Dict[str, int] = {}
+        self._batch_ceilings: Dict[str, int] = {}
+        self.hedged_requests = 0
+
+    def rpc_urls(self, chain: str) -> List[str]:
+        if chain not in self.chain_config:
+            raise ValueError(f"Unsupported chain: {chain}")
+        config = self.chain_config[chain]
+        return list(dict.fromkeys([config["rpc"], *config.get("rpcs", [])]))
+
+    def rpc_url(self, chain: str) -> str:
+        return self.rpc_urls(chain)[0]
+
+    def endpoints(self, chain: str) -> List[EndpointStats]:
+        if chain not in self._endpoints:
+            self._endpoints[chain] = [
+                EndpointStats(
+                    url,
+                    default_timeout=self.timeout,
+                    failure_threshold=self.failure_threshold,
+                    cooldown=self.circuit_cooldown
+                )
+                for url in self.rpc_urls(chain)
+            ]
+        return self._endpoints[chain]
+
+    def _ranked(self, chain: str) -> List[EndpointStats]:
+        now = time.monotonic()
+        endpoints = self.endpoints(chain)
+        available = [e for e in endpoints if e.available(now)]
+        if not available:
+            # Every circuit is open: trial them in the order they would close rather than fail outright
+            return sorted(endpoints, key=lambda e: e.open_until)
+        return sorted(available, key=lambda e: e.score())
+
+    async def session(self, chain: str) -> aiohttp.ClientSession:
+        if chain in self._sessions:
+            return self._sessions[chain]
+
+        async with self._lock:
+            if chain not in self._sessions:
+                hosts = len(self.rpc_urls(chain))
+                self._sessions[chain] = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(
+                        limit=self.pool_size * hosts,
+                        limit_per_host=self.pool_size,
+                        keepalive_timeout=self.keepalive_timeout
+                    ),
+                    raise_for_status=True
+                )
+        return self._sessions[chain]
+
+    async def get(self, chain: str) -> AsyncWeb3:
+        if chain not in self._providers:
+            self.rpc_urls(chain)
+            self._providers[chain] = AsyncWeb3(FailoverProvider(self, chain))
+        return self._providers[chain]
+
+    async def _attempt(self, chain: str, endpoint: EndpointStats, payload: Any) -> Any:
+        session = await self.session(chain)
+        body_kwargs = {"data": payload} if isinstance(payload, bytes) else {"json": payload}
+        headers = {"Content-Type": "application/json"}
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire(endpoint.url)
+        started = time.monotonic()
+
+        try:
+            async with session.post(
+                    endpoint.url,
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=endpoint.timeout()),
+                    **body_kwargs
+            ) as response:
+                body = await response.json(content_type=None)
+        except aiohttp.ClientResponseError as e:
+            if self._is_batch_rejection(e, payload):
+                endpoint.record_success(time.monotonic() - started)
+            elif e.status == THROTTLED_STATUS and self.rate_limiter is not None:
+                self.rate_limiter.throttle(endpoint.url, self._retry_after(e))
+                endpoint.record_failure(time.monotonic() - started)
+            else:
+                endpoint.record_failure(time.monotonic() - started)
+            raise
+        except (asyncio.TimeoutError, aiohttp.ClientError, ValueError):
+            endpoint.record_failure(time.monotonic() - started)
+            raise
+
+        endpoint.record_success(time.monotonic() - started)
+        return body
+
+    @staticmethod
+    def _retry_after(error: aiohttp.ClientResponseError) -> Optional[float]:
+        try:
+            return float(error.headers.get("Retry-After"))
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _is_batch_rejection(error: BaseException, payload: Any) -> bool:
+        # Only a batch can be too big; the same status on a single request is an endpoint failure
+        return (
+                isinstance(error, aiohttp.ClientResponseError) and
+                error.status in BATCH_REJECTED_STATUSES and
+                isinstance(payload, list) and len(payload) > 1
+        )
+
+    async def _hedged(self, chain: str, primary: EndpointStats, backup: EndpointStats, payload: Any, attempted: set) -> Any:
+        # attempted collects the endpoints actually sent to, so the caller only fails over past those
+        attempted.add(primary.url)
+        first = asyncio.create_task(self._attempt(chain, primary, payload))
+        done, _ = await asyncio.wait({first}, timeout=primary.p95())
+        if done:
+            return first.result()
+
+        self.hedged_requests += 1
+        attempted.add(backup.url)
+        pending = {first, asyncio.create_task(self._attempt(chain, backup, payload))}
+        last_error: Optional[BaseException] = None
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+                    if self._is_batch_rejection(last_error, payload):
+                        raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise last_error
+
+    async def post(self, chain: str, payload: Any) -> Any:
+        """POST a JSON-RPC payload (dict, list or pre-encoded bytes) with failover across the chain's endpoints."""
+        ranked = self._ranked(chain)
+        last_error: Optional[BaseException] = None
+
+        if self.hedge and len(ranked) > 1 and ranked[0].p95() is not None:
+            attempted: set = set()
+            try:
+                return await self._hedged(chain, ranked[0], ranked[1], payload, attempted)
+            except (asyncio.TimeoutError, aiohttp.ClientError, ValueError) as e:
+                if self._is_batch_rejection(e, payload):
+                    raise
+                last_error = e
+                # A primary that fails before its p95 leaves the runner-up untried
+                ranked = [e for e in ranked if e.url not in attempted]
+
+        for endpoint in ranked:
+            try:
+                return await self._attempt(chain, endpoint, payload)
+            except (asyncio.TimeoutError, aiohttp.ClientError, ValueError) as e:
+                if self._is_batch_rejection(e, payload):
+                    raise
+                last_error = e
+
+        raise last_error or aiohttp.ClientError(f"No RPC endpoint available for {chain}")
+
+    async def request(self, chain: str, method: str, params: List) -> Any:
+        body = await self.post(chain, {"jsonrpc": "2.0", "id": 1, "method": method, "params": params})
+        if "error" in body:
+            error = body["error"]
+            raise ValueError(error.get("message", str(error)) if isinstance(error, dict) else str(error))
+        return body.get("result")
+
+    def _configured_batch_size(self, chain: str) -> int:
+        return self.chain_config.get(chain, {}).get("max_batch_size", self.max_batch_size)
+
+    def batch_limit(self, chain: str) -> int:
+        if chain not in self._batch_limits:
+            self._batch_limits[chain] = self._configured_batch_size(chain)
+        return self._batch_limits[chain]
+
+    def _shrink_batch_limit(self, chain: str, rejected_size: int):
+        self._batch_ceilings[chain] = max(1, rejected_size - 1)
+        self._batch_limits[chain] = max(1, rejected_size // 2)
+
+    def _grow_batch_limit(self, chain: str):
+        ceiling = self._batch_ceilings.get(chain, self._configured_batch_size(chain))
+        limit = self.batch_limit(chain)
+        self._batch_limits[chain] = min(ceiling, limit + max(1, limit // 10))
+
+    async def batch_request(self, chain: str, calls: List[Tuple[str, List]]) -> List[Dict]:
+        """
+        Send many JSON-RPC calls to one chain as batch requests.
+
+        Returns one {"result": ...} or {"error": "..."} dict per call, in call
+        order. The batch size starts at the chain's max_batch_size and adapts:
+        a rejected batch halves it and caps future growth just below the size
+        that failed, a successful one grows it back gradually.
+        """
+        results: List[Optional[Dict]] = [None] * len(calls)
+        start = 0
+
+        while start < len(calls):
+            size = self.batch_limit(chain)
+            chunk = calls[start:start + size]
+            payload = [
+                {"jsonrpc": "2.0", "id": start + i, "method": method, "params": params}
+                for i, (method, params) in enumerate(chunk)
+            ]
+
+            try:
+                body = await self.post(chain, payload)
+            except aiohttp.ClientResponseError as e:
+                if self._is_batch_rejection(e, payload):
+                    self._shrink_batch_limit(chain, len(chunk))
+                    continue
+                body = None
+                error = f"HTTP {e.status}"
+            except Exception as e:
+                body = None
+                error = str(e) or type(e).__name__
+
+            if body is not None and not isinstance(body, list):
+                # Providers that refuse a batch usually answer with one error object
+                if len(chunk) > 1:
+                    self._shrink_batch_limit(chain, len(chunk))
+                    continue
+                body = [{**body, "id": start}]
+
+            if body is None:
+                for i in range(len(chunk)):
+                    results[start + i] = {"error": error}
+                start += len(chunk)
+                continue
+
+            by_id = {item.get("id"): item for item in body if isinstance(item, dict)}
+            for i in range(len(chunk)):
+                item = by_id.get(start + i)
+                if item is None:
+                    results[start + i] = {"error": "Missing from batch response"}
+                elif "error" in item:
+                    err = item["error"]
+                    results[start + i] = {"error": err.get("message", str(err)) if isinstance(err, dict) else str(err)}
+                else:
+                    results[start + i] = {"result": item.get("result")}
+
+            if len(by_id) < len(chunk):
+                self._shrink_batch_limit(chain, len(chunk))
+            else:
+                self._grow_batch_limit(chain)
+
+            start += len(chunk)
+
+        return results
+
+    async def warm_up(self, chains: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        """
+        Open a connection to every endpoint up front so the first scan doesn't
+        pay the handshake; the pings also seed each endpoint's latency stats.
+        """
+        chains = list(chains or self.chain_config.keys())
+        payload = {"jsonrpc": "2.0", "id": 1, "method": "eth_chainId", "params": []}
+
+        async def ping(chain: str, endpoint: EndpointStats) -> bool:
+            try:
+                await self._attempt(chain, endpoint, payload)
+                return True
+            except Exception:
+                return False
+
+        async def ping_chain(chain: str) -> bool:
+            results = await asyncio.gather(*(ping(chain, e) for e in self.endpoints(chain)))
+            return any(results)
+
+        results = await asyncio.gather(*(ping_chain(chain) for chain in chains))
+        return dict(zip(chains, results))
+
+    def stats(self) -> Dict[str, List[Dict]]:
+        return {chain: [e.stats() for e in endpoints] for chain, endpoints in self._endpoints.items()}
+
+    async def close(self):
+        if self.rate_limiter is not None:
+            await self.rate_limiter.close()
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions = {}
+        self._providers = {}
@@ -0,0 +1,129 @@
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class ChainWorkerPool:
+    """
+    Fixed number of async workers draining a per-chain job queue.
+
+    Cancelling the future returned by submit() also cancels the job if it is
+    already running, so a scan abandoned by its caller (e.g. on a cycle
+    deadline) frees the worker instead of running to completion.
+    """
+
+    def __init__(self, chain: str, size: int):
+        self.chain = chain
+        self.size = max(1, size)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def _ensure_started(self):
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"scan-{self.chain}-{i}")
+            for i in range(self.size)
+        ]
+
+    async def _worker(self):
+        while True:
+            fn, args, context, future = await self._queue.get()
+            if future.cancelled():
+                self._queue.task_done()
+                continue
+
+            self.active += 1
+            # Run the job in the submitter's context so context vars (e.g. rate limit owner) follow it
+            task = context.run(asyncio.ensure_future, fn(*args))
+            future.add_done_callback(lambda f, task=task: task.cancel() if f.cancelled() else None)
+            try:
+                result = await task
+                if not future.done():
+                    future.set_result(result)
+                self.completed += 1
+            except asyncio.CancelledError:
+                if future.cancelled() and task.cancelled():
+                    # The caller gave up on this job; the worker carries on with the next one
+                    self.cancelled += 1
+                    continue
+                task.cancel()
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                self.failed += 1
+            finally:
+                self.active -= 1
+                self._queue.task_done()
+
+    def submit(self, fn: Callable[..., Awaitable[Any]], *args) -> asyncio.Future:
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((fn, args, contextvars.copy_context(), future))
+        return future
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.size,
+            "active": self.active,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled
+        }
+
+    async def close(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+
+class ChainWorkerPools:
+    """
+    One ChainWorkerPool per chain, created lazily.
+
+    Pools are long-lived so the per-chain concurrency limit holds across
+    every scan running at the same time, not just within a single scan.
+    """
+
+    def __init__(self, limits: Dict[str, int], default_size: int = 4):
+        self.limits = dict(limits)
+        self.default_size = default_size
+        self._pools: Dict[str, ChainWorkerPool] = {}
+
+    def pool(self, chain: str) -> ChainWorkerPool:
+        if chain not in self._pools:
+            size = self.limits.get(chain, self.default_size)
+            self._pools[chain] = ChainWorkerPool(chain, size)
+        return self._pools[chain]
+
+    async def map(
+            self,
+            jobs: Iterable[Tuple[str, Tuple]],
+            fn: Callable[..., Awaitable[Any]]
+    ) -> List[Any]:
+        """
+        Run fn(*args) for every (chain, args) job on that chain's pool.
+
+        Results come back in job order; a failed job yields its exception
+        instead of raising, so one bad chain never sinks the whole scan.
+        """
+        futures = [self.pool(chain).submit(fn, *args) for chain, args in jobs]
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {chain: pool.stats() for chain, pool in self._pools.items()}
+
+    async def close(self):
+        await asyncio.gather(*(pool.close() for pool in self._pools.values()))
+        self._pools = {}
@@ -0,0 +1,149 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class ScanSupervisor:
+    """
+    Runs scan jobs as background tasks, away from the handler that queued
+    them, so a slow cycle neither blocks the agent's message handling nor
+    overlaps the next tick's handler.
+
+    Jobs wait in a FIFO queue and up to `concurrency` run at once. Each job
+    gets a deadline after which it is cancelled, and any queued or running
+    job can be cancelled by id. stats() reports the queue, what is running
+    and how jobs ended.
+    """
+
+    def __init__(self, concurrency: int = 2, deadline: float = 300.0, history: int = 50):
+        self.concurrency = max(1, concurrency)
+        self.deadline = deadline
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._jobs: Dict[str, Dict] = {}
+        self.recent: deque = deque(maxlen=history)
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.cancelled = 0
+
+    def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"scan-supervisor-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for job in self._jobs.values() if job["task"] is None)
+
+    @property
+    def running(self) -> int:
+        return sum(1 for job in self._jobs.values() if job["task"] is not None)
+
+    def submit(
+            self,
+            job_id: str,
+            fn: Callable[[], Awaitable[Any]],
+            deadline: Optional[float] = None,
+            size: int = 1
+    ) -> bool:
+        """Queue fn() under job_id; False if a job with that id is already queued or running."""
+        if job_id in self._jobs:
+            return False
+        self.start()
+        self._jobs[job_id] = {
+            "id": job_id,
+            "fn": fn,
+            "deadline": deadline or self.deadline,
+            "size": size,
+            "submitted": time.monotonic(),
+            "started": None,
+            "task": None
+        }
+        self._queue.put_nowait(job_id)
+        return True
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        if job["task"] is None:
+            del self._jobs[job_id]
+            self._finish(job, "cancelled")
+        else:
+            job["task"].cancel()
+        return True
+
+    def _finish(self, job: Dict, outcome: str, error: Optional[str] = None):
+        now = time.monotonic()
+        setattr(self, outcome, getattr(self, outcome) + 1)
+        self.recent.append({
+            "id": job["id"],
+            "size": job["size"],
+            "outcome": outcome,
+            "waited": (job["started"] or now) - job["submitted"],
+            "duration": now - job["started"] if job["started"] else 0.0,
+            "error": error
+        })
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None:
+                continue
+
+            job["started"] = time.monotonic()
+            job["task"] = task = asyncio.ensure_future(job["fn"]())
+            try:
+                done, _ = await asyncio.wait({task}, timeout=job["deadline"])
+                if not done:
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    self._finish(job, "timed_out")
+                elif task.cancelled():
+                    self._finish(job, "cancelled")
+                elif task.exception() is not None:
+                    self._finish(job, "failed", str(task.exception())[:200])
+                else:
+                    self._finish(job, "completed")
+            except asyncio.CancelledError:
+                # Worker stopped mid-job: the job ends with it
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                self._finish(job, "cancelled")
+                raise
+            finally:
+                self._jobs.pop(job_id, None)
+
+    async def stop(self):
+        """Cancel the workers and every queued or running job."""
+        for job_id in list(self._jobs):
+            self.cancel(job_id)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        finished = [job for job in self.recent if job["outcome"] == "completed"]
+        return {
+            "queued": self.queued,
+            "running": [
+                {"id": job["id"], "size": job["size"], "elapsed": now - job["started"]}
+                for job in self._jobs.values() if job["task"] is not None
+            ],
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "cancelled": self.cancelled,
+            "avg_duration": sum(job["duration"] for job in finished) / len(finished) if finished else 0.0,
+            "recent": list(self.recent)[-5:]
+        }
@@ -0,0 +1,176 @@
+import heapq
+import itertools
+import math
+import time
+from typing import Dict, List, Optional
+
+
+class ScanScheduler:
+    """
+    Min-heap of portfolios keyed by next-due time.
+
+    The refresh interval shrinks for risky, valuable and volatile portfolios
+    and grows for dormant ones. Each tick pops as many overdue portfolios
+    (most overdue first) as the per-tick request budget allows.
+    """
+
+    def __init__(
+            self,
+            base_interval: float = 3600.0,
+            min_interval: float = 300.0,
+            max_interval: float = 86400.0
+    ):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._heap: List = []
+        self._entries: Dict[str, Dict] = {}
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._entries
+
+    def compute_interval(
+            self,
+            risk_score: float = 0.0,
+            value_usd: float = 0.0,
+            volatility: float = 0.0
+    ) -> float:
+        if value_usd <= 0:
+            return self.max_interval
+
+        risk_factor = 1.0 - 0.8 * min(max(risk_score, 0.0), 1.0)
+        value_factor = 1.0 / (1.0 + math.log10(1.0 + value_usd / 1000.0))
+        volatility_factor = 1.0 / (1.0 + abs(volatility) / 10.0)
+
+        interval = self.base_interval * risk_factor * value_factor * volatility_factor
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def _push(self, user_id: str, due_at: float):
+        entry = self._entries[user_id]
+        entry["due_at"] = due_at
+        entry["version"] = next(self._counter)
+        heapq.heappush(self._heap, (due_at, entry["version"], user_id))
+
+    def upsert(
+            self,
+            user_id: str,
+            cost: Dict,
+            last_scan: Optional[float] = None,
+            risk_score: float = 0.0,
+            value_usd: float = 0.0,
+            volatility: float = 0.0
+    ):
+        """Add or update a portfolio. Never-scanned portfolios are due immediately."""
+        self._entries[user_id] = {
+            "cost": cost,
+            "risk_score": risk_score,
+            "value_usd": value_usd,
+            "volatility": volatility,
+            "last_scan": last_scan
+        }
+
+        if last_scan is None:
+            due_at = time.time()
+        else:
+            due_at = last_scan + self.compute_interval(risk_score, value_usd, volatility)
+        self._push(user_id, due_at)
+
+    def record_scan(
+            self,
+            user_id: str,
+            risk_score: float,
+            value_usd: float,
+            volatility: float,
+            now: Optional[float] = None
+    ) -> float:
+        now = now or time.time()
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return now
+
+        entry.update(risk_score=risk_score, value_usd=value_usd, volatility=volatility, last_scan=now)
+        due_at = now + self.compute_interval(risk_score, value_usd, volatility)
+        self._push(user_id, due_at)
+        return due_at
+
+    def mark_due(self, user_id: str, due_at: Optional[float] = None):
+        if user_id in self._entries:
+            self._push(user_id, due_at or time.time())
+
+    def remove(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+    def next_due(self) -> Optional[float]:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def _drop_stale(self):
+        while self._heap:
+            due_at, version, user_id = self._heap[0]
+            entry = self._entries.get(user_id)
+            if entry is not None and entry["version"] == version:
+                return
+            heapq.heappop(self._heap)
+
+    def pop_due(self, budget: Dict[str, float], now: Optional[float] = None) -> List[str]:
+        """
+        Pop overdue portfolios until the next one would exceed the budget.
+
+        Costs are numbers, or sets and dicts for shared resources (e.g. price
+        ids, a chain's batch calls) where only members not already charged
+        this tick count against the budget: one each for a set, the member's
+        weight for a dict.
+        A portfolio whose cost alone exceeds the budget is still released when
+        nothing else was popped this tick, so large portfolios never starve.
+        Popped portfolios stay registered and are rescheduled by record_scan
+        (or pushed back by mark_due if their scan fails).
+        """
+        now = now or time.time()
+        remaining = dict(budget)
+        charged: Dict[str, set] = {}
+        due = []
+
+        def charge_for(cost: Dict) -> Dict[str, float]:
+            charge = {}
+            for k, v in cost.items():
+                seen = charged.get(k, set())
+                if isinstance(v, dict):
+                    charge[k] = sum(weight for member, weight in v.items() if member not in seen)
+                elif isinstance(v, (set, frozenset)):
+                    charge[k] = len(v - seen)
+                else:
+                    charge[k] = v
+            return charge
+
+        while True:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+
+            user_id = self._heap[0][2]
+            cost = self._entries[user_id]["cost"]
+            charge = charge_for(cost)
+            fits = all(v <= remaining.get(k, math.inf) for k, v in charge.items())
+            if not fits and due:
+                break
+
+            heapq.heappop(self._heap)
+            self._entries[user_id]["version"] = None
+            for k, v in charge.items():
+                if k in remaining:
+                    remaining[k] -= v
+            for k, v in cost.items():
+                if isinstance(v, (set, frozenset, dict)):
+                    charged.setdefault(k, set()).update(v)
+            due.append(user_id)
+
+        return due
+
+    def stats(self, now: Optional[float] = None) -> Dict:
+        now = now or time.time()
+        overdue = sum(1 for e in self._entries.values() if e["version"] is not None and e["due_at"] <= now)
+        return {"portfolios": len(self._entries), "overdue": overdue, "next_due": self.next_due()}
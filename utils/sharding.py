@@ -0,0 +1,155 @@
+import bisect
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class ConsistentHashRing:
+    """
+    Maps keys to nodes with `vnodes` points per node on a 64-bit ring.
+
+    Adding or removing a node only moves the keys on the arcs it gains or
+    loses (about 1/N of them), so workers joining or leaving hand off a
+    slice of the portfolios instead of reshuffling all of them.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 128):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self._nodes: set = set()
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self._nodes
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(self._nodes)
+
+    def add(self, node: str):
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for i in range(self.vnodes):
+            point = _hash(f"{node}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str):
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        keep = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in keep]
+        self._owners = [o for _, o in keep]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+class ShardMembership:
+    """
+    Live monitor workers, discovered through heartbeat files in a directory
+    every worker can reach (local disk for one box, a shared mount across
+    nodes). A worker whose heartbeat is older than `ttl` drops out of the
+    ring; refresh() reports whether membership changed so callers can
+    rebalance.
+    """
+
+    def __init__(self, directory: str, worker_id: str, address: str, ttl: float = 180.0, vnodes: int = 128):
+        self.directory = directory
+        self.worker_id = worker_id
+        self.address = address
+        self.ttl = ttl
+        self.vnodes = vnodes
+        self.active = True
+        self.members: Dict[str, Dict] = {}
+        self.ring = ConsistentHashRing([worker_id], vnodes=vnodes)
+        self.rebalances = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, worker_id: str) -> str:
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in worker_id)
+        return os.path.join(self.directory, f"{safe}.json")
+
+    def heartbeat(self, now: Optional[float] = None):
+        if not self.active:
+            return
+        path = self._path(self.worker_id)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"worker_id": self.worker_id, "address": self.address, "heartbeat": now or time.time()}, f)
+        os.replace(tmp, path)
+
+    def _read_members(self, now: float) -> Dict[str, Dict]:
+        members = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    member = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if now - member.get("heartbeat", 0) <= self.ttl:
+                members[member["worker_id"]] = member
+        return members
+
+    def refresh(self, now: Optional[float] = None) -> bool:
+        now = now or time.time()
+        members = self._read_members(now)
+        if self.active:
+            members[self.worker_id] = {"worker_id": self.worker_id, "address": self.address, "heartbeat": now}
+        else:
+            members.pop(self.worker_id, None)
+
+        changed = set(members) != set(self.members)
+        self.members = members
+        if changed:
+            self.ring = ConsistentHashRing(members, vnodes=self.vnodes)
+            self.rebalances += 1
+        return changed
+
+    def owner(self, user_id: str) -> Optional[str]:
+        return self.ring.owner(user_id)
+
+    def owns(self, user_id: str) -> bool:
+        return self.owner(user_id) == self.worker_id
+
+    def address_of(self, worker_id: str) -> Optional[str]:
+        member = self.members.get(worker_id)
+        return member["address"] if member else None
+
+    def is_member_address(self, address: str) -> bool:
+        return any(m["address"] == address for m in self.members.values())
+
+    def leave(self):
+        """Stop heartbeating and drop out of the ring; the next refresh() excludes this worker."""
+        self.active = False
+        try:
+            os.remove(self._path(self.worker_id))
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> Dict:
+        return {
+            "worker_id": self.worker_id,
+            "workers": len(self.members),
+            "members": sorted(self.members),
+            "rebalances": self.rebalances
+        }
@@ -0,0 +1,218 @@
+import re
+from typing import Dict, List, Optional
+
+# keccak256("Transfer(address,address,uint256)"); ERC-721 shares it but indexes tokenId as a fourth topic
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+# How providers word "this eth_getLogs range returns too much". Rate limits and timeouts must not match:
+# they say nothing about the range, and splitting on them only multiplies the requests
+RANGE_ERROR = re.compile(
+    r"more than \d+ results"
+    r"|too many (?:results|logs|blocks)"
+    r"|(?:block )?range (?:is )?too (?:large|wide|big)"
+    r"|max(?:imum)? (?:block )?range"
+    r"|range limit"
+    r"|limited to a [\d,]+ (?:block )?range"
+    r"|up to a \w+ block range"
+    r"|(?:log )?response size (?:exceeded|too)",
+    re.IGNORECASE
+)
+
+
+class RequestBudgetExhausted(Exception):
+    pass
+
+
+class _RequestBudget:
+    def __init__(self, requests: int):
+        self.remaining = requests
+
+    def take(self):
+        if self.remaining <= 0:
+            raise RequestBudgetExhausted()
+        self.remaining -= 1
+
+
+def address_topic(address: str) -> str:
+    return "0x" + "0" * 24 + address.lower()[2:]
+
+
+def topic_address(topic: str) -> str:
+    return "0x" + topic[-40:].lower()
+
+
+class TokenDiscovery:
+    """
+    Finds the ERC-20 tokens a wallet has touched from Transfer logs with the
+    wallet in topics[1] (sent) or topics[2] (received).
+
+    Each (chain, wallet) keeps a block checkpoint, so after the first
+    backfill a run only reads blocks mined since the last one. Wallets that
+    share a checkpoint are queried together with OR-ed topics. The block
+    range per eth_getLogs call adapts per chain: a range the provider
+    refuses is split in half and becomes the new ceiling, and successful
+    ranges grow back toward it. After probe_after successful steps in a row
+    the ceiling itself doubles (up to max_range), so a chain that was once
+    squeezed down to tiny ranges recovers. At most max_requests calls,
+    splits included, are made per run; an unfinished backfill resumes from
+    its checkpoint next time.
+
+    Checkpoints and discovered tokens are persisted through agent storage.
+    """
+
+    STORAGE_KEY = "token_discovery"
+
+    def __init__(
+            self,
+            registry,
+            backfill_blocks: int = 100000,
+            initial_range: int = 2000,
+            max_range: int = 10000,
+            max_requests: int = 20,
+            probe_after: int = 20
+    ):
+        self.registry = registry
+        self.backfill_blocks = backfill_blocks
+        self.initial_range = initial_range
+        self.max_range = max_range
+        self.max_requests = max_requests
+        self.probe_after = probe_after
+        self._checkpoints: Dict[str, int] = {}
+        self._tokens: Dict[str, List[str]] = {}
+        self._ranges: Dict[str, int] = {}
+        self._ceilings: Dict[str, int] = {}
+        self._streaks: Dict[str, int] = {}
+        self._loaded = False
+        self._dirty = False
+        self.requests = 0
+        self.splits = 0
+        self.discovered = 0
+
+    @staticmethod
+    def _key(chain: str, wallet: str) -> str:
+        return f"{chain}:{wallet.lower()}"
+
+    def load(self, storage):
+        if self._loaded:
+            return
+        data = storage.get(self.STORAGE_KEY) or {}
+        self._checkpoints.update(data.get("checkpoints", {}))
+        self._tokens.update(data.get("tokens", {}))
+        self._loaded = True
+
+    def save(self, storage):
+        if self._dirty:
+            storage.set(self.STORAGE_KEY, {"checkpoints": self._checkpoints, "tokens": self._tokens})
+            self._dirty = False
+
+    def tokens(self, chain: str, wallet: str) -> List[str]:
+        return self._tokens.get(self._key(chain, wallet), [])
+
+    def checkpoint(self, chain: str, wallet: str) -> Optional[int]:
+        return self._checkpoints.get(self._key(chain, wallet))
+
+    def range_size(self, chain: str) -> int:
+        return self._ranges.setdefault(chain, self.initial_range)
+
+    def _shrink_range(self, chain: str, refused: int):
+        self._ceilings[chain] = max(1, refused - 1)
+        self._ranges[chain] = max(1, refused // 2)
+        self._streaks[chain] = 0
+
+    def _grow_range(self, chain: str):
+        ceiling = self._ceilings.get(chain, self.max_range)
+        streak = self._streaks.get(chain, 0) + 1
+        if streak >= self.probe_after and ceiling < self.max_range:
+            ceiling = self._ceilings[chain] = min(self.max_range, ceiling * 2)
+            streak = 0
+        self._streaks[chain] = streak
+
+        size = self.range_size(chain)
+        self._ranges[chain] = min(ceiling, size + max(1, size // 10))
+
+    async def _get_logs(self, chain: str, start: int, end: int, topics: List, budget: _RequestBudget) -> List[Dict]:
+        """Logs for [start, end], splitting the range for as long as the provider refuses it and the budget lasts."""
+        budget.take()
+        self.requests += 1
+        try:
+            return await self.registry.request(
+                chain, "eth_getLogs", [{"fromBlock": hex(start), "toBlock": hex(end), "topics": topics}]
+            ) or []
+        except ValueError as e:
+            if end <= start or not RANGE_ERROR.search(str(e)):
+                raise
+
+        self.splits += 1
+        self._shrink_range(chain, end - start + 1)
+        middle = (start + end) // 2
+        return (
+                await self._get_logs(chain, start, middle, topics, budget) +
+                await self._get_logs(chain, middle + 1, end, topics, budget)
+        )
+
+    def _record(self, chain: str, wallets: set, logs: List[Dict]) -> Dict[str, List[str]]:
+        found: Dict[str, List[str]] = {}
+        for log in logs:
+            topics = log.get("topics") or []
+            if len(topics) != 3:
+                continue
+            token = log["address"].lower()
+            for wallet in (topic_address(topics[1]), topic_address(topics[2])):
+                if wallet not in wallets:
+                    continue
+                known = self._tokens.setdefault(self._key(chain, wallet), [])
+                if token not in known:
+                    known.append(token)
+                    found.setdefault(wallet, []).append(token)
+                    self.discovered += 1
+                    self._dirty = True
+        return found
+
+    async def discover(self, chain: str, wallets: List[str], head: Optional[int] = None) -> Dict[str, List[str]]:
+        """Scan each wallet's unscanned blocks up to head; returns newly found tokens per wallet (lowercase)."""
+        if head is None:
+            head = int(await self.registry.request(chain, "eth_blockNumber", []), 16)
+
+        groups: Dict[int, List[str]] = {}
+        for wallet in wallets:
+            checkpoint = self.checkpoint(chain, wallet)
+            start = checkpoint + 1 if checkpoint is not None else max(0, head - self.backfill_blocks)
+            groups.setdefault(start, []).append(wallet.lower())
+
+        found: Dict[str, List[str]] = {}
+        budget = _RequestBudget(self.max_requests)
+        for start, group in sorted(groups.items()):
+            members = set(group)
+            wallet_topics = [address_topic(w) for w in group]
+            block = start
+
+            while block <= head and budget.remaining > 0:
+                end = min(head, block + self.range_size(chain) - 1)
+                before = self.requests
+                try:
+                    logs = await self._get_logs(chain, block, end, [TRANSFER_TOPIC, wallet_topics], budget)
+                    logs += await self._get_logs(chain, block, end, [TRANSFER_TOPIC, None, wallet_topics], budget)
+                except RequestBudgetExhausted:
+                    # The checkpoint stays before this range, so the next run reads it again at the smaller size
+                    return found
+                if self.requests - before == 2:
+                    self._grow_range(chain)
+
+                for wallet, tokens in self._record(chain, members, logs).items():
+                    found.setdefault(wallet, []).extend(tokens)
+                for wallet in group:
+                    self._checkpoints[self._key(chain, wallet)] = end
+                self._dirty = True
+                block = end + 1
+
+        return found
+
+    def stats(self) -> Dict:
+        return {
+            "wallets": len(self._checkpoints),
+            "tokens": sum(len(t) for t in self._tokens.values()),
+            "requests": self.requests,
+            "splits": self.splits,
+            "discovered": self.discovered,
+            "ranges": dict(self._ranges)
+        }
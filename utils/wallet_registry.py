@@ -0,0 +1,60 @@
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+class WalletRegistry:
+    """
+    (chain, wallet) -> user_ids subscribed to it, plus the reverse index.
+
+    Lets a scan cycle read each unique wallet once and fan the result out to
+    every portfolio that watches it, so RPC cost follows unique wallets
+    rather than subscriptions.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[Tuple[str, str], Set[str]] = {}
+        self._subscriptions: Dict[str, Set[Tuple[str, str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, user_id: str, wallets: Iterable[str], chains: Iterable[str]):
+        """Replace user_id's subscriptions with every wallet on every chain."""
+        self.unsubscribe(user_id)
+        pairs = {(chain, wallet) for chain in chains for wallet in wallets}
+        self._subscriptions[user_id] = pairs
+        for pair in pairs:
+            self._subscribers.setdefault(pair, set()).add(user_id)
+
+    def unsubscribe(self, user_id: str):
+        for pair in self._subscriptions.pop(user_id, set()):
+            users = self._subscribers.get(pair)
+            if users is None:
+                continue
+            users.discard(user_id)
+            if not users:
+                del self._subscribers[pair]
+
+    def subscribers(self, chain: str, wallet: str) -> Set[str]:
+        return self._subscribers.get((chain, wallet), set())
+
+    def wallets(self, chain: str) -> List[str]:
+        return [wallet for c, wallet in self._subscribers if c == chain]
+
+    def chains(self) -> Set[str]:
+        return {chain for chain, _ in self._subscribers}
+
+    def group(self, user_ids: Iterable[str]) -> Dict[str, List[str]]:
+        """Unique wallets per chain across the given portfolios."""
+        grouped: Dict[str, Dict[str, None]] = {}
+        for user_id in user_ids:
+            for chain, wallet in self._subscriptions.get(user_id, ()):
+                grouped.setdefault(chain, {})[wallet] = None
+        return {chain: list(wallets) for chain, wallets in grouped.items()}
+
+    def stats(self) -> Dict:
+        subscriptions = sum(len(pairs) for pairs in self._subscriptions.values())
+        return {
+            "portfolios": len(self._subscriptions),
+            "subscriptions": subscriptions,
+            "unique_wallets": len(self._subscribers)
+        }